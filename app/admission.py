@@ -0,0 +1,141 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"request shed: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Caps concurrent generations and sheds load that would only queue up.
+
+    Up to ``limit`` requests run at once; the next ``max_queue`` wait in
+    FIFO order for at most ``max_queue_time`` seconds. Anything beyond that
+    is rejected immediately with :class:`AdmissionRejected`.
+
+    With ``adaptive`` the limit follows AIMD: it grows by about one per
+    ``limit`` fast completions and shrinks by ``decrease_factor`` whenever
+    a generation is slower than ``target_latency`` or fails upstream.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        max_queue_time: float,
+        adaptive: bool = False,
+        min_in_flight: int = 1,
+        target_latency: float = 30.0,
+        decrease_factor: float = 0.9,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.adaptive = adaptive
+        self.min_in_flight = min(min_in_flight, max_in_flight)
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self._clock = clock
+        self._limit = float(max_in_flight)
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {"queue_full": 0, "queue_timeout": 0}
+        self._latency_ewma: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._limit))
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Rough time until a slot frees up, for the ``Retry-After`` header."""
+
+        latency = self._latency_ewma or 1.0
+        return max(1.0, math.ceil(latency * (self.queued + 1) / self.limit))
+
+    async def _acquire(self) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_queue_time)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self._release_slot()
+            else:
+                waiter.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.TimeoutError):
+                self._reject("queue_timeout")
+            raise
+
+    def _reject(self, reason: str) -> None:
+        self.shed[reason] += 1
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves straight to the waiter, so that a newcomer
+                # cannot overtake the queue.
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, latency: float, overloaded: bool) -> None:
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+        if not self.adaptive:
+            return
+        if overloaded or latency > self.target_latency:
+            self._limit = max(float(self.min_in_flight), self._limit * self.decrease_factor)
+        else:
+            self._limit = min(float(self.max_in_flight), self._limit + 1.0 / self._limit)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        await self._acquire()
+        self.admitted += 1
+        started = self._clock()
+        overloaded = False
+        try:
+            yield
+        except Exception:
+            overloaded = True
+            raise
+        finally:
+            self._observe(self._clock() - started, overloaded)
+            self._release_slot()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "limit": self.limit,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "shed_total": sum(self.shed.values()),
+            "latency_ewma_sec": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+        }
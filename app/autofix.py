@@ -0,0 +1,349 @@
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+
+from .layout import node_size
+from .models import ValidationIssue
+from .prevalidator import is_flow_node
+from .xml_utils import (
+    BPMN_MODEL_NS,
+    BPMNDI_NS,
+    DC_NS,
+    DI_NS,
+    DOCUMENT_START,
+    STANDARD_PREFIXES,
+    bpmn_tag,
+    bpmndi_tag,
+    dc_tag,
+    di_tag,
+    format_number,
+    local_name,
+    parse_document,
+    serialize_document,
+)
+
+# Rules whose fix is re-reading the document with the BPMN namespaces in place.
+_DOCUMENT_RULES = frozenset({"xml-format", "xml-well-formed", "definitions-root"})
+
+_DI_ELEMENTS = frozenset({"BPMNDiagram", "BPMNPlane", "BPMNShape", "BPMNEdge", "BPMNLabel", "BPMNLabelStyle"})
+_DC_ELEMENTS = frozenset({"Bounds", "Font"})
+_DI_NS_ELEMENTS = frozenset({"waypoint"})
+
+_REFERENCE_CHILDREN = frozenset({"incoming", "outgoing"})
+
+_UNBOUND_PREFIX = re.compile(r"<\s*(\w+):")
+
+
+def _extract_document(xml: str) -> str:
+    """Drop prose and markdown fences around the XML document."""
+
+    match = DOCUMENT_START.search(xml)
+    start = match.start() if match else xml.find("<")
+    end = xml.rfind(">")
+    if start < 0 or end < start:
+        return xml
+    return xml[start:end + 1]
+
+
+def _declare_missing_prefixes(xml: str) -> str:
+    used = set(_UNBOUND_PREFIX.findall(xml)) & STANDARD_PREFIXES.keys()
+    match = re.search(r"<(?!\?)([\w:]+)", xml)
+    if not used or match is None:
+        return xml
+    declarations = "".join(
+        f' xmlns:{prefix}="{STANDARD_PREFIXES[prefix]}"'
+        for prefix in sorted(used)
+        if f"xmlns:{prefix}=" not in xml
+    )
+    if not declarations:
+        return xml
+    return xml[:match.end()] + declarations + xml[match.end():]
+
+
+def _qualify(root: ET.Element) -> bool:
+    """Put unqualified BPMN elements into their namespaces."""
+
+    changed = False
+    for element in root.iter():
+        if not isinstance(element.tag, str) or element.tag.startswith("{"):
+            continue
+        name = element.tag
+        if name in _DI_ELEMENTS:
+            namespace = BPMNDI_NS
+        elif name in _DC_ELEMENTS:
+            namespace = DC_NS
+        elif name in _DI_NS_ELEMENTS:
+            namespace = DI_NS
+        else:
+            namespace = BPMN_MODEL_NS
+        element.tag = f"{{{namespace}}}{name}"
+        changed = True
+    return changed
+
+
+def parent_map(root: ET.Element) -> Dict[ET.Element, ET.Element]:
+    return {child: parent for parent in root.iter() for child in parent}
+
+
+def _referenced_ids(root: ET.Element) -> Set[str]:
+    """Values that may refer to an element id: every attribute but ``id``
+    and every element text."""
+
+    referenced: Set[str] = set()
+    for element in root.iter():
+        referenced.update(value for name, value in element.attrib.items() if name != "id")
+        if element.text and element.text.strip():
+            referenced.add(element.text.strip())
+    return referenced
+
+
+def _fix_unique_ids(root: ET.Element, issues: List[ValidationIssue]) -> bool:
+    """Rename later duplicates of ids nothing refers to.
+
+    A referenced duplicate is left to the LLM: which of the elements a
+    ``sourceRef`` or ``bpmnElement`` meant cannot be told, and renaming one
+    of them would silently point the reference at the other.
+    """
+
+    counts = Counter(el.get("id") for el in root.iter() if el.get("id"))
+    referenced = _referenced_ids(root)
+    seen: Set[str] = set()
+    all_ids = set(counts)
+    changed = False
+    for element in root.iter():
+        element_id = element.get("id")
+        if not element_id or counts[element_id] < 2 or element_id in referenced:
+            continue
+        if element_id not in seen:
+            seen.add(element_id)
+            continue
+        suffix = 2
+        while f"{element_id}_{suffix}" in all_ids:
+            suffix += 1
+        new_id = f"{element_id}_{suffix}"
+        element.set("id", new_id)
+        all_ids.add(new_id)
+        changed = True
+    return changed
+
+
+def _flow_nodes(root: ET.Element) -> Dict[str, ET.Element]:
+    nodes: Dict[str, ET.Element] = {}
+    for process in root.iter(bpmn_tag("process")):
+        for element in process.iter():
+            if element.get("id") and is_flow_node(element):
+                nodes[element.get("id")] = element
+    return nodes
+
+
+def _remove_references(root: ET.Element, parents: Dict[ET.Element, ET.Element], ids: Set[str]) -> None:
+    for element in list(root.iter()):
+        if element is root:
+            continue
+        if local_name(element.tag) in _REFERENCE_CHILDREN and (element.text or "").strip() in ids:
+            parents[element].remove(element)
+        elif element.tag == bpmndi_tag("BPMNEdge") and element.get("bpmnElement") in ids:
+            parents[element].remove(element)
+
+
+def _fix_dangling_flows(root: ET.Element, issues: List[ValidationIssue]) -> bool:
+    nodes = _flow_nodes(root)
+    parents = parent_map(root)
+    removed: Set[str] = set()
+    for flow in list(root.iter(bpmn_tag("sequenceFlow"))):
+        if flow.get("sourceRef") in nodes and flow.get("targetRef") in nodes:
+            continue
+        removed.add(flow.get("id") or "")
+        parents[flow].remove(flow)
+    if not removed:
+        return False
+    _remove_references(root, parents, removed)
+    return True
+
+
+def ensure_plane(root: ET.Element) -> ET.Element:
+    plane = root.find(f".//{bpmndi_tag('BPMNPlane')}")
+    if plane is not None:
+        return plane
+    diagram = root.find(bpmndi_tag("BPMNDiagram"))
+    if diagram is None:
+        diagram = ET.SubElement(root, bpmndi_tag("BPMNDiagram"), {"id": "BPMNDiagram_1"})
+    process = root.find(bpmn_tag("process"))
+    attributes = {"id": "BPMNPlane_1"}
+    if process is not None and process.get("id"):
+        attributes["bpmnElement"] = process.get("id")
+    return ET.SubElement(diagram, bpmndi_tag("BPMNPlane"), attributes)
+
+
+def _shape_bounds(root: ET.Element) -> Dict[str, Tuple[float, float, float, float]]:
+    bounds: Dict[str, Tuple[float, float, float, float]] = {}
+    for shape in root.iter(bpmndi_tag("BPMNShape")):
+        box = shape.find(dc_tag("Bounds"))
+        if box is None or not shape.get("bpmnElement"):
+            continue
+        try:
+            bounds[shape.get("bpmnElement")] = tuple(  # type: ignore[assignment]
+                float(box.get(key, "0")) for key in ("x", "y", "width", "height")
+            )
+        except ValueError:
+            continue
+    return bounds
+
+
+def _unique_id(candidate: str, taken: Set[str]) -> str:
+    new_id = candidate
+    suffix = 2
+    while new_id in taken:
+        new_id = f"{candidate}_{suffix}"
+        suffix += 1
+    taken.add(new_id)
+    return new_id
+
+
+def _fix_missing_shapes(root: ET.Element, issues: List[ValidationIssue]) -> bool:
+    nodes = _flow_nodes(root)
+    bounds = _shape_bounds(root)
+    missing = [node for node_id, node in nodes.items() if node_id not in bounds]
+    if not missing:
+        return False
+    plane = ensure_plane(root)
+    taken = {el.get("id") for el in root.iter() if el.get("id")}
+    # Append the missing shapes in a row to the right of the existing drawing.
+    x = max((b[0] + b[2] for b in bounds.values()), default=100.0) + 50
+    centers = sorted(b[1] + b[3] / 2 for b in bounds.values())
+    center_y = centers[len(centers) // 2] if centers else 120.0
+    for node in missing:
+        width, height = node_size(local_name(node.tag))
+        shape = ET.SubElement(plane, bpmndi_tag("BPMNShape"), {
+            "id": _unique_id(f"{node.get('id')}_di", taken),
+            "bpmnElement": node.get("id"),
+        })
+        ET.SubElement(shape, dc_tag("Bounds"), {
+            "x": format_number(x),
+            "y": format_number(center_y - height / 2),
+            "width": format_number(width),
+            "height": format_number(height),
+        })
+        x += width + 50
+    return True
+
+
+def _fix_missing_edges(root: ET.Element, issues: List[ValidationIssue]) -> bool:
+    bounds = _shape_bounds(root)
+    edges = {el.get("bpmnElement") for el in root.iter(bpmndi_tag("BPMNEdge"))}
+    taken = {el.get("id") for el in root.iter() if el.get("id")}
+    plane = None
+    changed = False
+    for flow in root.iter(bpmn_tag("sequenceFlow")):
+        flow_id = flow.get("id")
+        source = bounds.get(flow.get("sourceRef") or "")
+        target = bounds.get(flow.get("targetRef") or "")
+        if not flow_id or flow_id in edges or source is None or target is None:
+            continue
+        if plane is None:
+            plane = ensure_plane(root)
+        edge = ET.SubElement(plane, bpmndi_tag("BPMNEdge"), {
+            "id": _unique_id(f"{flow_id}_di", taken),
+            "bpmnElement": flow_id,
+        })
+        for x, y in _connect(source, target):
+            ET.SubElement(edge, di_tag("waypoint"), {"x": format_number(x), "y": format_number(y)})
+        changed = True
+    return changed
+
+
+def _connect(
+    source: Tuple[float, float, float, float],
+    target: Tuple[float, float, float, float],
+) -> List[Tuple[float, float]]:
+    sx, sy, sw, sh = source
+    tx, ty, tw, th = target
+    start = (sx + sw, sy + sh / 2)
+    end = (tx, ty + th / 2)
+    if start[1] == end[1]:
+        return [start, end]
+    middle_x = (start[0] + end[0]) / 2
+    return [start, (middle_x, start[1]), (middle_x, end[1]), end]
+
+
+def _fix_executable(root: ET.Element, issues: List[ValidationIssue]) -> bool:
+    changed = False
+    for process in root.iter(bpmn_tag("process")):
+        if process.get("isExecutable") is None:
+            process.set("isExecutable", "false")
+            changed = True
+    return changed
+
+
+# Applied in this order: ids first so that later fixers see unique ids,
+# shapes before edges so that new edges can be routed between them.
+FIXERS: Dict[str, Callable[[ET.Element, List[ValidationIssue]], bool]] = {
+    "unique-ids": _fix_unique_ids,
+    "sequence-flow-ref": _fix_dangling_flows,
+    "di-shape-missing": _fix_missing_shapes,
+    "di-edge-missing": _fix_missing_edges,
+    "process-executable-missing": _fix_executable,
+}
+
+# Rule ids reported by the remote validator (bpmnlint) mapped to the local
+# rules whose fixers address them.
+REMOTE_RULES: Dict[str, Tuple[str, ...]] = {
+    "no-bpmndi": ("di-shape-missing", "di-edge-missing"),
+}
+
+_REMOTE_PREFIX = "bpmnlint:"
+
+FIXABLE_RULES = frozenset(FIXERS) | _DOCUMENT_RULES
+
+
+def fixable_rules(issue: ValidationIssue) -> Tuple[str, ...]:
+    """Local rules that fix ``issue``, whether it came from the prevalidator
+    or from the remote validator."""
+
+    rule = issue.rule or ""
+    if rule in FIXABLE_RULES:
+        return (rule,)
+    if rule.startswith(_REMOTE_PREFIX):
+        rule = rule[len(_REMOTE_PREFIX):]
+    if rule in FIXABLE_RULES:
+        return (rule,)
+    return REMOTE_RULES.get(rule, ())
+
+
+def auto_fix(xml: str, issues: Iterable[ValidationIssue]) -> Tuple[str, List[str]]:
+    """Apply deterministic fixes for the mechanical issues in ``issues``.
+
+    Returns the new document and the rules that were fixed; when nothing
+    could be fixed the original document is returned with an empty list.
+    """
+
+    issues = list(issues)
+    rules = {rule for issue in issues for rule in fixable_rules(issue)}
+    if not rules:
+        return xml, []
+
+    text = xml
+    if rules & _DOCUMENT_RULES:
+        text = _declare_missing_prefixes(_extract_document(xml))
+    root = _parse(text)
+    if root is None:
+        return xml, []
+
+    applied: List[str] = []
+    if rules & _DOCUMENT_RULES:
+        if _qualify(root) or text != xml or "<bpmn:definitions" not in xml:
+            applied.append("namespaces")
+    for rule, fixer in FIXERS.items():
+        if rule in rules and fixer(root, issues):
+            applied.append(rule)
+    if not applied:
+        return xml, []
+    return serialize_document(root), applied
+
+
+def _parse(xml: str) -> Optional[ET.Element]:
+    try:
+        return parse_document(xml)
+    except ET.ParseError:
+        return None
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from .models import GenerateRequest, ValidationReport
+
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after insert."""
+
+    def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[float, V]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V, expires_at: Optional[float] = None) -> None:
+        if expires_at is None:
+            expires_at = self._clock() + self.ttl
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteStore:
+    """Tiny key/value table with expiry, safe to use from worker threads."""
+
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str, now: float) -> Optional[tuple[float, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT expires_at, value FROM {self.table} WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    def items(self, now: float, limit: int) -> List[Tuple[str, str, float]]:
+        """The ``limit`` live entries expiring last, oldest first."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value, expires_at FROM {self.table} WHERE expires_at > ? "
+                "ORDER BY expires_at DESC LIMIT ?",
+                (now, limit),
+            ).fetchall()
+        return rows[::-1]
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        return cursor.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def result_cache_key(request: GenerateRequest, model: str) -> str:
+    material = json.dumps(
+        [
+            _normalize_text(request.text),
+            request.process_name or "",
+            request.language,
+            request.temperature,
+            request.mode,
+            model,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Validated generation results keyed by :func:`result_cache_key`.
+
+    Lookups hit the in-memory LRU first and fall back to the optional SQLite
+    tier, which survives restarts. Only validated results should be stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        sqlite_path: str = "",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl = ttl
+        self._clock = clock
+        self._memory: TTLCache[Dict[str, Any]] = TTLCache(max_entries, ttl, clock=clock)
+        self._disk = SQLiteStore(sqlite_path, "generation_results") if sqlite_path else None
+        if self._disk is not None:
+            self._disk.purge_expired(clock())
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            row = await asyncio.to_thread(self._disk.get, key, self._clock())
+            if row is not None:
+                expires_at, raw = row
+                value = json.loads(raw)
+                self._memory.set(key, value, expires_at=expires_at)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        expires_at = self._clock() + self.ttl
+        self._memory.set(key, value, expires_at=expires_at)
+        if self._disk is not None:
+            raw = json.dumps(value, ensure_ascii=False)
+            await asyncio.to_thread(self._disk.set, key, raw, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._memory),
+            "persistent": self._disk is not None,
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+
+class ValidationCache:
+    """Validation reports keyed by the canonical XML hash.
+
+    Entries are only valid for one validator ``fingerprint`` (its URL and
+    rule-set version); changing the fingerprint drops every entry.
+    """
+
+    def __init__(
+        self,
+        fingerprint: Optional[str] = None,
+        max_entries: int = 4096,
+        ttl: float = 600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.fingerprint = fingerprint
+        self._entries: TTLCache[Dict[str, Any]] = TTLCache(max_entries, ttl, clock=clock)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def set_fingerprint(self, fingerprint: str) -> None:
+        if fingerprint == self.fingerprint:
+            return
+        if self.fingerprint is not None:
+            self._entries.clear()
+            self.invalidations += 1
+        self.fingerprint = fingerprint
+
+    def get(self, key: str) -> Optional[ValidationReport]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Hand out a fresh model so that callers cannot mutate the cached one.
+        return ValidationReport.parse_obj(value)
+
+    def set(self, key: str, report: ValidationReport) -> None:
+        self._entries.set(key, report.dict())
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "invalidations": self.invalidations,
+        }
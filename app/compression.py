@@ -0,0 +1,199 @@
+"""gzip/zstd compression for API responses and validator uploads.
+
+zstd needs the ``zstandard`` package (listed in requirements.txt); where
+it is not installed only gzip is offered.
+"""
+
+import zlib
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+try:  # pragma: no cover - exercised only when zstandard is installed
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 3
+# Uploads are encoded and compressed in slices of this many characters, so
+# a large document never exists as a full UTF-8 copy next to its compressed
+# form.
+_SLICE_CHARS = 64 * 1024
+_NOT_COMPRESSIBLE = ("text/event-stream", "application/gzip", "application/zstd", "image/", "audio/", "video/")
+
+
+def available_encodings() -> List[str]:
+    """Supported codings, most preferred first."""
+
+    return [ZSTD, GZIP] if zstandard is not None else [GZIP]
+
+
+class Compressor:
+    """Incremental compressor; every :meth:`compress` call returns bytes that
+    decompress on their own, so streamed chunks reach the client promptly."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == GZIP:
+            self._gzip = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == ZSTD and zstandard is not None:
+            self._zstd = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+
+    def feed(self, data: bytes) -> bytes:
+        """Compress without flushing; output may lag behind the input."""
+
+        if self.encoding == GZIP:
+            return self._gzip.compress(data)
+        return self._zstd.compress(data)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == GZIP:
+            return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return self._zstd.compress(data) + self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == GZIP:
+            return self._gzip.compress(data) + self._gzip.flush()
+        return self._zstd.compress(data) + self._zstd.flush()
+
+
+async def compress_chunks(text: str, encoding: str) -> AsyncIterator[bytes]:
+    """UTF-8 encode and compress ``text`` slice by slice, yielding the
+    compressed output as it is produced; usable as an httpx request body."""
+
+    compressor = Compressor(encoding)
+    for start in range(0, len(text), _SLICE_CHARS):
+        chunk = compressor.feed(text[start:start + _SLICE_CHARS].encode("utf-8"))
+        if chunk:
+            yield chunk
+    yield compressor.finish()
+
+
+def negotiate(accept_encoding: Optional[str], offered: List[str]) -> Optional[str]:
+    """Pick the coding for an ``Accept-Encoding`` header, ``None`` for identity.
+
+    The highest q-value wins; ties go to the order of ``offered``.
+    """
+
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in offered:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses of at least ``minimum_size``
+    bytes with the best coding the client accepts.
+
+    Streaming responses are compressed chunk by chunk as they are sent, so
+    a large body is never held in memory in both forms.
+    """
+
+    def __init__(self, app: Callable, minimum_size: int = 1024, encodings: Optional[List[str]] = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = encodings or available_encodings()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app: Callable, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Callable = None  # type: ignore[assignment]
+        self.start: Optional[dict] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _skip(self, message: dict) -> bool:
+        if message["status"] in (204, 206, 304):
+            return True
+        content_type = ""
+        for name, value in message.get("headers", ()):
+            if name == b"content-encoding":
+                return True
+            if name == b"content-type":
+                content_type = value.decode("latin-1").lower()
+        return content_type.startswith(_NOT_COMPRESSIBLE)
+
+    async def _send_start(self, compressed: bool, length: Optional[int]) -> None:
+        assert self.start is not None
+        headers = [
+            (name, value) for name, value in self.start.get("headers", ())
+            if not (compressed and name == b"content-length")
+        ]
+        headers.append((b"vary", b"Accept-Encoding"))
+        if compressed:
+            headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+            if length is not None:
+                headers.append((b"content-length", str(length).encode("latin-1")))
+        await self.send({**self.start, "headers": headers})
+
+    async def send_compressed(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = self._skip(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                await self._send_start(False, None)
+                await self.send(message)
+                return
+            self.compressor = Compressor(self.encoding)
+            if not more_body:
+                compressed = self.compressor.finish(body)
+                await self._send_start(True, len(compressed))
+                await self.send({**message, "body": compressed})
+                return
+            await self._send_start(True, None)
+        chunk = self.compressor.compress(body) if more_body else self.compressor.finish(body)
+        await self.send({**message, "body": chunk})
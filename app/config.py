@@ -1,5 +1,6 @@
 from functools import lru_cache
 import pathlib
+from typing import Optional
 
 try:
     from dotenv import load_dotenv
@@ -8,6 +9,9 @@ except ImportError:  # pragma: no cover - fallback for environments without pyth
         return False
 from pydantic.v1 import BaseSettings, Field, validator
 
+from .compression import available_encodings
+from .logs import parse_sample_rates
+
 
 _DOTENV_PATH = pathlib.Path(__file__).resolve().parents[1] / ".env"
 load_dotenv(dotenv_path=_DOTENV_PATH, override=False)
@@ -20,20 +24,183 @@ class Settings(BaseSettings):
     gigachat_scope: str = Field("GIGACHAT_API_CORP", env="GIGACHAT_SCOPE")
     gigachat_model: str = Field("GigaChat:latest", env="GIGACHAT_MODEL")
     gigachat_token: str = Field("", env="GIGACHAT_TOKEN")
+    gigachat_streaming: bool = Field(False, env="GIGACHAT_STREAMING")
+    gigachat_token_refresh_margin_sec: float = Field(60.0, env="GIGACHAT_TOKEN_REFRESH_MARGIN_SEC")
     validator_url: str = Field("http://validator:9000/validate", env="VALIDATOR_URL")
     max_attempts_default: int = Field(3, env="MAX_ATTEMPTS_DEFAULT")
     max_attempts_hard_limit: int = Field(10, env="MAX_ATTEMPTS_HARD_LIMIT")
     max_text_len: int = Field(4000, env="MAX_TEXT_LEN")
     llm_timeout_sec: float = Field(30.0, env="LLM_TIMEOUT_SEC")
     validator_timeout_sec: float = Field(10.0, env="VALIDATOR_TIMEOUT_SEC")
+    validator_ruleset_version: str = Field("", env="VALIDATOR_RULESET_VERSION")
+    validation_cache_enabled: bool = Field(True, env="VALIDATION_CACHE_ENABLED")
+    validation_cache_max_entries: int = Field(4096, env="VALIDATION_CACHE_MAX_ENTRIES")
+    validation_cache_ttl_sec: float = Field(600.0, env="VALIDATION_CACHE_TTL_SEC")
+    gigachat_http2: bool = Field(False, env="GIGACHAT_HTTP2")
+    gigachat_max_connections: int = Field(20, env="GIGACHAT_MAX_CONNECTIONS")
+    gigachat_max_keepalive_connections: int = Field(10, env="GIGACHAT_MAX_KEEPALIVE_CONNECTIONS")
+    gigachat_keepalive_expiry_sec: float = Field(30.0, env="GIGACHAT_KEEPALIVE_EXPIRY_SEC")
+    validator_http2: bool = Field(False, env="VALIDATOR_HTTP2")
+    validator_max_connections: int = Field(20, env="VALIDATOR_MAX_CONNECTIONS")
+    validator_max_keepalive_connections: int = Field(10, env="VALIDATOR_MAX_KEEPALIVE_CONNECTIONS")
+    validator_keepalive_expiry_sec: float = Field(30.0, env="VALIDATOR_KEEPALIVE_EXPIRY_SEC")
+    validator_compression: str = Field("", env="VALIDATOR_COMPRESSION")
+    validator_compression_min_bytes: int = Field(1024, env="VALIDATOR_COMPRESSION_MIN_BYTES")
+    response_compression_enabled: bool = Field(True, env="RESPONSE_COMPRESSION_ENABLED")
+    response_compression_min_bytes: int = Field(1024, env="RESPONSE_COMPRESSION_MIN_BYTES")
+    gigachat_max_concurrency: int = Field(10, env="GIGACHAT_MAX_CONCURRENCY")
+    validator_max_concurrency: int = Field(20, env="VALIDATOR_MAX_CONCURRENCY")
+    gigachat_rate_limit_rps: float = Field(0.0, env="GIGACHAT_RATE_LIMIT_RPS")
+    gigachat_rate_limit_burst: float = Field(0.0, env="GIGACHAT_RATE_LIMIT_BURST")
+    gigachat_rate_limit_tokens_per_min: float = Field(0.0, env="GIGACHAT_RATE_LIMIT_TOKENS_PER_MIN")
+    warmup_enabled: bool = Field(True, env="WARMUP_ENABLED")
+    warmup_timeout_sec: float = Field(30.0, env="WARMUP_TIMEOUT_SEC")
+    warmup_connections: int = Field(1, env="WARMUP_CONNECTIONS")
+    warmup_validate: bool = Field(False, env="WARMUP_VALIDATE")
+    batch_max_items: int = Field(500, env="BATCH_MAX_ITEMS")
+    admission_max_in_flight: int = Field(32, env="ADMISSION_MAX_IN_FLIGHT")
+    admission_max_queue: int = Field(64, env="ADMISSION_MAX_QUEUE")
+    admission_max_queue_time_sec: float = Field(10.0, env="ADMISSION_MAX_QUEUE_TIME_SEC")
+    admission_adaptive: bool = Field(False, env="ADMISSION_ADAPTIVE")
+    admission_min_in_flight: int = Field(4, env="ADMISSION_MIN_IN_FLIGHT")
+    admission_target_latency_sec: float = Field(30.0, env="ADMISSION_TARGET_LATENCY_SEC")
+    jobs_enabled: bool = Field(False, env="JOBS_ENABLED")
+    jobs_sqlite_path: str = Field("", env="JOBS_SQLITE_PATH")
+    jobs_workers: int = Field(4, env="JOBS_WORKERS")
+    jobs_result_ttl_sec: float = Field(86400.0, env="JOBS_RESULT_TTL_SEC")
+    jobs_poll_interval_sec: float = Field(1.0, env="JOBS_POLL_INTERVAL_SEC")
+    jobs_lease_sec: float = Field(30.0, env="JOBS_LEASE_SEC")
+    gigachat_retry_attempts: int = Field(3, env="GIGACHAT_RETRY_ATTEMPTS")
+    validator_retry_attempts: int = Field(2, env="VALIDATOR_RETRY_ATTEMPTS")
+    retry_backoff_base_sec: float = Field(1.0, env="RETRY_BACKOFF_BASE_SEC")
+    retry_backoff_max_sec: float = Field(8.0, env="RETRY_BACKOFF_MAX_SEC")
+    retry_budget_ratio: float = Field(0.2, env="RETRY_BUDGET_RATIO")
+    retry_budget_min_retries: int = Field(10, env="RETRY_BUDGET_MIN_RETRIES")
+    retry_budget_window_sec: float = Field(10.0, env="RETRY_BUDGET_WINDOW_SEC")
+    circuit_breaker_failure_threshold: int = Field(5, env="CIRCUIT_BREAKER_FAILURE_THRESHOLD")
+    circuit_breaker_reset_timeout_sec: float = Field(30.0, env="CIRCUIT_BREAKER_RESET_TIMEOUT_SEC")
     log_level: str = Field("INFO", env="LOG_LEVEL")
+    log_async: bool = Field(True, env="LOG_ASYNC")
+    log_queue_size: int = Field(10000, env="LOG_QUEUE_SIZE")
+    log_sample_rates: str = Field("", env="LOG_SAMPLE_RATES")
+    auto_fix_enabled: bool = Field(True, env="AUTO_FIX_ENABLED")
+    prevalidation_enabled: bool = Field(True, env="PREVALIDATION_ENABLED")
+    prevalidation_pool_workers: int = Field(0, env="PREVALIDATION_POOL_WORKERS")
+    prevalidation_pool_min_bytes: int = Field(262144, env="PREVALIDATION_POOL_MIN_BYTES")
+    result_cache_enabled: bool = Field(True, env="RESULT_CACHE_ENABLED")
+    result_cache_max_entries: int = Field(1024, env="RESULT_CACHE_MAX_ENTRIES")
+    result_cache_ttl_sec: float = Field(3600.0, env="RESULT_CACHE_TTL_SEC")
+    result_cache_sqlite_path: str = Field("", env="RESULT_CACHE_SQLITE_PATH")
+    near_duplicate_enabled: bool = Field(False, env="NEAR_DUPLICATE_ENABLED")
+    near_duplicate_threshold: float = Field(0.9, env="NEAR_DUPLICATE_THRESHOLD")
+    near_duplicate_max_entries: int = Field(2048, env="NEAR_DUPLICATE_MAX_ENTRIES")
+    near_duplicate_ttl_sec: float = Field(86400.0, env="NEAR_DUPLICATE_TTL_SEC")
+    near_duplicate_sqlite_path: str = Field("", env="NEAR_DUPLICATE_SQLITE_PATH")
+    few_shot_enabled: bool = Field(True, env="FEW_SHOT_ENABLED")
+    few_shot_k: int = Field(2, env="FEW_SHOT_K")
+    few_shot_token_budget: int = Field(1500, env="FEW_SHOT_TOKEN_BUDGET")
+    few_shot_min_similarity: float = Field(0.1, env="FEW_SHOT_MIN_SIMILARITY")
+    few_shot_max_entries: int = Field(1000, env="FEW_SHOT_MAX_ENTRIES")
+    few_shot_sqlite_path: str = Field("", env="FEW_SHOT_SQLITE_PATH")
+    minimal_repair_enabled: bool = Field(True, env="MINIMAL_REPAIR_ENABLED")
+    repair_prompt_token_budget: int = Field(3000, env="REPAIR_PROMPT_TOKEN_BUDGET")
+    hedged_candidates: int = Field(1, env="HEDGED_CANDIDATES")
+    hedged_candidates_hard_limit: int = Field(8, env="HEDGED_CANDIDATES_HARD_LIMIT")
+    hedged_max_concurrency: int = Field(4, env="HEDGED_MAX_CONCURRENCY")
+    hedged_temperature_step: float = Field(0.2, env="HEDGED_TEMPERATURE_STEP")
 
-    @validator("max_attempts_default", "max_attempts_hard_limit")
+    @validator(
+        "max_attempts_default",
+        "max_attempts_hard_limit",
+        "gigachat_retry_attempts",
+        "validator_retry_attempts",
+    )
     def validate_attempts(cls, value: int) -> int:
         if value < 1:
             raise ValueError("Attempts must be positive")
         return value
 
+    @validator(
+        "circuit_breaker_failure_threshold",
+        "result_cache_max_entries",
+        "near_duplicate_max_entries",
+        "few_shot_k",
+        "few_shot_token_budget",
+        "few_shot_max_entries",
+        "validation_cache_max_entries",
+        "hedged_candidates",
+        "hedged_candidates_hard_limit",
+        "repair_prompt_token_budget",
+        "batch_max_items",
+        "jobs_workers",
+        "admission_max_in_flight",
+        "admission_min_in_flight",
+        "hedged_max_concurrency",
+    )
+    def validate_positive(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("Value must be a positive integer")
+        return value
+
+    @validator(
+        "gigachat_max_connections",
+        "gigachat_max_keepalive_connections",
+        "validator_max_connections",
+        "validator_max_keepalive_connections",
+    )
+    def validate_pool_size(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError("Connection pool sizes must be positive")
+        return value
+
+    @validator(
+        "gigachat_max_concurrency",
+        "validator_max_concurrency",
+        "admission_max_queue",
+        "log_queue_size",
+        "warmup_connections",
+        "validator_compression_min_bytes",
+        "response_compression_min_bytes",
+    )
+    def validate_concurrency(cls, value: int) -> int:
+        if value < 0:
+            raise ValueError("Limits must not be negative")
+        return value
+
+    @validator(
+        "gigachat_rate_limit_rps",
+        "gigachat_rate_limit_burst",
+        "gigachat_rate_limit_tokens_per_min",
+    )
+    def validate_rate_limit(cls, value: float) -> float:
+        if value < 0:
+            raise ValueError("Rate limits must not be negative")
+        return value
+
+    @validator("jobs_sqlite_path")
+    def validate_jobs_path(cls, value: str, values: Optional[dict] = None) -> str:
+        if not value and (values or {}).get("jobs_enabled"):
+            raise ValueError("JOBS_SQLITE_PATH must be set when JOBS_ENABLED is true")
+        return value
+
+    @validator("log_sample_rates")
+    def validate_sample_rates(cls, value: str) -> str:
+        parse_sample_rates(value)
+        return value
+
+    @validator("near_duplicate_threshold", "few_shot_min_similarity")
+    def validate_threshold(cls, value: float) -> float:
+        if not 0 < value <= 1:
+            raise ValueError("Similarity thresholds must be in (0, 1]")
+        return value
+
+    @validator("validator_compression")
+    def validate_compression(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value and value not in available_encodings():
+            raise ValueError(f"Unsupported validator compression {value!r}, expected one of {available_encodings()}")
+        return value
+
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -0,0 +1,225 @@
+"""Store of validated (description, diagram) pairs used as few-shot examples.
+
+Retrieval ranks stored descriptions by word-set Jaccard similarity to the
+request, computed through an inverted index so that only entries sharing a
+word with the request are touched. Diagrams are kept without DI and with
+inter-tag whitespace removed, which keeps examples small in the prompt.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Set, Tuple
+
+from .cache import SQLiteStore
+from .layout import semantic_only
+from .repair import estimate_tokens
+from .similarity import words
+
+_BETWEEN_TAGS = re.compile(r">\s+<")
+_XML_DECLARATION = re.compile(r"^<\?xml[^>]*\?>\s*")
+
+
+def compact_diagram(xml: str) -> str:
+    """``xml`` without DI, XML declaration and whitespace between tags."""
+
+    return _BETWEEN_TAGS.sub("><", _XML_DECLARATION.sub("", semantic_only(xml))).strip()
+
+
+class Example:
+    __slots__ = ("language", "text", "bpmn_xml", "words", "tokens")
+
+    def __init__(self, language: str, text: str, bpmn_xml: str):
+        self.language = language
+        self.text = text
+        self.bpmn_xml = bpmn_xml
+        self.words = words(text)
+        self.tokens = estimate_tokens(text) + estimate_tokens(bpmn_xml)
+
+
+class _Usage:
+    def __init__(self) -> None:
+        self.generations = 0
+        self.validated = 0
+        self.attempts = 0
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "generations": self.generations,
+            "validated": self.validated,
+            "attempts": self.attempts,
+            "attempts_per_validated": round(self.attempts / self.validated, 3) if self.validated else None,
+        }
+
+
+class ExampleStore:
+    """Validated examples retrieved per language for few-shot prompts.
+
+    ``select`` returns up to ``k`` of the most similar examples (at least
+    ``min_similarity``) whose combined size fits ``token_budget``. The store
+    keeps at most ``max_entries`` examples, evicting the least recently
+    added or used, and persists them to SQLite when ``sqlite_path`` is set.
+    Ranking and indexing run in a worker thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        k: int = 2,
+        token_budget: int = 1500,
+        min_similarity: float = 0.1,
+        max_entries: int = 1000,
+        ttl: float = 30 * 86400.0,
+        sqlite_path: str = "",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.k = k
+        self.token_budget = token_budget
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Example]" = OrderedDict()
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._lock = threading.Lock()
+        self._selections = 0
+        self._select_seconds = 0.0
+        # Attempts used by generations with and without examples, to tell
+        # whether the examples reduce LLM calls per validated diagram.
+        self.usage = {True: _Usage(), False: _Usage()}
+        self._disk = SQLiteStore(sqlite_path, "few_shot_examples") if sqlite_path else None
+        if self._disk is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        now = self._clock()
+        self._disk.purge_expired(now)
+        for key, raw, _ in self._disk.items(now, self.max_entries):
+            value = json.loads(raw)
+            self._insert(key, Example(value["language"], value["text"], value["bpmn_xml"]))
+
+    def _insert(self, key: str, example: Example) -> List[str]:
+        self._remove(key)
+        self._entries[key] = example
+        for word in example.words:
+            self._postings.setdefault((example.language, word), set()).add(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def _remove(self, key: str) -> None:
+        example = self._entries.pop(key, None)
+        if example is None:
+            return
+        for word in example.words:
+            posting = self._postings.get((example.language, word))
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[(example.language, word)]
+
+    async def select(self, text: str, language: str) -> List[Tuple[float, Example]]:
+        """``(similarity, example)`` pairs, most similar first, within ``k``
+        and the token budget."""
+
+        return await asyncio.to_thread(self._select, text, language)
+
+    def _select(self, text: str, language: str) -> List[Tuple[float, Example]]:
+        started = time.monotonic()
+        query = words(text)
+        with self._lock:
+            selected = self._rank(query, language)
+            self._selections += 1
+            self._select_seconds += time.monotonic() - started
+        return selected
+
+    def _rank(self, query: Set[str], language: str) -> List[Tuple[float, Example]]:
+        common: Dict[str, int] = {}
+        for word in query:
+            for key in self._postings.get((language, word), ()):
+                common[key] = common.get(key, 0) + 1
+        scored = []
+        for key, shared in common.items():
+            example = self._entries[key]
+            score = shared / (len(query) + len(example.words) - shared)
+            if score >= self.min_similarity and example.tokens <= self.token_budget:
+                scored.append((score, key))
+
+        selected: List[Tuple[float, Example]] = []
+        budget = self.token_budget
+        for score, key in sorted(scored, reverse=True):
+            if len(selected) >= self.k:
+                break
+            example = self._entries[key]
+            if example.tokens > budget:
+                continue
+            budget -= example.tokens
+            self._entries.move_to_end(key)
+            selected.append((score, example))
+        return selected
+
+    async def add(self, text: str, language: str, bpmn_xml: str) -> None:
+        """Store a validated pair; the same description replaces its example."""
+
+        await asyncio.to_thread(self._add, text, language, bpmn_xml)
+
+    def _add(self, text: str, language: str, bpmn_xml: str) -> None:
+        compact = compact_diagram(bpmn_xml)
+        example = Example(language, text, compact)
+        if example.tokens > self.token_budget:
+            return
+        key = hashlib.sha256(f"{language}|{' '.join(text.split())}".encode("utf-8")).hexdigest()
+        with self._lock:
+            evicted = self._insert(key, example)
+        if self._disk is not None:
+            raw = json.dumps({"language": language, "text": text, "bpmn_xml": compact}, ensure_ascii=False)
+            self._persist(key, raw, self._clock() + self.ttl, evicted)
+
+    def _persist(self, key: str, raw: str, expires_at: float, evicted: List[str]) -> None:
+        self._disk.set(key, raw, expires_at)
+        for old in evicted:
+            self._disk.delete(old)
+
+    def record(self, with_examples: bool, attempts_used: int, validated: bool) -> None:
+        usage = self.usage[with_examples]
+        usage.generations += 1
+        usage.attempts += attempts_used
+        if validated:
+            usage.validated += 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": len(self._entries),
+            "persistent": self._disk is not None,
+            "select_ms_avg": round(self._select_seconds / self._selections * 1000, 3) if self._selections else 0.0,
+            "with_examples": self.usage[True].stats(),
+            "without_examples": self.usage[False].stats(),
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+
+def format_examples(examples: List[Tuple[float, Example]], note: str = "") -> str:
+    """Prompt block with the examples and ``note`` after them, empty without
+    any examples."""
+
+    if not examples:
+        return ""
+    blocks = [
+        f"Пример {index}. Описание: {example.text}\nBPMN (без DI): {example.bpmn_xml}"
+        for index, (_, example) in enumerate(examples, 1)
+    ]
+    if note:
+        blocks.append(note)
+    return "Примеры похожих процессов, прошедших валидацию:\n" + "\n".join(blocks) + "\n"
@@ -1,18 +1,92 @@
+import asyncio
+import json
 import logging
 import time
 import uuid
+from contextlib import asynccontextmanager, nullcontext
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
 
 import httpx
 
+from . import tracing
+from .metrics import LLM_TOKENS, TOKEN_FETCH_SECONDS, UPSTREAM_ERRORS
+from .rate_limit import RateLimiter
+from .resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy, call_with_retry
+from .xml_stream import BpmnStreamChecker
+
 logger = logging.getLogger(__name__)
 
+# A token this close to expiry is treated as stale on the request path.
+_TOKEN_STALE_MARGIN_SEC = 30.0
+# Pause between background refresh attempts after a failure, or when the
+# issued token is shorter-lived than the refresh margin.
+_TOKEN_REFRESH_RETRY_SEC = 5.0
+# Epoch timestamps above this are in milliseconds (GigaChat reports
+# ``expires_at`` in ms).
+_EPOCH_MS_THRESHOLD = 1e11
+
+_SSE_DONE = object()
+
+T = TypeVar("T")
+
 
 class GigaChatError(Exception):
     pass
 
 
+class StreamedCompletion:
+    def __init__(self) -> None:
+        self.content = ""
+        self.aborted = False
+        self.abort_reason: Optional[str] = None
+        self.xml_complete = False
+        self.ttfb_ms: Optional[float] = None
+        self.abort_ms: Optional[float] = None
+        self.total_ms: Optional[float] = None
+
+    def debug(self) -> Dict[str, object]:
+        return {
+            "ttfb_ms": self.ttfb_ms,
+            "total_ms": self.total_ms,
+            "aborted": self.aborted,
+            "abort_reason": self.abort_reason,
+            "abort_ms": self.abort_ms,
+            "xml_complete": self.xml_complete,
+        }
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def _estimate_tokens(payload: dict) -> float:
+    """Prompt size in tokens (about three characters per token) plus room
+    for a completion of similar size, charged before the call; the
+    difference to the reported ``usage`` is settled afterwards."""
+
+    chars = sum(len(message.get("content") or "") for message in payload.get("messages", []))
+    return 2 * (chars // 3 + 1)
+
+
+def _error_status(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return str(exc.response.status_code)
+    if isinstance(exc, httpx.HTTPError):
+        return "transport"
+    return "invalid_response"
+
+
+def _is_retryable(exc: Exception) -> bool:
+    return isinstance(exc, (httpx.HTTPError, GigaChatError))
+
+
+def _is_upstream_failure(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
 class GigaChatClient:
     def __init__(
         self,
@@ -23,6 +97,13 @@ class GigaChatClient:
         model: str,
         timeout: float = 30.0,
         token: str = "",
+        http_client: Optional[httpx.AsyncClient] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        token_refresh_margin: float = 60.0,
+        max_concurrency: int = 0,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.api_url = api_url.rstrip("/")
         self.auth_url = auth_url
@@ -32,13 +113,45 @@ class GigaChatClient:
         self.timeout = timeout
         self._access_token = token
         self._token_expires_at: Optional[float] = None
+        self._http_client = http_client
+        self.retry_policy = retry_policy or RetryPolicy(attempts=3)
+        self.retry_budget = retry_budget
+        self.breaker = breaker
+        self.token_refresh_margin = token_refresh_margin
+        self._token_fetch: Optional[asyncio.Future] = None
+        self._token_refresher: Optional[asyncio.Task] = None
+        # Caps concurrent completion calls (0 = unlimited).
+        self._concurrency = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.rate_limiter = rate_limiter
+
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._http_client is not None:
+            yield self._http_client
+            return
+        async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
+            yield client
 
     async def _get_access_token(self) -> str:
         if self._access_token and (
-            self._token_expires_at is None or self._token_expires_at > time.time() + 30
+            self._token_expires_at is None
+            or self._token_expires_at > time.time() + _TOKEN_STALE_MARGIN_SEC
         ):
             return self._access_token
+        return await self._refresh_access_token()
+
+    async def _refresh_access_token(self) -> str:
+        """Single-flight token refresh: concurrent callers share one OAuth call."""
+
+        fetch = self._token_fetch
+        if fetch is None or fetch.done():
+            fetch = asyncio.ensure_future(self._fetch_access_token())
+            self._token_fetch = fetch
+        # Shield the shared fetch so that a cancelled waiter does not cancel
+        # it for everybody else.
+        return await asyncio.shield(fetch)
 
+    async def _fetch_access_token(self) -> str:
         if not self.auth_url or not self.credentials:
             raise GigaChatError("GigaChat credentials are not configured")
 
@@ -50,8 +163,12 @@ class GigaChatClient:
         }
         data = {"scope": self.scope}
 
-        async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-            response = await client.post(self.auth_url, headers=headers, data=data)
+        started = time.monotonic()
+        try:
+            async with self._client() as client:
+                response = await client.post(self.auth_url, headers=headers, data=data)
+        finally:
+            TOKEN_FETCH_SECONDS.observe(time.monotonic() - started)
         response.raise_for_status()
 
         payload = response.json()
@@ -78,7 +195,7 @@ class GigaChatClient:
     def _parse_expiry(self, expires_at: object, expires_in: object) -> Optional[float]:
         now = time.time()
         if isinstance(expires_at, (int, float)):
-            return float(expires_at)
+            return self._epoch_seconds(float(expires_at))
         if isinstance(expires_at, str):
             try:
                 parsed = datetime.fromisoformat(expires_at.replace("Z", "+00:00"))
@@ -86,61 +203,233 @@ class GigaChatClient:
             except ValueError:
                 pass
             try:
-                return float(expires_at)
+                return self._epoch_seconds(float(expires_at))
             except ValueError:
                 pass
         if isinstance(expires_in, (int, float)):
             return now + float(expires_in)
         return now + 25 * 60
 
-    async def _post_completion_with_retry(self, payload: dict) -> str:
-        backoff = 1.0
-        last_exc: Optional[Exception] = None
-        for attempt in range(3):
+    @staticmethod
+    def _epoch_seconds(value: float) -> float:
+        if value > _EPOCH_MS_THRESHOLD:
+            return value / 1000.0
+        return value
+
+    def _seconds_until_refresh(self) -> float:
+        if not self._access_token:
+            return 0.0
+        if self._token_expires_at is None:
+            # Static token without a known expiry: re-check later in case a
+            # 401 cleared it.
+            return self.token_refresh_margin
+        return max(0.0, self._token_expires_at - self.token_refresh_margin - time.time())
+
+    async def _token_refresh_loop(self) -> None:
+        while True:
+            delay = self._seconds_until_refresh()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
             try:
-                token = await self._get_access_token()
-                headers = {
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json",
-                }
-                async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-                    response = await client.post(
-                        f"{self.api_url}/chat/completions",
-                        headers=headers,
-                        json=payload,
-                    )
-                response.raise_for_status()
-                data = response.json()
-                logger.info(
-                    "gigachat_completion_response",
-                    extra={
-                        "status": response.status_code,
-                        "usage": data.get("usage"),
-                        "choices_count": len(data.get("choices", [])),
-                    },
-                )
-                return self._extract_content(data)
-            except httpx.HTTPStatusError as exc:
-                last_exc = exc
-                if exc.response.status_code == 401:
-                    self._access_token = ""
-                    self._token_expires_at = None
-                logger.warning(
-                    "gigachat_request_failed",
-                    extra={"error": str(exc), "attempt": attempt + 1},
-                )
-                time.sleep(backoff)
-                backoff *= 2
+                await self._refresh_access_token()
             except (httpx.HTTPError, GigaChatError) as exc:
-                last_exc = exc
+                logger.warning("gigachat_token_refresh_failed", extra={"error": str(exc)})
+                await asyncio.sleep(_TOKEN_REFRESH_RETRY_SEC)
+                continue
+            except Exception as exc:  # noqa: BLE001 - e.g. a malformed OAuth body must not end the refresher
+                logger.exception("gigachat_token_refresh_failed", extra={"error": f"{type(exc).__name__}: {exc}"})
+                await asyncio.sleep(_TOKEN_REFRESH_RETRY_SEC)
+                continue
+            if self._seconds_until_refresh() <= 0:
+                await asyncio.sleep(_TOKEN_REFRESH_RETRY_SEC)
+
+    def start_token_refresher(self) -> None:
+        """Renew the token in the background ``token_refresh_margin`` seconds
+        before it expires so that requests never wait on OAuth."""
+
+        if self._token_refresher is not None or not self.auth_url or not self.credentials:
+            return
+        self._token_refresher = asyncio.create_task(self._token_refresh_loop())
+
+    async def stop_token_refresher(self) -> None:
+        refresher, self._token_refresher = self._token_refresher, None
+        if refresher is None:
+            return
+        refresher.cancel()
+        try:
+            await refresher
+        except asyncio.CancelledError:
+            pass
+
+    def _record_usage(self, usage: Optional[dict], payload: dict) -> None:
+        if not isinstance(usage, dict):
+            return
+        tracing.add_usage(usage)
+        for kind in ("prompt", "completion"):
+            count = usage.get(f"{kind}_tokens")
+            if isinstance(count, (int, float)):
+                LLM_TOKENS.inc(kind, amount=count)
+        total = usage.get("total_tokens")
+        if self.rate_limiter is not None and isinstance(total, (int, float)):
+            self.rate_limiter.record_usage(total, _estimate_tokens(payload))
+
+    def _raise_for_status(self, response: httpx.Response) -> None:
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(response.status_code, response.headers)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            if response.status_code == 401:
+                self._access_token = ""
+                self._token_expires_at = None
+            raise
+
+    async def _completion_headers(self, accept: str) -> Dict[str, str]:
+        with tracing.span("token"):
+            token = await self._get_access_token()
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Accept": accept,
+        }
+
+    async def _post_completion(self, payload: dict) -> str:
+        headers = await self._completion_headers("application/json")
+        async with self._client() as client:
+            response = await client.post(
+                f"{self.api_url}/chat/completions",
+                headers=headers,
+                json=payload,
+            )
+        self._raise_for_status(response)
+        data = response.json()
+        self._record_usage(data.get("usage"), payload)
+        logger.info(
+            "gigachat_completion_response",
+            extra={
+                "status": response.status_code,
+                "usage": data.get("usage"),
+                "choices_count": len(data.get("choices", [])),
+            },
+        )
+        return self._extract_content(data)
+
+    async def _stream_completion(self, payload: dict) -> StreamedCompletion:
+        headers = await self._completion_headers("text/event-stream")
+        checker = BpmnStreamChecker()
+        completion = StreamedCompletion()
+        parts: List[str] = []
+        usage = None
+        started = time.monotonic()
+        async with self._client() as client:
+            async with client.stream(
+                "POST",
+                f"{self.api_url}/chat/completions",
+                headers=headers,
+                json=payload,
+            ) as response:
+                self._raise_for_status(response)
+                async for line in response.aiter_lines():
+                    chunk = self._parse_sse_line(line)
+                    if chunk is None:
+                        continue
+                    if chunk is _SSE_DONE:
+                        break
+                    usage = chunk.get("usage") or usage
+                    delta = self._extract_delta(chunk)
+                    if not delta:
+                        continue
+                    if completion.ttfb_ms is None:
+                        completion.ttfb_ms = _elapsed_ms(started)
+                    parts.append(delta)
+                    reason = checker.feed(delta)
+                    if reason is not None:
+                        # Leaving the stream context closes the connection, so
+                        # the upstream stops generating for us.
+                        completion.aborted = True
+                        completion.abort_reason = reason
+                        completion.abort_ms = _elapsed_ms(started)
+                        break
+        self._record_usage(usage, payload)
+        completion.content = "".join(parts)
+        completion.total_ms = _elapsed_ms(started)
+        completion.xml_complete = checker.complete
+        logger.info(
+            "gigachat_completion_stream",
+            extra={
+                "status": response.status_code,
+                "usage": usage,
+                "aborted": completion.aborted,
+                "abort_reason": completion.abort_reason,
+                "ttfb_ms": completion.ttfb_ms,
+                "total_ms": completion.total_ms,
+            },
+        )
+        return completion
+
+    @staticmethod
+    def _parse_sse_line(line: str):
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return _SSE_DONE
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            raise GigaChatError("Unexpected stream event from GigaChat")
+        if not isinstance(chunk, dict):
+            raise GigaChatError("Unexpected stream event from GigaChat")
+        return chunk
+
+    @staticmethod
+    def _extract_delta(chunk: dict) -> str:
+        try:
+            return chunk["choices"][0]["delta"].get("content") or ""
+        except (KeyError, IndexError, TypeError, AttributeError):
+            raise GigaChatError("Unexpected stream event from GigaChat")
+
+    async def _with_retry(self, request: Callable[[], Awaitable[T]], tokens: float = 0.0) -> T:
+        attempts = 0
+
+        async def operation() -> T:
+            nonlocal attempts
+            attempts += 1
+            try:
+                # Wait for the rate limit before taking a concurrency slot so
+                # that throttled callers do not hold slots.
+                if self.rate_limiter is not None:
+                    with tracing.span("rate_limit_wait"):
+                        await self.rate_limiter.acquire(tokens)
+                async with self._concurrency or nullcontext():
+                    return await request()
+            except (httpx.HTTPError, GigaChatError) as exc:
+                UPSTREAM_ERRORS.inc("gigachat", _error_status(exc))
                 logger.warning(
                     "gigachat_request_failed",
-                    extra={"error": str(exc), "attempt": attempt + 1},
+                    extra={"error": str(exc), "attempt": attempts},
                 )
-                time.sleep(backoff)
-                backoff *= 2
-        raise GigaChatError(str(last_exc))
+                raise
+
+        try:
+            return await call_with_retry(
+                operation,
+                policy=self.retry_policy,
+                budget=self.retry_budget,
+                breaker=self.breaker,
+                is_retryable=_is_retryable,
+                is_failure=_is_upstream_failure,
+            )
+        except CircuitOpenError as exc:
+            raise GigaChatError(str(exc)) from exc
+        except GigaChatError:
+            raise
+        except httpx.HTTPError as exc:
+            raise GigaChatError(str(exc)) from exc
+
+    async def _post_completion_with_retry(self, payload: dict) -> str:
+        return await self._with_retry(lambda: self._post_completion(payload), _estimate_tokens(payload))
 
     @staticmethod
     def _extract_content(data: dict) -> str:
@@ -149,20 +438,22 @@ class GigaChatClient:
         except (KeyError, IndexError, TypeError):
             raise GigaChatError("Unexpected response format from GigaChat")
 
-    async def generate_bpmn(self, prompt: str, temperature: float) -> str:
-        payload = {
+    def _payload(self, prompt: str, temperature: float, stream: bool) -> dict:
+        return {
             "model": self.model,
             "temperature": temperature,
             "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
+            "stream": stream,
         }
-        return await self._post_completion_with_retry(payload)
+
+    async def generate_bpmn(self, prompt: str, temperature: float) -> str:
+        return await self._post_completion_with_retry(self._payload(prompt, temperature, False))
 
     async def repair_bpmn(self, prompt: str, temperature: float) -> str:
-        payload = {
-            "model": self.model,
-            "temperature": temperature,
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
-        }
-        return await self._post_completion_with_retry(payload)
+        return await self._post_completion_with_retry(self._payload(prompt, temperature, False))
+
+    async def stream_bpmn(self, prompt: str, temperature: float) -> StreamedCompletion:
+        """Streamed completion that stops as soon as the output cannot be BPMN."""
+
+        payload = self._payload(prompt, temperature, True)
+        return await self._with_retry(lambda: self._stream_completion(payload), _estimate_tokens(payload))
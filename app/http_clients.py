@@ -0,0 +1,60 @@
+import logging
+
+import httpx
+
+from .config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client(
+    name: str,
+    timeout: float,
+    http2: bool,
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    verify: bool = True,
+) -> httpx.AsyncClient:
+    if http2 and not _http2_available():
+        logger.warning("http2_unavailable", extra={"upstream": name})
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2, verify=verify)
+
+
+def build_gigachat_http_client(settings: Settings) -> httpx.AsyncClient:
+    """Shared client for both the GigaChat OAuth and completion endpoints."""
+
+    return _build_client(
+        "gigachat",
+        timeout=settings.llm_timeout_sec,
+        http2=settings.gigachat_http2,
+        max_connections=settings.gigachat_max_connections,
+        max_keepalive_connections=settings.gigachat_max_keepalive_connections,
+        keepalive_expiry=settings.gigachat_keepalive_expiry_sec,
+        verify=False,
+    )
+
+
+def build_validator_http_client(settings: Settings) -> httpx.AsyncClient:
+    return _build_client(
+        "validator",
+        timeout=settings.validator_timeout_sec,
+        http2=settings.validator_http2,
+        max_connections=settings.validator_max_connections,
+        max_keepalive_connections=settings.validator_max_keepalive_connections,
+        keepalive_expiry=settings.validator_keepalive_expiry_sec,
+    )
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .logs import request_id_var
+from .metrics import JOB_QUEUE_DEPTH, JOB_QUEUE_OLDEST_AGE, JOB_QUEUE_RUNNING
+from .models import GenerateRequest
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# A job whose lease ran out this many times (its worker crashed or hung) is
+# given up on instead of being picked up again.
+_MAX_CLAIMS = 3
+
+JobHandler = Callable[[GenerateRequest], Awaitable[Tuple[int, Dict[str, Any]]]]
+
+
+class JobStore:
+    """SQLite table of generation jobs, safe to use from worker threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+                "result TEXT, result_status INTEGER, claims INTEGER NOT NULL DEFAULT 0, "
+                "owner TEXT, lease_expires_at REAL, "
+                "created_at REAL NOT NULL, started_at REAL, finished_at REAL, expires_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def enqueue(self, job_id: str, request: str, now: float) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, request, now),
+            )
+
+    def claim(self, now: float, owner: str, lease: float) -> Optional[Tuple[str, str]]:
+        """Mark the oldest queued job as running for ``owner`` until
+        ``now + lease`` and return its id and request.
+
+        Selecting and marking the job is a single statement, so workers of
+        other processes sharing the file cannot claim the same job.
+        """
+
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started_at = ?, lease_expires_at = ?, claims = claims + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "RETURNING id, request",
+                (JOB_RUNNING, owner, now, now + lease, JOB_QUEUED),
+            ).fetchone()
+
+    def heartbeat(self, job_id: str, owner: str, now: float, lease: float) -> bool:
+        """Extend the lease of a job ``owner`` is running; ``False`` once the
+        job was recovered and is no longer ``owner``'s."""
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = ?",
+                (now + lease, job_id, owner, JOB_RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def finish(
+        self, job_id: str, owner: str, status: str, result_status: int, result: str, now: float, ttl: float
+    ) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result_status = ?, result = ?, finished_at = ?, expires_at = ?, "
+                "lease_expires_at = NULL WHERE id = ? AND owner = ? AND status = ?",
+                (status, result_status, result, now, now + ttl, job_id, owner, JOB_RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def recover(self, now: float, ttl: float) -> Tuple[int, int]:
+        """Requeue running jobs whose lease expired: their worker died or
+        stopped sending heartbeats.
+
+        Jobs that already lost ``_MAX_CLAIMS`` leases are failed instead.
+        Returns the number of requeued and failed jobs.
+        """
+
+        result = json.dumps({"detail": "job interrupted too many times"})
+        with self._lock, self._conn:
+            failed = self._conn.execute(
+                "UPDATE jobs SET status = ?, result_status = 500, result = ?, finished_at = ?, expires_at = ?, "
+                "owner = NULL, lease_expires_at = NULL WHERE status = ? AND lease_expires_at <= ? AND claims >= ?",
+                (JOB_FAILED, result, now, now + ttl, JOB_RUNNING, now, _MAX_CLAIMS),
+            ).rowcount
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, lease_expires_at = NULL "
+                "WHERE status = ? AND lease_expires_at <= ?",
+                (JOB_QUEUED, JOB_RUNNING, now),
+            ).rowcount
+        return requeued, failed
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result_status, result, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, result_status, result, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "result_status": result_status,
+            "result": json.loads(result) if result else None,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    def oldest_queued(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = ?", (JOB_QUEUED,)
+            ).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """Runs queued jobs through ``handler`` on a pool of asyncio workers.
+
+    ``handler`` returns the status code and body that ``/generate-bpmn``
+    would answer with. A running job is leased to this queue for ``lease``
+    seconds and the lease is renewed while the job runs; jobs whose lease
+    expired (their process died) are requeued by any queue on the same
+    store, on start and while idle.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: JobHandler,
+        workers: int = 4,
+        result_ttl: float = 86400.0,
+        poll_interval: float = 1.0,
+        lease: float = 30.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._clock = clock
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.busy = 0
+        self.completed = 0
+        self.recovered = 0
+
+    async def start(self) -> None:
+        await self._maintain()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Cancel the workers; their jobs stay ``running`` and are recovered
+        once their lease expires."""
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, request: GenerateRequest) -> str:
+        job_id = uuid.uuid4().hex
+        payload = json.dumps(request.dict(), ensure_ascii=False)
+        await asyncio.to_thread(self.store.enqueue, job_id, payload, self._clock())
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _worker(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            claimed = await asyncio.to_thread(self.store.claim, self._clock(), self.owner, self.lease)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    await self._maintain()
+                continue
+            await self._run(*claimed)
+
+    async def _maintain(self) -> None:
+        """Requeue jobs with an expired lease and drop expired results."""
+
+        now = self._clock()
+        requeued, failed = await asyncio.to_thread(self.store.recover, now, self.result_ttl)
+        if requeued or failed:
+            logger.warning("jobs_recovered", extra={"requeued": requeued, "failed": failed})
+        self.recovered += requeued
+        await asyncio.to_thread(self.store.purge_expired, now)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await asyncio.to_thread(self.store.heartbeat, job_id, self.owner, self._clock(), self.lease):
+                logger.warning("job_lease_lost", extra={"job_id": job_id})
+                return
+
+    async def _run(self, job_id: str, payload: str) -> None:
+        self.busy += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        # Log lines of the generation carry the job id as their request id.
+        token = request_id_var.set(job_id)
+        try:
+            request = GenerateRequest.parse_obj(json.loads(payload))
+            status_code, body = await self.handler(request)
+            status = JOB_DONE if status_code < 500 else JOB_FAILED
+        except Exception as exc:  # noqa: BLE001 - a job must never kill its worker
+            logger.exception("job_failed", extra={"job_id": job_id, "error": str(exc)})
+            status_code, body, status = 500, {"detail": "internal error"}, JOB_FAILED
+        finally:
+            request_id_var.reset(token)
+            heartbeat.cancel()
+            self.busy -= 1
+        finished = await asyncio.to_thread(
+            self.store.finish,
+            job_id,
+            self.owner,
+            status,
+            status_code,
+            json.dumps(body, ensure_ascii=False),
+            self._clock(),
+            self.result_ttl,
+        )
+        if not finished:
+            # The lease expired mid-run and the job went back to the queue.
+            logger.warning("job_result_discarded", extra={"job_id": job_id})
+            return
+        self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        counts = self.store.counts()
+        oldest = self.store.oldest_queued()
+        oldest_age = round(self._clock() - oldest, 3) if oldest is not None else 0.0
+        JOB_QUEUE_DEPTH.set(counts[JOB_QUEUED])
+        JOB_QUEUE_RUNNING.set(counts[JOB_RUNNING])
+        JOB_QUEUE_OLDEST_AGE.set(oldest_age)
+        return {
+            "depth": counts[JOB_QUEUED],
+            "running": counts[JOB_RUNNING],
+            "done": counts[JOB_DONE],
+            "failed": counts[JOB_FAILED],
+            "oldest_queued_age_sec": oldest_age,
+            "workers": len(self._tasks),
+            "busy_workers": self.busy,
+            "completed": self.completed,
+            "recovered": self.recovered,
+        }
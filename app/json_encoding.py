@@ -0,0 +1,27 @@
+"""JSON encoding shared by log lines and responses.
+
+``orjson`` is used when it is installed (it is listed in requirements.txt);
+the stdlib encoder is the fallback and produces the same compact output.
+"""
+
+import json
+from typing import Any, Callable, Optional
+
+try:  # pragma: no cover - exercised only when orjson is installed
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def encode_json(content: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Compact UTF-8 JSON; ``default`` converts values JSON has no type for."""
+
+    if orjson is not None:
+        return orjson.dumps(content, default=default)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+
+def dumps(content: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """:func:`encode_json` as text."""
+
+    return encode_json(content, default).decode("utf-8")
@@ -0,0 +1,433 @@
+"""Layered (Sugiyama-style) auto-layout that generates BPMN DI locally.
+
+The LLM only has to produce the semantic ``bpmn:process``; shapes and
+edges are computed here: back edges are found with a DFS, ranks come
+from longest paths, long edges get virtual nodes, barycenter sweeps
+reduce crossings and edges are routed orthogonally (gateways branch from
+their top/bottom corners, loops run underneath the diagram).
+"""
+
+import bisect
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+
+from .prevalidator import is_flow_node
+from .xml_utils import (
+    bpmn_tag,
+    bpmndi_tag,
+    dc_tag,
+    di_tag,
+    format_number,
+    local_name,
+    parse_document,
+    serialize_document,
+)
+
+Point = Tuple[float, float]
+Bounds = Tuple[float, float, float, float]
+
+LEFT = 100.0
+TOP = 80.0
+COLUMN_GAP = 80.0
+ROW_GAP = 40.0
+LOOP_GAP = 30.0
+LOOP_SPACING = 15.0
+SWEEPS = 8
+
+
+def node_size(kind: str) -> Tuple[float, float]:
+    if kind.endswith("Event"):
+        return 36.0, 36.0
+    if kind.endswith("Gateway"):
+        return 50.0, 50.0
+    return 100.0, 80.0
+
+
+class Layout:
+    def __init__(self) -> None:
+        self.bounds: Dict[str, Bounds] = {}
+        self.waypoints: Dict[str, List[Point]] = {}
+
+
+def compute_layout(
+    nodes: Dict[str, str],
+    flows: Iterable[Tuple[str, str, str]],
+    attached_to: Optional[Dict[str, str]] = None,
+) -> Layout:
+    """Place ``nodes`` (id -> BPMN element kind) and route ``flows``
+    (flow id, source id, target id). ``attached_to`` maps boundary events
+    to the activity they sit on."""
+
+    return _LayoutBuilder(nodes, list(flows), attached_to or {}).build()
+
+
+class _LayoutBuilder:
+    def __init__(
+        self,
+        nodes: Dict[str, str],
+        flows: List[Tuple[str, str, str]],
+        attached_to: Dict[str, str],
+    ):
+        self.kinds = nodes
+        # Only hosts that are themselves ranked can carry an event; an event
+        # attached to another attached event is laid out as a plain node.
+        self.attached = {
+            b: host for b, host in attached_to.items() if b in nodes and host in nodes and host not in attached_to
+        }
+        self.flows = [f for f in flows if f[1] in nodes and f[2] in nodes]
+        self.sizes = {node_id: node_size(kind) for node_id, kind in nodes.items()}
+        self.layout = Layout()
+
+    def _anchor(self, node_id: str) -> str:
+        return self.attached.get(node_id, node_id)
+
+    def build(self) -> Layout:
+        ranked = [node_id for node_id in self.kinds if node_id not in self.attached]
+        edges = [(flow_id, self._anchor(s), self._anchor(t)) for flow_id, s, t in self.flows]
+
+        back = self._back_edges(ranked, edges)
+        forward = [e for e in edges if e[0] not in back and e[1] != e[2]]
+        rank = self._ranks(ranked, forward)
+        layers, chains = self._layers(ranked, forward, rank)
+        self._order(layers, chains)
+        centers, columns = self._place(layers)
+        self._place_boundary_events()
+        self._route(chains, centers, columns)
+        return self.layout
+
+    # -- structure -----------------------------------------------------
+
+    def _back_edges(self, ranked: List[str], edges: List[Tuple[str, str, str]]) -> Set[str]:
+        successors: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        has_incoming: Set[str] = set()
+        for flow_id, source, target in edges:
+            successors[source].append((flow_id, target))
+            if source != target:
+                has_incoming.add(target)
+        starts = [n for n in ranked if self.kinds[n] == "startEvent"]
+        roots = starts + [n for n in ranked if n not in has_incoming] + ranked
+
+        back: Set[str] = set()
+        state: Dict[str, int] = {}
+        for root in roots:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(successors[root]))]
+            while stack:
+                node, children = stack[-1]
+                for flow_id, child in children:
+                    if state.get(child) == 1:
+                        back.add(flow_id)
+                    elif child not in state:
+                        state[child] = 1
+                        stack.append((child, iter(successors[child])))
+                        break
+                else:
+                    state[node] = 2
+                    stack.pop()
+        self.discovery = {node: index for index, node in enumerate(state)}
+        return back
+
+    def _ranks(self, ranked: List[str], forward: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        successors: Dict[str, List[str]] = defaultdict(list)
+        indegree = {n: 0 for n in ranked}
+        for _, source, target in forward:
+            successors[source].append(target)
+            indegree[target] += 1
+        rank = {n: 0 for n in ranked}
+        ready = [n for n in ranked if indegree[n] == 0]
+        while ready:
+            node = ready.pop()
+            for child in successors[node]:
+                rank[child] = max(rank[child], rank[node] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+        return rank
+
+    def _layers(
+        self,
+        ranked: List[str],
+        forward: List[Tuple[str, str, str]],
+        rank: Dict[str, int],
+    ) -> Tuple[List[List[Hashable]], Dict[str, List[Hashable]]]:
+        depth = max(rank.values(), default=0) + 1
+        layers: List[List[Hashable]] = [[] for _ in range(depth)]
+        for node in sorted(ranked, key=lambda n: self.discovery.get(n, 0)):
+            layers[rank[node]].append(node)
+        # Each forward edge becomes a chain of vertices on consecutive ranks;
+        # long edges get one virtual vertex per rank they skip.
+        chains: Dict[str, List[Hashable]] = {}
+        for flow_id, source, target in forward:
+            chain: List[Hashable] = [source]
+            for r in range(rank[source] + 1, rank[target]):
+                dummy = ("virtual", flow_id, r)
+                layers[r].append(dummy)
+                chain.append(dummy)
+            chain.append(target)
+            chains[flow_id] = chain
+        self.rank_of: Dict[Hashable, int] = dict(rank)
+        for chain in chains.values():
+            for vertex in chain[1:-1]:
+                self.rank_of[vertex] = vertex[2]  # type: ignore[index]
+        return layers, chains
+
+    def _order(self, layers: List[List[Hashable]], chains: Dict[str, List[Hashable]]) -> None:
+        upper: Dict[Hashable, List[Hashable]] = defaultdict(list)
+        lower: Dict[Hashable, List[Hashable]] = defaultdict(list)
+        for chain in chains.values():
+            for a, b in zip(chain, chain[1:]):
+                lower[a].append(b)
+                upper[b].append(a)
+
+        def positions() -> Dict[Hashable, int]:
+            return {v: i for layer in layers for i, v in enumerate(layer)}
+
+        def crossings() -> int:
+            pos = positions()
+            total = 0
+            for layer in layers[:-1]:
+                pairs = sorted((pos[a], pos[b]) for a in layer for b in lower[a])
+                seen: List[int] = []
+                for _, target in pairs:
+                    total += len(seen) - bisect.bisect_right(seen, target)
+                    bisect.insort(seen, target)
+            return total
+
+        best = [list(layer) for layer in layers]
+        best_crossings = crossings()
+        for sweep in range(SWEEPS):
+            if best_crossings == 0:
+                break
+            downward = sweep % 2 == 0
+            indices = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+            neighbours = upper if downward else lower
+            pos = positions()
+            for index in indices:
+                layer = layers[index]
+
+                def barycenter(vertex: Hashable) -> float:
+                    linked = neighbours[vertex]
+                    if not linked:
+                        return float(pos[vertex])
+                    return sum(pos[v] for v in linked) / len(linked)
+
+                layer.sort(key=barycenter)
+                for position, vertex in enumerate(layer):
+                    pos[vertex] = position
+            count = crossings()
+            if count < best_crossings:
+                best_crossings = count
+                best = [list(layer) for layer in layers]
+        layers[:] = best
+
+    # -- geometry ------------------------------------------------------
+
+    def _place(
+        self,
+        layers: List[List[Hashable]],
+    ) -> Tuple[Dict[Hashable, Point], List[Tuple[float, float]]]:
+        columns: List[Tuple[float, float]] = []
+        x = LEFT
+        for layer in layers:
+            width = max((self.sizes[v][0] for v in layer if isinstance(v, str)), default=0.0)
+            columns.append((x, width))
+            x += width + COLUMN_GAP
+
+        row_height = max((h for _, h in self.sizes.values()), default=80.0) + ROW_GAP
+        centers: Dict[Hashable, Point] = {}
+        for index, layer in enumerate(layers):
+            column_x, column_width = columns[index]
+            offset = (len(layer) - 1) / 2
+            for position, vertex in enumerate(layer):
+                centers[vertex] = (column_x + column_width / 2, (position - offset) * row_height)
+
+        top = min(
+            (centers[v][1] - self.sizes[v][1] / 2 for layer in layers for v in layer if isinstance(v, str)),
+            default=0.0,
+        )
+        shift = TOP - top
+        for vertex, (cx, cy) in centers.items():
+            centers[vertex] = (cx, cy + shift)
+            if isinstance(vertex, str):
+                width, height = self.sizes[vertex]
+                self.layout.bounds[vertex] = (cx - width / 2, cy + shift - height / 2, width, height)
+        return centers, columns
+
+    def _place_boundary_events(self) -> None:
+        per_host: Dict[str, int] = defaultdict(int)
+        for event, host in self.attached.items():
+            hx, hy, hw, hh = self.layout.bounds[host]
+            width, height = self.sizes[event]
+            index = per_host[host]
+            per_host[host] += 1
+            x = hx + hw - width - 10 - index * (width + 8)
+            self.layout.bounds[event] = (x, hy + hh - height / 2, width, height)
+
+    def _route(
+        self,
+        chains: Dict[str, List[Hashable]],
+        centers: Dict[Hashable, Point],
+        columns: List[Tuple[float, float]],
+    ) -> None:
+        def channel_after(vertex: Hashable) -> float:
+            column_x, column_width = columns[self.rank_of[vertex]]
+            return column_x + column_width + COLUMN_GAP / 2
+
+        original = {flow_id: (source, target) for flow_id, source, target in self.flows}
+        for flow_id, chain in chains.items():
+            source, target = original[flow_id]
+            middle = [centers[v] for v in chain[1:-1]]
+            next_y = middle[0][1] if middle else self._center(target)[1]
+            previous_y = middle[-1][1] if middle else self._center(source)[1]
+            start, vertical_start = self._exit(source, next_y)
+            end, vertical_end = self._entry(target, previous_y)
+
+            points = [start] + middle + [end]
+            anchors = [chain[0]] + chain[1:-1] + [chain[-1]]
+            path: List[Point] = [start]
+            for i in range(1, len(points)):
+                (x1, y1), (x2, y2) = points[i - 1], points[i]
+                if y1 != y2:
+                    if i == 1 and vertical_start:
+                        path.append((x1, y2))
+                    elif i == len(points) - 1 and vertical_end:
+                        path.append((x2, y1))
+                    else:
+                        bend = channel_after(anchors[i - 1])
+                        path.extend([(bend, y1), (bend, y2)])
+                path.append((x2, y2))
+            self.layout.waypoints[flow_id] = _simplify(path)
+
+        # Back edges and self loops run underneath the whole diagram, each on
+        # its own track.
+        bottom = max(
+            [y + h for _, y, _, h in self.layout.bounds.values()] + [y for _, y in centers.values()],
+            default=TOP,
+        )
+        loops = [flow_id for flow_id, _, _ in self.flows if flow_id not in chains]
+        for index, flow_id in enumerate(loops):
+            source, target = original[flow_id]
+            sx, sy, sw, sh = self.layout.bounds[source]
+            tx, ty, tw, th = self.layout.bounds[target]
+            loop_y = bottom + LOOP_GAP + index * LOOP_SPACING
+            if source == target:
+                start = (sx + sw * 0.75, sy + sh)
+                end = (sx + sw * 0.25, sy + sh)
+            else:
+                start = (sx + sw / 2, sy + sh)
+                end = (tx + tw / 2, ty + th)
+            self.layout.waypoints[flow_id] = [start, (start[0], loop_y), (end[0], loop_y), end]
+
+    def _center(self, node_id: str) -> Point:
+        x, y, w, h = self.layout.bounds[node_id]
+        return x + w / 2, y + h / 2
+
+    def _exit(self, node_id: str, towards_y: float) -> Tuple[Point, bool]:
+        x, y, w, h = self.layout.bounds[node_id]
+        cx, cy = x + w / 2, y + h / 2
+        if node_id in self.attached:
+            return (cx, y + h), True
+        if self.kinds[node_id].endswith("Gateway") and towards_y != cy:
+            return (cx, y if towards_y < cy else y + h), True
+        return (x + w, cy), False
+
+    def _entry(self, node_id: str, from_y: float) -> Tuple[Point, bool]:
+        x, y, w, h = self.layout.bounds[node_id]
+        cx, cy = x + w / 2, y + h / 2
+        if self.kinds[node_id].endswith("Gateway") and from_y != cy:
+            return (cx, y if from_y < cy else y + h), True
+        return (x, cy), False
+
+
+def _simplify(path: List[Point]) -> List[Point]:
+    points: List[Point] = []
+    for point in path:
+        if points and points[-1] == point:
+            continue
+        if len(points) >= 2:
+            (x1, y1), (x2, y2) = points[-2], points[-1]
+            if (x1 == x2 == point[0]) or (y1 == y2 == point[1]):
+                points[-1] = point
+                continue
+        points.append(point)
+    return points
+
+
+def strip_diagram(root: ET.Element) -> None:
+    for diagram in root.findall(bpmndi_tag("BPMNDiagram")):
+        root.remove(diagram)
+
+
+def layout_document(root: ET.Element) -> None:
+    """Replace the document's DI with a freshly computed layout of its
+    first process."""
+
+    strip_diagram(root)
+    process = root.find(bpmn_tag("process"))
+    if process is None:
+        return
+
+    nodes: Dict[str, str] = {}
+    attached: Dict[str, str] = {}
+    flows: List[Tuple[str, str, str]] = []
+    for element in process:
+        element_id = element.get("id")
+        if not element_id:
+            continue
+        if is_flow_node(element):
+            nodes[element_id] = local_name(element.tag)
+            if element.get("attachedToRef"):
+                attached[element_id] = element.get("attachedToRef")
+        elif element.tag == bpmn_tag("sequenceFlow"):
+            flows.append((element_id, element.get("sourceRef") or "", element.get("targetRef") or ""))
+
+    layout = compute_layout(nodes, flows, attached)
+
+    diagram = ET.SubElement(root, bpmndi_tag("BPMNDiagram"), {"id": "BPMNDiagram_1"})
+    plane = ET.SubElement(diagram, bpmndi_tag("BPMNPlane"), {
+        "id": "BPMNPlane_1",
+        "bpmnElement": process.get("id") or "",
+    })
+    for node_id, (x, y, w, h) in layout.bounds.items():
+        attributes = {"id": f"{node_id}_di", "bpmnElement": node_id}
+        if nodes[node_id] == "exclusiveGateway":
+            attributes["isMarkerVisible"] = "true"
+        elif nodes[node_id] == "subProcess":
+            attributes["isExpanded"] = "false"
+        shape = ET.SubElement(plane, bpmndi_tag("BPMNShape"), attributes)
+        ET.SubElement(shape, dc_tag("Bounds"), {
+            "x": format_number(x),
+            "y": format_number(y),
+            "width": format_number(w),
+            "height": format_number(h),
+        })
+    for flow_id, points in layout.waypoints.items():
+        edge = ET.SubElement(plane, bpmndi_tag("BPMNEdge"), {"id": f"{flow_id}_di", "bpmnElement": flow_id})
+        for x, y in points:
+            ET.SubElement(edge, di_tag("waypoint"), {"x": format_number(x), "y": format_number(y)})
+
+
+def apply_layout(xml: str) -> str:
+    """Return ``xml`` with generated BPMN DI. Documents that cannot be
+    parsed are returned unchanged for validation to report."""
+
+    try:
+        root = parse_document(xml)
+    except ET.ParseError:
+        return xml
+    layout_document(root)
+    return serialize_document(root)
+
+
+def semantic_only(xml: str) -> str:
+    """``xml`` without its DI, e.g. to keep repair prompts small."""
+
+    try:
+        root = parse_document(xml)
+    except ET.ParseError:
+        return xml
+    strip_diagram(root)
+    return serialize_document(root)
@@ -0,0 +1,196 @@
+"""Structured JSON logging that stays off the event loop.
+
+Records are put on a queue by :class:`NonBlockingQueueHandler` and
+formatted and written by a :class:`logging.handlers.QueueListener` thread,
+so a slow stdout/stderr never stalls request handling. The emitting side
+only attaches the request id, applies sampling and renders the message.
+"""
+
+import contextvars
+import copy
+import logging
+import logging.handlers
+import queue
+import uuid
+from typing import Callable, Dict, Optional
+
+from .json_encoding import dumps
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def _default(value: object) -> str:
+    return str(value)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, object] = {
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return dumps(payload, default=_default)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the id of the request (or job) being handled."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        if request_id is not None and "request_id" not in record.__dict__:
+            record.request_id = request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in ``1 / rate`` records of the configured events.
+
+    Events are matched on the log message (``logger.info("event_name")``).
+    Warnings and errors are never sampled out.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.every = {event: max(1, round(1 / rate)) for event, rate in rates.items() if rate > 0}
+        self.muted = {event for event, rate in rates.items() if rate <= 0}
+        self._seen: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        event = record.msg
+        if event in self.muted:
+            return False
+        every = self.every.get(event)
+        if every is None or every == 1:
+            return True
+        seen = self._seen.get(event, 0)
+        self._seen[event] = seen + 1
+        return seen % every == 0
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """``"event=0.1,other=0"`` -> ``{"event": 0.1, "other": 0.0}``."""
+
+    rates: Dict[str, float] = {}
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        event, sep, rate = item.partition("=")
+        if not sep or not event.strip():
+            raise ValueError(f"Invalid sample rate {item!r}, expected event=rate")
+        rates[event.strip()] = float(rate)
+        if not 0 <= rates[event.strip()] <= 1:
+            raise ValueError(f"Sample rate for {event.strip()} must be between 0 and 1")
+    return rates
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records when the queue is full instead of
+    blocking or raising, and leaves formatting to the listener thread."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message and traceback now: args and exc_info may not
+        # survive the trip to another thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(
+    level: str,
+    use_queue: bool = True,
+    queue_size: int = 10000,
+    sample_rates: Optional[Dict[str, float]] = None,
+) -> Optional[logging.handlers.QueueListener]:
+    """Install the JSON pipeline on the root logger.
+
+    Returns the started listener (``None`` without a queue); the caller
+    stops it on shutdown to flush pending records.
+    """
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter())
+    filters = [RequestIdFilter()]
+    if sample_rates:
+        filters.append(SamplingFilter(sample_rates))
+
+    listener = None
+    handler: logging.Handler = output
+    if use_queue:
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        listener = logging.handlers.QueueListener(handler.queue, output)
+        listener.start()
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+    return listener
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding a request id to every log line of a request.
+
+    The id comes from the ``X-Request-ID`` header or is generated, and is
+    echoed in the response.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+        self._header = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == self._header:
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", ()))
+                headers.append((self._header, request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
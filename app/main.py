@@ -1,60 +1,77 @@
-import json
+import asyncio
+import atexit
 import logging
-from typing import Dict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
+import httpx
 
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from .admission import AdmissionController, AdmissionRejected
+from .cache import ResultCache, ValidationCache
+from .compression import CompressionMiddleware
 from .config import Settings, get_settings
+from .examples import ExampleStore
 from .gigachat import GigaChatClient, GigaChatError
+from .http_clients import build_gigachat_http_client, build_validator_http_client
+from .jobs import JobQueue, JobStore
+from .json_encoding import encode_json
+from .logs import RequestIdMiddleware, configure_logging, parse_sample_rates
+from .metrics import REGISTRY
 from .models import GenerateFailureResponse, GenerateRequest, GenerateSuccessResponse
+from .prevalidator import PreValidator
+from .rate_limit import RateLimiter
+from .responses import XML_MEDIA_TYPE, FastJSONResponse, prefers_xml, xml_response
+from .resilience import CircuitBreaker, RetryBudget, RetryPolicy
 from .service import GenerationService
+from .similarity import NearDuplicateIndex
 from .validator_client import ValidatorClient, ValidatorError
-
-
-class JsonFormatter(logging.Formatter):
-    def format(self, record: logging.LogRecord) -> str:
-        payload: Dict[str, object] = {
-            "level": record.levelname.lower(),
-            "message": record.getMessage(),
-        }
-        for key, value in record.__dict__.items():
-            if key not in {
-                "name",
-                "msg",
-                "args",
-                "levelname",
-                "levelno",
-                "pathname",
-                "filename",
-                "module",
-                "exc_info",
-                "exc_text",
-                "stack_info",
-                "lineno",
-                "funcName",
-                "created",
-                "msecs",
-                "relativeCreated",
-                "thread",
-                "threadName",
-                "processName",
-                "process",
-            }:
-                payload[key] = value
-        return json.dumps(payload, ensure_ascii=False)
+from .warmup import WarmUp
 
 
 settings = get_settings()
-handler = logging.StreamHandler()
-handler.setFormatter(JsonFormatter())
-logging.basicConfig(level=settings.log_level, handlers=[handler], force=True)
+_log_listener = configure_logging(
+    settings.log_level,
+    use_queue=settings.log_async,
+    queue_size=settings.log_queue_size,
+    sample_rates=parse_sample_rates(settings.log_sample_rates),
+)
+if _log_listener is not None:
+    # Flush records still queued when the process exits.
+    atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+
+def _retry_policy(settings: Settings, attempts: int) -> RetryPolicy:
+    return RetryPolicy(
+        attempts=attempts,
+        base_delay=settings.retry_backoff_base_sec,
+        max_delay=settings.retry_backoff_max_sec,
+    )
+
+
+def _circuit_breaker(name: str, settings: Settings) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.circuit_breaker_failure_threshold,
+        reset_timeout=settings.circuit_breaker_reset_timeout_sec,
+    )
 
 
-def _build_service(settings: Settings) -> GenerationService:
+def _build_service(
+    settings: Settings,
+    gigachat_http: Optional[httpx.AsyncClient] = None,
+    validator_http: Optional[httpx.AsyncClient] = None,
+    retry_budget: Optional[RetryBudget] = None,
+    result_cache: Optional[ResultCache] = None,
+    validation_cache: Optional[ValidationCache] = None,
+    prevalidation_pool: Optional[Executor] = None,
+    near_duplicates: Optional[NearDuplicateIndex] = None,
+    examples: Optional[ExampleStore] = None,
+) -> GenerationService:
     gigachat_client = GigaChatClient(
         api_url=settings.gigachat_api_url,
         auth_url=settings.gigachat_auth_url,
@@ -63,9 +80,195 @@ def _build_service(settings: Settings) -> GenerationService:
         model=settings.gigachat_model,
         token=settings.gigachat_token,
         timeout=settings.llm_timeout_sec,
+        http_client=gigachat_http,
+        retry_policy=_retry_policy(settings, settings.gigachat_retry_attempts),
+        retry_budget=retry_budget,
+        breaker=_circuit_breaker("gigachat", settings),
+        token_refresh_margin=settings.gigachat_token_refresh_margin_sec,
+        max_concurrency=settings.gigachat_max_concurrency,
+        rate_limiter=RateLimiter(
+            requests_per_sec=settings.gigachat_rate_limit_rps,
+            request_burst=settings.gigachat_rate_limit_burst,
+            tokens_per_min=settings.gigachat_rate_limit_tokens_per_min,
+        ),
+    )
+    validator_client = ValidatorClient(
+        settings.validator_url,
+        timeout=settings.validator_timeout_sec,
+        http_client=validator_http,
+        retry_policy=_retry_policy(settings, settings.validator_retry_attempts),
+        retry_budget=retry_budget,
+        breaker=_circuit_breaker("validator", settings),
+        cache=validation_cache,
+        ruleset_version=settings.validator_ruleset_version,
+        max_concurrency=settings.validator_max_concurrency,
+        compression=settings.validator_compression,
+        compression_min_bytes=settings.validator_compression_min_bytes,
+    )
+    prevalidator = None
+    if settings.prevalidation_enabled:
+        prevalidator = PreValidator(
+            pool=prevalidation_pool,
+            pool_min_bytes=settings.prevalidation_pool_min_bytes,
+        )
+    return GenerationService(
+        gigachat_client,
+        validator_client,
+        stream=settings.gigachat_streaming,
+        result_cache=result_cache,
+        prevalidator=prevalidator,
+        auto_fix=settings.auto_fix_enabled,
+        candidates=settings.hedged_candidates,
+        max_concurrency=settings.hedged_max_concurrency,
+        temperature_step=settings.hedged_temperature_step,
+        minimal_repair=settings.minimal_repair_enabled,
+        repair_token_budget=settings.repair_prompt_token_budget,
+        near_duplicates=near_duplicates,
+        examples=examples,
     )
-    validator_client = ValidatorClient(settings.validator_url, timeout=settings.validator_timeout_sec)
-    return GenerationService(gigachat_client, validator_client)
+
+
+async def _cancel_task(task: asyncio.Task) -> None:
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    async with AsyncExitStack() as stack:
+        gigachat_http = build_gigachat_http_client(settings)
+        stack.push_async_callback(gigachat_http.aclose)
+        validator_http = build_validator_http_client(settings)
+        stack.push_async_callback(validator_http.aclose)
+
+        # One budget for every upstream so that retries cannot multiply load
+        # during an outage.
+        retry_budget = RetryBudget(
+            ratio=settings.retry_budget_ratio,
+            min_retries=settings.retry_budget_min_retries,
+            window=settings.retry_budget_window_sec,
+        )
+        result_cache = None
+        if settings.result_cache_enabled:
+            result_cache = ResultCache(
+                max_entries=settings.result_cache_max_entries,
+                ttl=settings.result_cache_ttl_sec,
+                sqlite_path=settings.result_cache_sqlite_path,
+            )
+            stack.callback(result_cache.close)
+
+        near_duplicates = None
+        if settings.near_duplicate_enabled:
+            near_duplicates = NearDuplicateIndex(
+                threshold=settings.near_duplicate_threshold,
+                max_entries=settings.near_duplicate_max_entries,
+                ttl=settings.near_duplicate_ttl_sec,
+                sqlite_path=settings.near_duplicate_sqlite_path,
+            )
+            stack.callback(near_duplicates.close)
+
+        examples = None
+        if settings.few_shot_enabled:
+            examples = ExampleStore(
+                k=settings.few_shot_k,
+                token_budget=settings.few_shot_token_budget,
+                min_similarity=settings.few_shot_min_similarity,
+                max_entries=settings.few_shot_max_entries,
+                sqlite_path=settings.few_shot_sqlite_path,
+            )
+            stack.callback(examples.close)
+
+        validation_cache = None
+        if settings.validation_cache_enabled:
+            validation_cache = ValidationCache(
+                max_entries=settings.validation_cache_max_entries,
+                ttl=settings.validation_cache_ttl_sec,
+            )
+
+        prevalidation_pool = None
+        if settings.prevalidation_enabled and settings.prevalidation_pool_workers > 0:
+            prevalidation_pool = ProcessPoolExecutor(max_workers=settings.prevalidation_pool_workers)
+            stack.callback(prevalidation_pool.shutdown)
+
+        service = _build_service(
+            settings,
+            gigachat_http,
+            validator_http,
+            retry_budget=retry_budget,
+            result_cache=result_cache,
+            validation_cache=validation_cache,
+            prevalidation_pool=prevalidation_pool,
+            near_duplicates=near_duplicates,
+            examples=examples,
+        )
+        service.gigachat.start_token_refresher()
+        stack.push_async_callback(service.gigachat.stop_token_refresher)
+
+        warmup = WarmUp(
+            service,
+            gigachat_http,
+            validator_http,
+            connections=settings.warmup_connections,
+            validate=settings.warmup_validate,
+            timeout=settings.warmup_timeout_sec,
+        )
+        if settings.warmup_enabled:
+            # Runs alongside serving; /ready answers 503 until it is done.
+            warmup_task = asyncio.create_task(warmup.run())
+            stack.push_async_callback(_cancel_task, warmup_task)
+        else:
+            warmup.ready = True
+
+        jobs = None
+        if settings.jobs_enabled:
+            job_store = JobStore(settings.jobs_sqlite_path)
+            stack.callback(job_store.close)
+            jobs = JobQueue(
+                job_store,
+                lambda request: _generate_item(service, request, settings),
+                workers=settings.jobs_workers,
+                result_ttl=settings.jobs_result_ttl_sec,
+                poll_interval=settings.jobs_poll_interval_sec,
+                lease=settings.jobs_lease_sec,
+            )
+            await jobs.start()
+            stack.push_async_callback(jobs.stop)
+
+        app.state.service = service
+        app.state.jobs = jobs
+        app.state.warmup = warmup
+        app.state.admission = AdmissionController(
+            max_in_flight=settings.admission_max_in_flight,
+            max_queue=settings.admission_max_queue,
+            max_queue_time=settings.admission_max_queue_time_sec,
+            adaptive=settings.admission_adaptive,
+            min_in_flight=settings.admission_min_in_flight,
+            target_latency=settings.admission_target_latency_sec,
+        )
+        try:
+            yield
+        finally:
+            app.state.service = None
+            app.state.jobs = None
+            app.state.warmup = None
+            app.state.admission = None
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+if settings.response_compression_enabled:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.response_compression_min_bytes)
+app.add_middleware(RequestIdMiddleware)
+
+
+def _get_service(settings: Settings) -> GenerationService:
+    # Outside of the lifespan (e.g. when the handler is called directly) fall
+    # back to a throwaway service without pooled connections.
+    service = getattr(app.state, "service", None)
+    if service is None:
+        service = _build_service(settings)
+    return service
 
 
 def _resolve_max_attempts(request_max: int, settings: Settings) -> int:
@@ -78,19 +281,29 @@ def _resolve_max_attempts(request_max: int, settings: Settings) -> int:
     return max_attempts
 
 
+def _check_candidates(request_candidates: Optional[int], settings: Settings) -> None:
+    if request_candidates and request_candidates > settings.hedged_candidates_hard_limit:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="candidates exceeds hard limit",
+        )
+
+
 @app.post(
     "/generate-bpmn",
     response_model=GenerateSuccessResponse,
     responses={
+        200: {"content": {XML_MEDIA_TYPE: {}}, "description": "Validated diagram (raw XML with `Accept: application/xml`)"},
         422: {"model": GenerateFailureResponse},
         400: {"description": "Invalid request"},
         502: {"description": "Upstream error"},
-        503: {"description": "Upstream unavailable"},
+        503: {"description": "Upstream unavailable or server overloaded"},
     },
 )
 async def generate_bpmn(
     request: GenerateRequest,
     settings: Settings = Depends(get_settings),
+    http_request: Request = None,
 ):
     if len(request.text) > settings.max_text_len:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="text too long")
@@ -99,16 +312,166 @@ async def generate_bpmn(
         max_attempts = _resolve_max_attempts(request.max_attempts, settings)
     except HTTPException:
         raise
+    _check_candidates(request.candidates, settings)
 
-    service = _build_service(settings)
+    service = _get_service(settings)
+    admission = getattr(app.state, "admission", None)
 
     try:
-        result = await service.generate(request, max_attempts)
+        if admission is None:
+            result = await service.generate(request, max_attempts)
+        else:
+            async with admission.admit():
+                result = await service.generate(request, max_attempts)
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="server overloaded",
+            headers={"Retry-After": str(int(exc.retry_after))},
+        )
     except ValidatorError:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="validator error")
     except GigaChatError:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="gigachat error")
 
     if result.get("validated"):
-        return JSONResponse(status_code=200, content=result)
-    return JSONResponse(status_code=422, content=result)
+        if http_request is not None and prefers_xml(http_request.headers.get("accept")):
+            return xml_response(result["bpmn_xml"], result["attempts_used"])
+        return FastJSONResponse(status_code=200, content=result)
+    return FastJSONResponse(status_code=422, content=result)
+
+
+async def _generate_item(
+    service: GenerationService,
+    request: GenerateRequest,
+    settings: Settings,
+) -> Tuple[int, Dict]:
+    """Status code and body that ``/generate-bpmn`` would answer with."""
+
+    if len(request.text) > settings.max_text_len:
+        return status.HTTP_400_BAD_REQUEST, {"detail": "text too long"}
+    try:
+        max_attempts = _resolve_max_attempts(request.max_attempts, settings)
+        _check_candidates(request.candidates, settings)
+    except HTTPException as exc:
+        return exc.status_code, {"detail": exc.detail}
+
+    try:
+        result = await service.generate(request, max_attempts)
+    except ValidatorError:
+        return status.HTTP_502_BAD_GATEWAY, {"detail": "validator error"}
+    except GigaChatError:
+        return status.HTTP_503_SERVICE_UNAVAILABLE, {"detail": "gigachat error"}
+    return (200 if result.get("validated") else 422), result
+
+
+async def _batch_results(
+    service: GenerationService,
+    requests: List[GenerateRequest],
+    settings: Settings,
+) -> AsyncIterator[bytes]:
+    async def run(index: int, request: GenerateRequest) -> Dict:
+        status_code, body = await _generate_item(service, request, settings)
+        return {"index": index, "status": status_code, **body}
+
+    tasks = [asyncio.ensure_future(run(index, request)) for index, request in enumerate(requests)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            item = await finished
+            yield encode_json(item) + b"\n"
+    finally:
+        # The client went away: stop spending upstream capacity on the rest.
+        for task in tasks:
+            task.cancel()
+
+
+@app.post(
+    "/generate-bpmn/batch",
+    responses={
+        200: {"description": "NDJSON stream, one line per item in completion order"},
+        400: {"description": "Invalid request"},
+    },
+)
+async def generate_bpmn_batch(
+    requests: List[GenerateRequest],
+    settings: Settings = Depends(get_settings),
+):
+    if not requests:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="batch is empty")
+    if len(requests) > settings.batch_max_items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="batch exceeds max items")
+
+    service = _get_service(settings)
+    return StreamingResponse(
+        _batch_results(service, requests, settings),
+        media_type="application/x-ndjson",
+    )
+
+
+def _get_jobs() -> JobQueue:
+    jobs = getattr(app.state, "jobs", None)
+    if jobs is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="job queue is not running")
+    return jobs
+
+
+@app.post(
+    "/jobs",
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        400: {"description": "Invalid request"},
+        503: {"description": "Job queue is not running"},
+    },
+)
+async def submit_job(
+    request: GenerateRequest,
+    settings: Settings = Depends(get_settings),
+):
+    if len(request.text) > settings.max_text_len:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="text too long")
+    _resolve_max_attempts(request.max_attempts, settings)
+    _check_candidates(request.candidates, settings)
+
+    job_id = await _get_jobs().submit(request)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}", responses={404: {"description": "Unknown or expired job"}})
+async def get_job(job_id: str):
+    job = await _get_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="job not found")
+    return job
+
+
+@app.get("/stats")
+async def stats(settings: Settings = Depends(get_settings)):
+    result = _get_service(settings).stats()
+    admission = getattr(app.state, "admission", None)
+    if admission is not None:
+        result["admission"] = admission.stats()
+    jobs = getattr(app.state, "jobs", None)
+    if jobs is not None:
+        result["jobs"] = await asyncio.to_thread(jobs.stats)
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is not None:
+        result["warmup"] = warmup.stats()
+    return result
+
+
+@app.get("/ready", responses={503: {"description": "Starting up or warming up"}})
+async def ready():
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is None or not warmup.ready:
+        stats = warmup.stats() if warmup is not None else {"ready": False}
+        return FastJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=stats)
+    return warmup.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    jobs = getattr(app.state, "jobs", None)
+    if jobs is not None:
+        # Refreshes the job queue gauges.
+        await asyncio.to_thread(jobs.stats)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,220 @@
+"""Minimal Prometheus instrumentation rendered in the text exposition format.
+
+Metrics are plain dicts keyed by label values and are only touched from the
+event loop thread, so an update is a dict lookup (plus a bisect for
+histograms) without locks.
+"""
+
+import math
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Upstream HTTP calls: tens of milliseconds to a few seconds.
+HTTP_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# LLM calls and whole generations: seconds to minutes.
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5, 7, 10)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = float(value)
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = HTTP_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf) and sum.
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self._counts.get(labels)
+        if counts is None:
+            counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(self._counts.get(labels, ()))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            suffix = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(self._sums[labels])}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[object] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = HTTP_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+GENERATION_SECONDS = REGISTRY.histogram(
+    "bpmn_generation_duration_seconds",
+    "End-to-end generation time by outcome.",
+    ("outcome",),
+    LLM_BUCKETS,
+)
+GENERATIONS = REGISTRY.counter(
+    "bpmn_generations_total",
+    "Generations by outcome (validated, failed, error, cache_hit).",
+    ("outcome",),
+)
+ATTEMPTS_USED = REGISTRY.histogram(
+    "bpmn_generation_attempts_used",
+    "Attempts used per finished generation.",
+    buckets=ATTEMPT_BUCKETS,
+)
+ATTEMPTS = REGISTRY.counter(
+    "bpmn_attempts_total",
+    "Generation attempts (LLM calls followed by validation) by kind.",
+    ("kind",),
+)
+VALIDATION_ISSUES = REGISTRY.counter(
+    "bpmn_validation_errors_total",
+    "Validation errors found in attempts, by rule id.",
+    ("rule",),
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "gigachat_call_duration_seconds",
+    "GigaChat completion time including retries, by kind (generate, repair).",
+    ("kind",),
+    LLM_BUCKETS,
+)
+TOKEN_FETCH_SECONDS = REGISTRY.histogram(
+    "gigachat_token_fetch_duration_seconds",
+    "GigaChat OAuth token fetch time.",
+)
+LLM_TOKENS = REGISTRY.counter(
+    "gigachat_tokens_total",
+    "Tokens reported in the GigaChat usage field, by type (prompt, completion).",
+    ("type",),
+)
+VALIDATOR_SECONDS = REGISTRY.histogram(
+    "validator_request_duration_seconds",
+    "Validator HTTP call time (cache hits excluded).",
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "upstream_errors_total",
+    "Failed upstream calls by upstream and HTTP status (or 'transport').",
+    ("upstream", "status"),
+)
+WARMUP_SECONDS = REGISTRY.histogram(
+    "warmup_duration_seconds",
+    "Startup warm-up time by step (local, token, connections, validation, total).",
+    ("step",),
+)
+NEAR_DUPLICATE_LOOKUP_SECONDS = REGISTRY.histogram(
+    "near_duplicate_lookup_duration_seconds",
+    "Near-duplicate index lookup time (MinHash signature included).",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+# Job queue gauges are refreshed from the job store by ``JobQueue.stats``,
+# which ``/metrics`` calls before rendering.
+JOB_QUEUE_DEPTH = REGISTRY.gauge("bpmn_job_queue_depth", "Queued asynchronous generation jobs.")
+JOB_QUEUE_RUNNING = REGISTRY.gauge("bpmn_job_queue_running", "Asynchronous generation jobs being processed.")
+JOB_QUEUE_OLDEST_AGE = REGISTRY.gauge(
+    "bpmn_job_queue_oldest_age_seconds",
+    "Age of the oldest queued job (0 when the queue is empty).",
+)
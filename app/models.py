@@ -1,6 +1,11 @@
 from typing import List, Optional
 from pydantic import BaseModel, Field, validator
 
+GENERATION_MODE_FULL = "full"
+GENERATION_MODE_LAYOUT = "layout"
+GENERATION_MODE_IR = "ir"
+GENERATION_MODES = {GENERATION_MODE_FULL, GENERATION_MODE_LAYOUT, GENERATION_MODE_IR}
+
 
 class ValidationIssue(BaseModel):
     id: Optional[str] = None
@@ -20,6 +25,9 @@ class GenerateRequest(BaseModel):
     max_attempts: Optional[int] = None
     temperature: float = 0.2
     return_debug: bool = False
+    bypass_cache: bool = False
+    mode: str = GENERATION_MODE_FULL
+    candidates: Optional[int] = None
 
     @validator("text")
     def text_must_not_be_empty(cls, value: str) -> str:
@@ -33,12 +41,26 @@ class GenerateRequest(BaseModel):
             raise ValueError("language must be 'ru' or 'en'")
         return value
 
+    @validator("mode")
+    def mode_supported(cls, value: str) -> str:
+        if value not in GENERATION_MODES:
+            raise ValueError(f"mode must be one of {sorted(GENERATION_MODES)}")
+        return value
+
     @validator("temperature")
     def temperature_range(cls, value: float) -> float:
         if value < 0 or value > 1:
             raise ValueError("temperature must be between 0 and 1")
         return value
 
+    @validator("candidates")
+    def candidates_supported(cls, value: Optional[int], values: Optional[dict] = None) -> Optional[int]:
+        if value is not None and value < 1:
+            raise ValueError("candidates must be positive")
+        if value is not None and value > 1 and (values or {}).get("mode") == GENERATION_MODE_IR:
+            raise ValueError("candidates is not supported in ir mode")
+        return value
+
     @validator("max_attempts")
     def attempts_positive(cls, value: Optional[int]) -> Optional[int]:
         if value is not None and value < 1:
@@ -0,0 +1,128 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Dict, List, Optional
+from xml.etree import ElementTree as ET
+
+from .models import ValidationIssue, ValidationReport
+from .xml_utils import BPMN_MODEL_NS, bpmn_tag, bpmndi_tag, local_name
+
+FLOW_NODE_TYPES = frozenset({
+    "startEvent",
+    "endEvent",
+    "intermediateCatchEvent",
+    "intermediateThrowEvent",
+    "boundaryEvent",
+    "task",
+    "userTask",
+    "serviceTask",
+    "scriptTask",
+    "manualTask",
+    "businessRuleTask",
+    "sendTask",
+    "receiveTask",
+    "callActivity",
+    "subProcess",
+    "transaction",
+    "exclusiveGateway",
+    "parallelGateway",
+    "inclusiveGateway",
+    "eventBasedGateway",
+    "complexGateway",
+})
+
+
+def is_flow_node(element: ET.Element) -> bool:
+    return element.tag.startswith(f"{{{BPMN_MODEL_NS}}}") and local_name(element.tag) in FLOW_NODE_TYPES
+
+
+def _issue(rule: str, message: str, element_id: Optional[str] = None) -> ValidationIssue:
+    return ValidationIssue(id=element_id, message=message, rule=rule)
+
+
+def prevalidate(xml: str) -> ValidationReport:
+    """Cheap structural checks that catch the most common LLM mistakes.
+
+    Issues use the same shape as the remote validator's report, so a
+    document failing here can go straight to repair.
+    """
+
+    try:
+        root = ET.fromstring(xml.strip())
+    except ET.ParseError as exc:
+        return ValidationReport(errors=[_issue("xml-well-formed", f"XML is not well-formed: {exc}")])
+
+    if root.tag != bpmn_tag("definitions"):
+        return ValidationReport(errors=[_issue(
+            "definitions-root",
+            f"Root element must be bpmn:definitions, got {local_name(root.tag)}",
+        )])
+
+    errors: List[ValidationIssue] = []
+    warnings: List[ValidationIssue] = []
+
+    id_counts = Counter(el.get("id") for el in root.iter() if el.get("id"))
+    for element_id, count in id_counts.items():
+        if count > 1:
+            errors.append(_issue("unique-ids", f"Duplicate id used {count} times", element_id))
+
+    processes = root.findall(bpmn_tag("process"))
+    if not processes:
+        errors.append(_issue("process-required", "Document must contain a bpmn:process"))
+
+    nodes: Dict[str, ET.Element] = {}
+    flows: Dict[str, ET.Element] = {}
+    for process in processes:
+        for element in process.iter():
+            element_id = element.get("id")
+            if not element_id:
+                continue
+            if is_flow_node(element):
+                nodes[element_id] = element
+            elif element.tag == bpmn_tag("sequenceFlow"):
+                flows[element_id] = element
+
+        process_id = process.get("id")
+        if process.get("isExecutable") is None:
+            warnings.append(_issue("process-executable-missing", "Process has no isExecutable attribute", process_id))
+        if process.find(bpmn_tag("startEvent")) is None:
+            errors.append(_issue("start-event-required", "Process has no start event", process_id))
+        if process.find(bpmn_tag("endEvent")) is None:
+            errors.append(_issue("end-event-required", "Process has no end event", process_id))
+
+    for flow_id, flow in flows.items():
+        for attribute in ("sourceRef", "targetRef"):
+            ref = flow.get(attribute)
+            if not ref:
+                errors.append(_issue("sequence-flow-ref", f"Sequence flow has no {attribute}", flow_id))
+            elif ref not in nodes:
+                errors.append(_issue(
+                    "sequence-flow-ref",
+                    f"Sequence flow {attribute} '{ref}' does not reference a flow node",
+                    flow_id,
+                ))
+
+    shapes = {el.get("bpmnElement") for el in root.iter(bpmndi_tag("BPMNShape"))}
+    edges = {el.get("bpmnElement") for el in root.iter(bpmndi_tag("BPMNEdge"))}
+    for node_id in nodes:
+        if node_id not in shapes:
+            errors.append(_issue("di-shape-missing", "Flow node has no BPMNShape", node_id))
+    for flow_id in flows:
+        if flow_id not in edges:
+            errors.append(_issue("di-edge-missing", "Sequence flow has no BPMNEdge", flow_id))
+
+    return ValidationReport(errors=errors, warnings=warnings)
+
+
+class PreValidator:
+    """Runs :func:`prevalidate`, offloading large documents to ``pool``."""
+
+    def __init__(self, pool: Optional[Executor] = None, pool_min_bytes: int = 256 * 1024):
+        self.pool = pool
+        self.pool_min_bytes = pool_min_bytes
+
+    async def validate(self, xml: str) -> ValidationReport:
+        if self.pool is not None and len(xml) >= self.pool_min_bytes:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, prevalidate, xml)
+        return prevalidate(xml)
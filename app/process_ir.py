@@ -0,0 +1,195 @@
+"""Compact JSON intermediate representation of a process.
+
+Instead of writing BPMN XML token by token the model can return a small
+graph::
+
+    {"nodes": [{"id": "start", "type": "startEvent", "name": "Заявка"}, ...],
+     "flows": [{"source": "start", "target": "check", "name": "да"}, ...]}
+
+which is checked here and serialized locally into BPMN 2.0 XML with DI.
+Problems are reported as :class:`ValidationIssue` so that they can go
+straight into a repair prompt.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree as ET
+
+from pydantic import BaseModel, Field, ValidationError, validator
+
+from .layout import layout_document
+from .models import ValidationIssue
+from .prevalidator import FLOW_NODE_TYPES
+from .xml_utils import bpmn_tag, serialize_document
+
+_NCNAME = re.compile(r"^[A-Za-z_][\w.\-]*$")
+_INVALID_ID_CHARS = re.compile(r"[^\w.\-]")
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class IRNode(BaseModel):
+    id: str
+    type: str
+    name: Optional[str] = None
+    attached_to: Optional[str] = None
+
+    @validator("type")
+    def type_supported(cls, value: str) -> str:
+        if value not in FLOW_NODE_TYPES:
+            raise ValueError(f"unsupported node type '{value}'")
+        return value
+
+
+class IRFlow(BaseModel):
+    id: Optional[str] = None
+    source: str
+    target: str
+    name: Optional[str] = None
+    condition: Optional[str] = None
+
+
+class ProcessIR(BaseModel):
+    nodes: List[IRNode] = Field(default_factory=list)
+    flows: List[IRFlow] = Field(default_factory=list)
+
+    def compact_json(self) -> str:
+        """Minimal JSON form, used to show the current graph in repair prompts."""
+
+        nodes = [
+            {key: value for key, value in node.dict().items() if value is not None}
+            for node in self.nodes
+        ]
+        flows = [
+            {key: value for key, value in flow.dict().items() if value is not None}
+            for flow in self.flows
+        ]
+        return json.dumps({"nodes": nodes, "flows": flows}, ensure_ascii=False, separators=(",", ":"))
+
+
+def _issue(rule: str, message: str, element_id: Optional[str] = None) -> ValidationIssue:
+    return ValidationIssue(id=element_id, message=message, rule=rule)
+
+
+def _extract_json(text: str) -> str:
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return text
+    return text[start:end + 1]
+
+
+def parse_ir(text: str) -> Tuple[Optional[ProcessIR], List[ValidationIssue]]:
+    """Parse and check a completion in the IR format.
+
+    Returns the graph (``None`` if the completion is not JSON matching the
+    schema) and the issues that prevent serializing it.
+    """
+
+    try:
+        data = json.loads(_extract_json(text))
+    except ValueError as exc:
+        return None, [_issue("ir-json", f"Completion is not valid JSON: {exc}")]
+    try:
+        ir = ProcessIR.parse_obj(data)
+    except ValidationError as exc:
+        return None, [
+            _issue("ir-schema", f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+            for error in exc.errors()
+        ]
+
+    issues: List[ValidationIssue] = []
+    node_ids = set()
+    for node in ir.nodes:
+        if node.id in node_ids:
+            issues.append(_issue("unique-ids", "Duplicate node id", node.id))
+        node_ids.add(node.id)
+    types = {node.type for node in ir.nodes}
+    if "startEvent" not in types:
+        issues.append(_issue("start-event-required", "Process has no start event"))
+    if "endEvent" not in types:
+        issues.append(_issue("end-event-required", "Process has no end event"))
+    for node in ir.nodes:
+        if node.type == "boundaryEvent" and node.attached_to not in node_ids:
+            issues.append(_issue("ir-node-ref", "Boundary event must be attached_to an existing node", node.id))
+    for index, flow in enumerate(ir.flows):
+        for attribute in ("source", "target"):
+            ref = getattr(flow, attribute)
+            if ref not in node_ids:
+                issues.append(_issue(
+                    "ir-node-ref",
+                    f"Flow {attribute} '{ref}' does not reference a node",
+                    flow.id or f"flows[{index}]",
+                ))
+    return ir, issues
+
+
+def _unique_id(candidate: str, prefix: str, taken: Dict[str, str]) -> str:
+    if not _NCNAME.match(candidate):
+        candidate = prefix + "_" + _INVALID_ID_CHARS.sub("_", candidate)
+    new_id = candidate
+    suffix = 2
+    while new_id in taken:
+        new_id = f"{candidate}_{suffix}"
+        suffix += 1
+    return new_id
+
+
+def ir_to_xml(ir: ProcessIR, process_name: str) -> Tuple[str, Dict[str, str]]:
+    """Serialize ``ir`` into BPMN 2.0 XML with a generated layout.
+
+    Ids that are not valid XML names are rewritten; the returned mapping
+    leads from XML ids back to IR ids so that validator findings can be
+    reported against the graph the model wrote.
+    """
+
+    xml_ids: Dict[str, str] = {}
+    to_ir: Dict[str, str] = {}
+    for node in ir.nodes:
+        xml_id = _unique_id(node.id, "Node", to_ir)
+        xml_ids[node.id] = xml_id
+        to_ir[xml_id] = node.id
+
+    definitions_id = _unique_id("Definitions_1", "Definitions", to_ir)
+    to_ir[definitions_id] = definitions_id
+    root = ET.Element(bpmn_tag("definitions"), {
+        "id": definitions_id,
+        "targetNamespace": "http://bpmn.io/schema/bpmn",
+    })
+    process_id = _unique_id("Process_1", "Process", to_ir)
+    to_ir[process_id] = process_id
+    process = ET.SubElement(root, bpmn_tag("process"), {
+        "id": process_id,
+        "name": process_name,
+        "isExecutable": "false",
+    })
+
+    elements: Dict[str, ET.Element] = {}
+    for node in ir.nodes:
+        attributes = {"id": xml_ids[node.id]}
+        if node.name:
+            attributes["name"] = node.name
+        if node.type == "boundaryEvent":
+            attributes["attachedToRef"] = xml_ids[node.attached_to or ""]
+        elements[node.id] = ET.SubElement(process, bpmn_tag(node.type), attributes)
+
+    for index, flow in enumerate(ir.flows, start=1):
+        flow_id = _unique_id(flow.id or f"Flow_{index}", "Flow", to_ir)
+        to_ir[flow_id] = flow.id or flow_id
+        source, target = xml_ids[flow.source], xml_ids[flow.target]
+        attributes = {"id": flow_id, "sourceRef": source, "targetRef": target}
+        if flow.name:
+            attributes["name"] = flow.name
+        element = ET.SubElement(process, bpmn_tag("sequenceFlow"), attributes)
+        if flow.condition:
+            condition = ET.SubElement(element, bpmn_tag("conditionExpression"))
+            condition.text = flow.condition
+        ET.SubElement(elements[flow.source], bpmn_tag("outgoing")).text = flow_id
+        ET.SubElement(elements[flow.target], bpmn_tag("incoming")).text = flow_id
+
+    # The schema wants every bpmn:incoming before the first bpmn:outgoing.
+    for element in elements.values():
+        element[:] = sorted(element, key=lambda child: child.tag != bpmn_tag("incoming"))
+
+    layout_document(root)
+    return serialize_document(root), {xml_id: ir_id for xml_id, ir_id in to_ir.items() if xml_id != ir_id}
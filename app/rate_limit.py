@@ -0,0 +1,188 @@
+import asyncio
+import email.utils
+import logging
+import re
+import time
+from typing import Awaitable, Callable, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Durations such as "1s", "250ms" or "6m0s" used by rate-limit reset headers.
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# Reset values above this are absolute epoch timestamps, not delays.
+_EPOCH_THRESHOLD = 1e9
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` units per second, at most ``capacity``.
+
+    The level may go negative when a caller is charged after the fact
+    (e.g. actual LLM usage above the estimate); later callers then wait
+    until the debt is paid off.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._level = capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` can be taken (0 when available now)."""
+
+        self._refill()
+        # A request larger than the bucket is let through on a full bucket.
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self._level -= amount
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+
+def parse_delay(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a ``Retry-After`` or rate-limit reset header.
+
+    Accepts delta seconds, Go-style durations (``6m0s``), epoch timestamps
+    and HTTP dates.
+    """
+
+    if not value:
+        return None
+    value = value.strip()
+    now = time.time() if now is None else now
+    try:
+        number = float(value)
+    except ValueError:
+        pass
+    else:
+        if number > _EPOCH_THRESHOLD:
+            return max(0.0, number - now)
+        return max(0.0, number)
+    parts = _DURATION_PART.findall(value)
+    if parts and "".join(amount + unit for amount, unit in parts) == value:
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, moment.timestamp() - now)
+
+
+class RateLimiter:
+    """Client-side limits for GigaChat: requests per second and LLM tokens
+    per minute, shared by every call of the process.
+
+    Callers wait in FIFO order (``asyncio.Lock`` wakes waiters in arrival
+    order) instead of failing. A 429 or exhausted rate-limit headers pause
+    the whole limiter until the upstream's reset time.
+    """
+
+    def __init__(
+        self,
+        requests_per_sec: float = 0.0,
+        request_burst: Optional[float] = None,
+        tokens_per_min: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self._clock = clock
+        self._sleep = sleep
+        self.requests: Optional[TokenBucket] = None
+        if requests_per_sec > 0:
+            burst = request_burst if request_burst and request_burst > 0 else max(1.0, requests_per_sec)
+            self.requests = TokenBucket(requests_per_sec, burst, clock=clock)
+        self.tokens: Optional[TokenBucket] = None
+        if tokens_per_min > 0:
+            self.tokens = TokenBucket(tokens_per_min / 60.0, tokens_per_min, clock=clock)
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.waited_sec = 0.0
+        self.throttled = 0
+        self.pauses = 0
+
+    def _wait_time(self, tokens: float) -> float:
+        wait = max(0.0, self._paused_until - self._clock())
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1))
+        if self.tokens is not None and tokens > 0:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    async def acquire(self, tokens: float = 0.0) -> None:
+        """Wait for one request slot and ``tokens`` estimated LLM tokens."""
+
+        started = self._clock()
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    wait = self._wait_time(tokens)
+                    if wait <= 0:
+                        break
+                    await self._sleep(wait)
+                if self.requests is not None:
+                    self.requests.take(1)
+                if self.tokens is not None and tokens > 0:
+                    self.tokens.take(tokens)
+        finally:
+            self.waiting -= 1
+        self.waited_sec += self._clock() - started
+
+    def record_usage(self, used_tokens: Optional[float], estimated_tokens: float) -> None:
+        """Charge the difference between actual and estimated token usage."""
+
+        if self.tokens is None or used_tokens is None:
+            return
+        self.tokens.take(used_tokens - estimated_tokens)
+
+    def pause(self, seconds: float) -> None:
+        until = self._clock() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self.pauses += 1
+            logger.warning("gigachat_rate_limit_pause", extra={"pause_sec": round(seconds, 3)})
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Pause on ``429``/``Retry-After`` or when the upstream reports an
+        exhausted request or token allowance."""
+
+        delay = parse_delay(headers.get("retry-after"))
+        if status_code == 429:
+            self.throttled += 1
+            if delay is None:
+                delay = 1.0
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.strip() in ("0", "0.0"):
+                reset = parse_delay(headers.get(f"x-ratelimit-reset-{kind}") or headers.get("x-ratelimit-reset"))
+                if reset is not None:
+                    delay = max(delay or 0.0, reset)
+        if delay:
+            self.pause(delay)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "waiting": self.waiting,
+            "waited_sec": round(self.waited_sec, 3),
+            "throttled": self.throttled,
+            "pauses": self.pauses,
+            "paused_for_sec": round(max(0.0, self._paused_until - self._clock()), 3),
+            "request_tokens": round(self.requests.level, 3) if self.requests is not None else None,
+            "llm_tokens": round(self.tokens.level, 1) if self.tokens is not None else None,
+        }
@@ -0,0 +1,283 @@
+"""Small repair prompts built from the parts of a document that are wrong.
+
+Instead of the whole diagram the prompt carries the minified elements that
+validation issues point at, their neighbours (connected flows and nodes)
+and their DI. The model answers with a patch - replaced or new elements
+and ``<delete id="..."/>`` markers - which :func:`merge_patch` applies to
+the document. Issues without an element id fall back to the whole
+minified document.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+
+from .autofix import ensure_plane, parent_map
+from .models import ValidationIssue
+from .prevalidator import is_flow_node
+from .xml_utils import (
+    BPMN_MODEL_NS,
+    BPMNDI_NS,
+    STANDARD_PREFIXES,
+    bpmn_tag,
+    bpmndi_tag,
+    local_name,
+    parse_document,
+    serialize_document,
+)
+
+SCOPE_FRAGMENTS = "fragments"
+SCOPE_DOCUMENT = "document"
+
+_NAMESPACE_DECLARATION = re.compile(r'\s+xmlns:(?:%s)="[^"]*"' % "|".join(STANDARD_PREFIXES))
+_FENCE = re.compile(r"^```(?:xml)?\s*|\s*```$")
+_XML_DECLARATION = re.compile(r"<\?xml[^>]*\?>")
+_DI_ELEMENTS = frozenset({bpmndi_tag("BPMNShape"), bpmndi_tag("BPMNEdge")})
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; GigaChat averages three to four characters per
+    token on mixed Russian text and markup."""
+
+    return len(text) // 3 + 1
+
+
+class RepairPrompt:
+    def __init__(self, prompt: str, base_xml: str, scope: str, elements: int, over_budget: bool):
+        self.prompt = prompt
+        self.base_xml = base_xml
+        self.scope = scope
+        self.elements = elements
+        self.over_budget = over_budget
+
+    def debug(self) -> Dict:
+        return {
+            "scope": self.scope,
+            "elements": self.elements,
+            "over_budget": self.over_budget,
+        }
+
+
+def _strip_whitespace(root: ET.Element) -> None:
+    for element in root.iter():
+        if element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+
+
+def _fragment(element: ET.Element) -> str:
+    return _NAMESPACE_DECLARATION.sub("", ET.tostring(element, encoding="unicode"))
+
+
+def minify(root: ET.Element, with_di: bool = True) -> str:
+    """Whitespace-free serialization with every namespace declared once."""
+
+    if not with_di:
+        root = _copy_without_di(root)
+    return ET.tostring(root, encoding="unicode")
+
+
+def _copy_without_di(root: ET.Element) -> ET.Element:
+    copy = ET.Element(root.tag, root.attrib)
+    copy.extend(child for child in root if child.tag != bpmndi_tag("BPMNDiagram"))
+    return copy
+
+
+def _select(root: ET.Element, ids: Set[str], with_di: bool, neighbours: bool) -> List[ET.Element]:
+    by_id = {el.get("id"): el for el in root.iter() if el.get("id")}
+    semantic: Set[str] = set()
+    for element_id in ids:
+        element = by_id[element_id]
+        if element.tag in _DI_ELEMENTS:
+            semantic.add(element.get("bpmnElement") or "")
+        semantic.add(element_id)
+
+    if neighbours:
+        flows = list(root.iter(bpmn_tag("sequenceFlow")))
+        for element_id in list(semantic):
+            element = by_id.get(element_id)
+            if element is None:
+                continue
+            if element.tag == bpmn_tag("sequenceFlow"):
+                semantic.update(ref for ref in (element.get("sourceRef"), element.get("targetRef")) if ref)
+            elif is_flow_node(element):
+                for flow in flows:
+                    if element_id in (flow.get("sourceRef"), flow.get("targetRef")):
+                        semantic.add(flow.get("id") or "")
+                        semantic.update(ref for ref in (flow.get("sourceRef"), flow.get("targetRef")) if ref)
+
+    selected = [by_id[element_id] for element_id in by_id if element_id in semantic]
+    if with_di:
+        selected.extend(
+            el for el in root.iter()
+            if el.tag in _DI_ELEMENTS and el.get("bpmnElement") in semantic and el not in selected
+        )
+    return selected
+
+
+def _fragment_ids(root: ET.Element, errors: List[ValidationIssue]) -> Optional[Set[str]]:
+    """Ids the errors point at, or ``None`` when some error concerns the
+    document as a whole."""
+
+    known = {el.get("id") for el in root.iter() if el.get("id")}
+    containers = {root.get("id")} | {el.get("id") for el in root.iter(bpmn_tag("process"))}
+    ids: Set[str] = set()
+    for issue in errors:
+        if not issue.id or issue.id not in known or issue.id in containers:
+            return None
+        ids.add(issue.id)
+    return ids
+
+
+def _render(
+    text: str,
+    language: str,
+    process_name: str,
+    body: str,
+    errors: List[ValidationIssue],
+    scope: str,
+    with_di: bool,
+) -> str:
+    error_lines = "\n".join(
+        f"- id={err.id or ''} rule={err.rule or ''} message={err.message}" for err in errors
+    )
+    if scope == SCOPE_FRAGMENTS:
+        source = "Фрагменты BPMN 2.0 XML, к которым относятся ошибки (префиксы bpmn, bpmndi, dc, di уже объявлены)"
+    else:
+        source = "Текущий BPMN XML"
+    new_elements = " (для новых узлов и потоков добавь BPMNShape/BPMNEdge)" if with_di else ", без DI"
+    return f"""
+Описание процесса ({language}): {text}
+Процесс '{process_name}'. {source}:
+{body}
+Ошибки валидации:
+{error_lines}
+Исправь минимально необходимое. Верни только исправленные или новые элементы целиком с их id{new_elements}, для удаления элемента верни <delete id="..."/>. Не возвращай документ целиком и не добавляй пояснений.
+"""
+
+
+def build_repair_prompt(
+    text: str,
+    language: str,
+    xml: str,
+    errors: Iterable[ValidationIssue],
+    process_name: str,
+    token_budget: int,
+    with_di: bool = True,
+) -> Optional[RepairPrompt]:
+    """Build the smallest useful patch prompt within ``token_budget``.
+
+    Context is dropped step by step (DI, neighbours, errors beyond the
+    first ones) until the prompt fits. Returns ``None`` when
+    ``xml`` cannot be parsed, so that the caller can use a full-document
+    prompt instead.
+    """
+
+    errors = list(errors)
+    try:
+        root = parse_document(xml)
+    except ET.ParseError:
+        return None
+    _strip_whitespace(root)
+    base_xml = serialize_document(root)
+    # The description is context, not the subject of the repair; keep it to
+    # a fraction of the budget.
+    text = text[: max(token_budget, 1) * 3 // 4]
+
+    ids = _fragment_ids(root, errors)
+    candidates: List[Tuple[str, List[ValidationIssue], str, int]] = []
+    if ids is None:
+        for di in ((True, False) if with_di else (False,)):
+            candidates.append((SCOPE_DOCUMENT, errors, minify(root, with_di=di), 1))
+    else:
+        levels = ((with_di, True), (False, True), (with_di, False), (False, False))
+        for di, neighbours in dict.fromkeys(levels):
+            selected = _select(root, ids, di, neighbours)
+            body = "\n".join(_fragment(el) for el in selected)
+            candidates.append((SCOPE_FRAGMENTS, errors, body, len(selected)))
+        # Last resort: repair the errors one (group) at a time.
+        for count in range(len(errors) - 1, 0, -1):
+            subset = errors[:count]
+            selected = _select(root, {issue.id for issue in subset if issue.id}, False, False)
+            body = "\n".join(_fragment(el) for el in selected)
+            candidates.append((SCOPE_FRAGMENTS, subset, body, len(selected)))
+
+    prompt = ""
+    for scope, subset, body, elements in candidates:
+        prompt = _render(text, language, process_name, body, subset, scope, with_di)
+        if estimate_tokens(prompt) <= token_budget:
+            return RepairPrompt(prompt, base_xml, scope, elements, over_budget=False)
+    return RepairPrompt(prompt, base_xml, scope, elements, over_budget=True)
+
+
+def _extract_patch(completion: str) -> Optional[List[ET.Element]]:
+    text = _XML_DECLARATION.sub("", _FENCE.sub("", completion.strip())).strip()
+    declarations = " ".join(f'xmlns:{prefix}="{uri}"' for prefix, uri in STANDARD_PREFIXES.items())
+    try:
+        wrapper = ET.fromstring(f"<patch {declarations}>{text}</patch>")
+    except ET.ParseError:
+        return None
+    elements: List[ET.Element] = []
+    for child in wrapper:
+        if local_name(child.tag) == "patch":
+            elements.extend(child)
+        else:
+            elements.append(child)
+    return elements
+
+
+def _delete(root: ET.Element, element_id: str) -> None:
+    parents = parent_map(root)
+    for element in list(root.iter()):
+        if element is root or element not in parents:
+            continue
+        if (
+            element.get("id") == element_id
+            or element.get("bpmnElement") == element_id
+            or (local_name(element.tag) in ("incoming", "outgoing") and (element.text or "").strip() == element_id)
+        ):
+            parents[element].remove(element)
+
+
+def is_full_document(completion: str) -> bool:
+    return re.search(r"<(?:\w+:)?definitions\b", completion) is not None
+
+
+def merge_patch(xml: str, completion: str) -> Tuple[str, int]:
+    """Apply the patch in ``completion`` to ``xml``.
+
+    Returns the new document and the number of patch elements applied. A
+    completion holding a whole document replaces ``xml``; an unusable patch
+    leaves ``xml`` unchanged.
+    """
+
+    if is_full_document(completion):
+        return completion, 1
+    elements = _extract_patch(completion)
+    if not elements:
+        return xml, 0
+    root = parse_document(xml)
+    process = root.find(bpmn_tag("process"))
+    applied = 0
+    for element in elements:
+        element_id = element.get("id")
+        if not element_id:
+            continue
+        if local_name(element.tag) == "delete":
+            _delete(root, element_id)
+            applied += 1
+            continue
+        parents = parent_map(root)
+        existing = next((el for el in root.iter() if el.get("id") == element_id), None)
+        if existing is not None and existing in parents:
+            parent = parents[existing]
+            parent[list(parent).index(existing)] = element
+        elif element.tag.startswith(f"{{{BPMNDI_NS}}}"):
+            ensure_plane(root).append(element)
+        elif element.tag.startswith(f"{{{BPMN_MODEL_NS}}}") and process is not None:
+            process.append(element)
+        else:
+            continue
+        applied += 1
+    return serialize_document(root), applied
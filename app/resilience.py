@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter.
+
+    The delay before retry ``n`` (starting at 1) is drawn uniformly from
+    ``[0, min(max_delay, base_delay * 2 ** (n - 1))]`` so that clients that
+    failed together do not retry together.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 8.0,
+        rng: Optional[random.Random] = None,
+    ):
+        if attempts < 1:
+            raise ValueError("attempts must be positive")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def backoff(self, retry_number: int) -> float:
+        cap = min(self.max_delay, self.base_delay * (2 ** (retry_number - 1)))
+        return self._rng.uniform(0, cap)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent first attempts.
+
+    Within a sliding ``window`` a retry is allowed only while the number of
+    retries stays below ``min_retries + ratio * requests``. During an outage
+    every request fails, so retries stop once the budget is spent instead of
+    multiplying the load on the upstream.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_retries: int = 10,
+        window: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._clock = clock
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _prune(self, now: float) -> None:
+        horizon = now - self.window
+        for events in (self._requests, self._retries):
+            while events and events[0] < horizon:
+                events.popleft()
+
+    def record_request(self) -> None:
+        now = self._clock()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        now = self._clock()
+        self._prune(now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
+
+
+class CircuitBreaker:
+    """Per-upstream breaker: closed -> open after consecutive failures,
+    half-open after ``reset_timeout`` to let a single probe through."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def before_call(self) -> bool:
+        """Raise :class:`CircuitOpenError` unless the call may proceed.
+
+        Returns whether the call is the half-open probe.
+        """
+
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        retry_after = max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info("circuit_closed", extra={"upstream": self.name})
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(
+                    "circuit_opened",
+                    extra={"upstream": self.name, "failures": self._failures},
+                )
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+
+    def record_ignored(self) -> None:
+        """Release a half-open probe whose outcome says nothing about health."""
+        self._probe_in_flight = False
+
+
+def _always(exc: Exception) -> bool:
+    return True
+
+
+async def call_with_retry(
+    operation: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    budget: Optional[RetryBudget] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    is_retryable: Callable[[Exception], bool] = _always,
+    is_failure: Callable[[Exception], bool] = _always,
+    on_retry: Optional[Callable[[Exception, int, float], None]] = None,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+) -> T:
+    """Run ``operation`` under the retry policy, budget and breaker.
+
+    ``is_failure`` decides which exceptions count against the breaker and
+    ``is_retryable`` which ones are worth another attempt. The last error
+    is re-raised unchanged once retries are exhausted or not allowed;
+    :class:`CircuitOpenError` is raised without calling the upstream.
+    """
+
+    if budget is not None:
+        budget.record_request()
+    attempt = 1
+    while True:
+        probe = breaker.before_call() if breaker is not None else False
+        try:
+            result = await operation()
+        except Exception as exc:
+            if breaker is not None:
+                if is_failure(exc):
+                    breaker.record_failure()
+                else:
+                    breaker.record_ignored()
+            if not is_retryable(exc) or attempt >= policy.attempts:
+                raise
+            if budget is not None and not budget.try_spend():
+                logger.warning("retry_budget_exhausted", extra={"attempt": attempt})
+                raise
+            delay = policy.backoff(attempt)
+            if on_retry is not None:
+                on_retry(exc, attempt, delay)
+            tracing.add("retries")
+            with tracing.span("retry_wait"):
+                await sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            # Cancelled mid-call (a losing hedged candidate, a client that
+            # went away): the outcome says nothing about the upstream, but a
+            # claimed probe must be released or the breaker stays half-open.
+            if probe:
+                breaker.record_ignored()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
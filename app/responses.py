@@ -0,0 +1,58 @@
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+from .json_encoding import encode_json
+
+XML_MEDIA_TYPE = "application/xml"
+_XML_MEDIA_TYPES = frozenset({"application/xml", "text/xml"})
+_JSON_MEDIA_TYPES = frozenset({"application/json", "application/*", "*/*"})
+
+ATTEMPTS_USED_HEADER = "X-Attempts-Used"
+VALIDATED_HEADER = "X-Validated"
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+def _accepted(accept: str) -> Dict[str, float]:
+    """Media types of an ``Accept`` header with their q-values."""
+
+    ranges: Dict[str, float] = {}
+    for item in accept.split(","):
+        media_type, *params = (part.strip() for part in item.split(";"))
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        ranges[media_type.lower()] = max(quality, ranges.get(media_type.lower(), 0.0))
+    return ranges
+
+
+def prefers_xml(accept: Optional[str]) -> bool:
+    """Whether the client asked for XML over JSON; JSON wins ties."""
+
+    if not accept:
+        return False
+    ranges = _accepted(accept)
+    xml = max((q for media_type, q in ranges.items() if media_type in _XML_MEDIA_TYPES), default=0.0)
+    json_q = max((q for media_type, q in ranges.items() if media_type in _JSON_MEDIA_TYPES), default=0.0)
+    return xml > 0 and xml > json_q
+
+
+def xml_response(xml: str, attempts_used: int) -> Response:
+    """The validated document as the raw body, metadata in headers."""
+
+    return Response(
+        content=xml.encode("utf-8"),
+        media_type=XML_MEDIA_TYPE,
+        headers={ATTEMPTS_USED_HEADER: str(attempts_used), VALIDATED_HEADER: "true"},
+    )
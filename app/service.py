@@ -1,22 +1,104 @@
+import asyncio
 import json
 import logging
+import time
 import uuid
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
+from . import tracing
+from .autofix import auto_fix
+from .cache import ResultCache, result_cache_key
+from .examples import Example, ExampleStore, format_examples
 from .gigachat import GigaChatClient, GigaChatError
-from .models import GenerateRequest, ValidationIssue, ValidationReport
+from .layout import apply_layout, semantic_only
+from .metrics import (
+    ATTEMPTS,
+    ATTEMPTS_USED,
+    GENERATION_SECONDS,
+    GENERATIONS,
+    LLM_CALL_SECONDS,
+    VALIDATION_ISSUES,
+)
+from .models import (
+    GENERATION_MODE_IR,
+    GENERATION_MODE_LAYOUT,
+    GenerateRequest,
+    ValidationIssue,
+    ValidationReport,
+)
+from .prevalidator import FLOW_NODE_TYPES, PreValidator
+from .process_ir import ir_to_xml, parse_ir
+from .repair import build_repair_prompt, estimate_tokens, merge_patch
+from .similarity import NearDuplicateIndex, rename_process
+from .tracing import Trace
 from .validator_client import ValidatorClient, ValidatorError
 
 logger = logging.getLogger(__name__)
 
+# Local fix/re-validate rounds per attempt before falling back to the LLM.
+_MAX_AUTO_FIX_ROUNDS = 2
 
-def _build_initial_prompt(text: str, process_name: str, language: str) -> str:
+
+def _build_initial_prompt(text: str, process_name: str, language: str, examples: str = "") -> str:
     return f"""
 Ты генератор BPMN 2.0 XML. Верни только валидный BPMN 2.0 XML без пояснений.
 Требования: один процесс без pool и lane, используй префикс bpmn:, добавь BPMN DI (diagram, plane, shapes, edges).
 Минимум: один <bpmn:process id> с именем '{process_name}', startEvent и endEvent соединенные sequenceFlow.
 Уникальные id, простой линейный layout координатами (grid).
+{examples}Описание процесса ({language}): {text}
+"""
+
+
+# Examples are stored without DI; these notes keep the model from copying
+# that into the full and IR answers.
+_FULL_EXAMPLES_NOTE = "В примерах опущен BPMN DI, в ответе DI (diagram, plane, shapes, edges) обязателен."
+_IR_EXAMPLES_NOTE = "Примеры даны в BPMN XML только для структуры, ответ верни в JSON формате выше."
+
+
+def _build_semantic_prompt(text: str, process_name: str, language: str, examples: str = "") -> str:
+    return f"""
+Ты генератор BPMN 2.0 XML. Верни только валидный BPMN 2.0 XML без пояснений.
+Требования: один процесс без pool и lane, используй префикс bpmn:, НЕ добавляй BPMN DI (bpmndi), координаты будут рассчитаны автоматически.
+Минимум: один <bpmn:process id> с именем '{process_name}', startEvent и endEvent соединенные sequenceFlow.
+Уникальные id.
+{examples}Описание процесса ({language}): {text}
+"""
+
+
+_IR_FORMAT = (
+    '{"nodes":[{"id":"start","type":"startEvent","name":"..."},'
+    '{"id":"t1","type":"userTask","name":"..."},{"id":"end","type":"endEvent"}],'
+    '"flows":[{"source":"start","target":"t1"},{"source":"t1","target":"end","name":"..."}]}'
+)
+
+
+def _build_ir_prompt(text: str, process_name: str, language: str, examples: str = "") -> str:
+    return f"""
+Ты генератор BPMN процессов. Верни только JSON без пояснений в формате:
+{_IR_FORMAT}
+Типы узлов: {", ".join(sorted(FLOW_NODE_TYPES))}. Для boundaryEvent укажи attached_to.
+Минимум: startEvent и endEvent, соединенные flows. Уникальные id узлов. Процесс '{process_name}'.
+{examples}Описание процесса ({language}): {text}
+"""
+
+
+def _build_ir_repair_prompt(
+    text: str,
+    language: str,
+    current_ir: str,
+    errors: List[ValidationIssue],
+    process_name: str,
+) -> str:
+    error_lines = "\n".join(
+        _format_error(err) for err in errors
+    )
+    return f"""
 Описание процесса ({language}): {text}
+Текущий граф процесса '{process_name}':
+{current_ir}
+Ошибки валидации:
+{error_lines}
+Исправь минимально необходимое, сохрани смысл процесса, верни только JSON в том же формате.
 """
 
 
@@ -26,17 +108,19 @@ def _build_repair_prompt(
     current_xml: str,
     errors: List[ValidationIssue],
     process_name: str,
+    with_di: bool = True,
 ) -> str:
     error_lines = "\n".join(
         _format_error(err) for err in errors
     )
+    di_requirement = "с DI" if with_di else "без DI"
     return f"""
 Описание процесса ({language}): {text}
 Текущий BPMN XML:
 {current_xml}
 Ошибки валидации:
 {error_lines}
-Исправь минимально необходимое, сохрани смысл процесса, верни только BPMN 2.0 XML с DI, один процесс без pool/lane под именем '{process_name}'.
+Исправь минимально необходимое, сохрани смысл процесса, верни только BPMN 2.0 XML {di_requirement}, один процесс без pool/lane под именем '{process_name}'.
 """
 
 
@@ -52,45 +136,386 @@ def _looks_like_xml(xml: str) -> bool:
     return xml.strip().startswith("<") and "<bpmn:definitions" in xml
 
 
+def _candidate_temperatures(base: float, count: int, step: float) -> List[float]:
+    """``base``, then alternately above and below it, clamped to [0, 1]."""
+
+    values = []
+    for index in range(count):
+        offset = (index + 1) // 2 * step * (1 if index % 2 else -1)
+        values.append(round(min(1.0, max(0.0, base + offset)), 3))
+    return values
+
+
+def _count_errors(report: ValidationReport) -> None:
+    for issue in report.errors:
+        VALIDATION_ISSUES.inc(issue.rule or "unknown")
+
+
+def _debug(records: List[Dict], started: float) -> Dict:
+    return {"attempts": records, "summary": tracing.summarize(records, time.monotonic() - started)}
+
+
 def _safe_process_name(request: GenerateRequest) -> str:
     if request.process_name:
         return request.process_name
     return f"Process-{uuid.uuid4().hex[:8]}"
 
 
+def _annotate_examples(record: Dict, examples: List[Tuple[float, Example]]) -> None:
+    if examples:
+        Trace(record).annotate("few_shot_similarity", [round(score, 4) for score, _ in examples])
+
+
+def _cached_response(request: GenerateRequest, bpmn_xml: str, debug: Dict) -> Dict:
+    response = {"validated": True, "attempts_used": 0, "bpmn_xml": bpmn_xml}
+    if request.return_debug:
+        response["debug"] = {"attempts": [], **debug}
+    return response
+
+
 class GenerationService:
-    def __init__(self, gigachat: GigaChatClient, validator: ValidatorClient):
+    def __init__(
+        self,
+        gigachat: GigaChatClient,
+        validator: ValidatorClient,
+        stream: bool = False,
+        result_cache: Optional[ResultCache] = None,
+        prevalidator: Optional[PreValidator] = None,
+        auto_fix: bool = False,
+        candidates: int = 1,
+        max_concurrency: int = 4,
+        temperature_step: float = 0.2,
+        minimal_repair: bool = False,
+        repair_token_budget: int = 3000,
+        near_duplicates: Optional[NearDuplicateIndex] = None,
+        examples: Optional[ExampleStore] = None,
+    ):
         self.gigachat = gigachat
         self.validator = validator
+        self.stream = stream
+        self.result_cache = result_cache
+        self.prevalidator = prevalidator
+        self.auto_fix = auto_fix
+        self.candidates = candidates
+        self.max_concurrency = max_concurrency
+        self.temperature_step = temperature_step
+        self.minimal_repair = minimal_repair
+        self.repair_token_budget = repair_token_budget
+        self.near_duplicates = near_duplicates
+        self.examples = examples
+
+    def stats(self) -> Dict:
+        stats: Dict = {}
+        if self.result_cache is not None:
+            stats["result_cache"] = self.result_cache.stats()
+        if self.near_duplicates is not None:
+            stats["near_duplicates"] = self.near_duplicates.stats()
+        if self.examples is not None:
+            stats["few_shot"] = self.examples.stats()
+        rate_limiter = getattr(self.gigachat, "rate_limiter", None)
+        if rate_limiter is not None:
+            stats["gigachat_rate_limit"] = rate_limiter.stats()
+        validation_cache = getattr(self.validator, "cache", None)
+        if validation_cache is not None:
+            stats["validation_cache"] = validation_cache.stats()
+        return stats
 
     async def generate(self, request: GenerateRequest, max_attempts: int) -> Dict:
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            response = await self._cached_generate(request, max_attempts)
+            if response["attempts_used"] == 0:
+                outcome = "cache_hit"
+            else:
+                outcome = "validated" if response["validated"] else "failed"
+                ATTEMPTS_USED.observe(response["attempts_used"])
+            return response
+        finally:
+            GENERATION_SECONDS.observe(time.monotonic() - started, outcome)
+            GENERATIONS.inc(outcome)
+
+    async def _cached_generate(self, request: GenerateRequest, max_attempts: int) -> Dict:
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = result_cache_key(request, self.gigachat.model)
+            if not request.bypass_cache:
+                cached = await self.result_cache.get(cache_key)
+                if cached is not None:
+                    return _cached_response(request, cached["bpmn_xml"], {"cache": "hit"})
+
+        if self.near_duplicates is not None and not request.bypass_cache:
+            match = self.near_duplicates.lookup(request.text, request.language)
+            if match is not None:
+                xml, score = match
+                return _cached_response(
+                    request,
+                    rename_process(xml, _safe_process_name(request)),
+                    {"cache": "near_duplicate", "similarity": score},
+                )
+
+        response = await self._generate(request, max_attempts)
+        if response.get("validated"):
+            if cache_key is not None:
+                await self.result_cache.set(cache_key, {
+                    "bpmn_xml": response["bpmn_xml"],
+                    "attempts_used": response["attempts_used"],
+                })
+            if self.near_duplicates is not None:
+                await self.near_duplicates.add(request.text, request.language, response["bpmn_xml"])
+            if self.examples is not None:
+                await self.examples.add(request.text, request.language, response["bpmn_xml"])
+        return response
+
+    async def _generate(self, request: GenerateRequest, max_attempts: int) -> Dict:
+        examples: List[Tuple[float, Example]] = []
+        if self.examples is not None:
+            examples = await self.examples.select(request.text, request.language)
+        if request.mode == GENERATION_MODE_IR:
+            response = await self._generate_from_ir(request, max_attempts, examples)
+        else:
+            response = await self._generate_xml(request, max_attempts, examples)
+        if self.examples is not None:
+            self.examples.record(bool(examples), response["attempts_used"], response["validated"])
+        return response
+
+    async def _generate_xml(
+        self, request: GenerateRequest, max_attempts: int, examples: List[Tuple[float, Example]]
+    ) -> Dict:
+        started = time.monotonic()
         process_name = _safe_process_name(request)
         debug_attempts: List[Dict] = []
 
-        prompt = _build_initial_prompt(request.text, process_name, request.language)
-        xml = None
-        for attempt in range(1, max_attempts + 1):
-            if attempt == 1:
-                xml = await self._call_llm(prompt, request.temperature, repair=False)
-            else:
-                repair_prompt = _build_repair_prompt(
-                    request.text,
-                    request.language,
-                    xml or "",
-                    report.errors,
-                    process_name,
+        layout_mode = request.mode == GENERATION_MODE_LAYOUT
+        if layout_mode:
+            prompt = _build_semantic_prompt(request.text, process_name, request.language, format_examples(examples))
+        else:
+            # Stored examples carry no DI; the full prompt still asks for it.
+            prompt = _build_initial_prompt(
+                request.text, process_name, request.language, format_examples(examples, _FULL_EXAMPLES_NOTE),
+            )
+        prompt_build = time.monotonic() - started
+
+        candidates = request.candidates or self.candidates
+        if candidates > 1:
+            xml, report = await self._hedged_attempt(prompt, request.temperature, candidates, layout_mode, debug_attempts)
+            # The candidates share one prompt.
+            for record in debug_attempts:
+                Trace(record).add_time("prompt_build", prompt_build)
+                _annotate_examples(record, examples)
+        else:
+            record: Dict = {"attempt": 1}
+            Trace(record).add_time("prompt_build", prompt_build)
+            _annotate_examples(record, examples)
+            xml, report = await self._attempt(prompt, request.temperature, False, layout_mode, record)
+            debug_attempts.append(record)
+
+        attempt = 1
+        while report.errors and attempt < max_attempts:
+            attempt += 1
+            record = {"attempt": attempt}
+            trace = Trace(record)
+            current_xml = semantic_only(xml or "") if layout_mode else xml or ""
+            patch = None
+            if self.minimal_repair:
+                with trace.span("prompt_build"):
+                    patch = build_repair_prompt(
+                        request.text,
+                        request.language,
+                        current_xml,
+                        report.errors,
+                        process_name,
+                        self.repair_token_budget,
+                        with_di=not layout_mode,
+                    )
+            if patch is not None:
+                record["repair_prompt"] = patch.debug()
+                xml, report = await self._attempt(
+                    patch.prompt, request.temperature, True, layout_mode, record, patch_base=patch.base_xml,
                 )
-                xml = await self._call_llm(repair_prompt, request.temperature, repair=True)
+            else:
+                with trace.span("prompt_build"):
+                    repair_prompt = _build_repair_prompt(
+                        request.text,
+                        request.language,
+                        current_xml,
+                        report.errors,
+                        process_name,
+                        with_di=not layout_mode,
+                    )
+                xml, report = await self._attempt(repair_prompt, request.temperature, True, layout_mode, record)
+            debug_attempts.append(record)
+
+        if not report.errors:
+            response = {
+                "validated": True,
+                "attempts_used": attempt,
+                "bpmn_xml": xml,
+            }
+        else:
+            response = {
+                "validated": False,
+                "attempts_used": max_attempts,
+                "last_validation_report": report.dict(),
+            }
+        if request.return_debug:
+            response["debug"] = _debug(debug_attempts, started)
+        return response
+
+    async def _attempt(
+        self,
+        prompt: str,
+        temperature: float,
+        repair: bool,
+        layout_mode: bool,
+        record: Dict,
+        patch_base: Optional[str] = None,
+    ) -> Tuple[str, ValidationReport]:
+        """One LLM call followed by local checks, auto-fix and validation.
+
+        With ``patch_base`` the completion is a patch that is merged into
+        that document first.
+        """
 
-            if not _looks_like_xml(xml):
-                report = ValidationReport(errors=[ValidationIssue(message="Invalid XML format")])
+        ATTEMPTS.inc("repair" if repair else "generate")
+        record["prompt_chars"] = len(prompt)
+        record["prompt_tokens"] = estimate_tokens(prompt)
+        with tracing.activate(Trace(record)) as trace:
+            if patch_base is not None and self.stream:
+                # A patch has no bpmn:definitions root for the stream checker.
+                xml = await self._call_llm(prompt, temperature, repair=repair, stream=False)
             else:
-                report = await self._validate(xml)
+                xml = await self._call_llm(prompt, temperature, repair=repair)
+            record["completion_chars"] = len(xml)
+            if patch_base is not None:
+                with trace.span("patch_merge"):
+                    xml, record["patch_elements"] = merge_patch(patch_base, xml)
 
-            debug_attempts.append({
-                "attempt": attempt,
-                "validation_report": report.dict(),
-            })
+            stream_debug = record.get("stream") or {}
+            if stream_debug.get("aborted"):
+                report = ValidationReport(errors=[ValidationIssue(
+                    message=f"Generation aborted: {stream_debug.get('abort_reason')}",
+                    rule="stream-aborted",
+                )])
+            else:
+                if layout_mode:
+                    with trace.span("layout"):
+                        xml = apply_layout(xml)
+                xml, report = await self._check_and_fix(xml, record)
+        _count_errors(report)
+        record["validation_report"] = report.dict()
+        return xml, report
+
+    async def _hedged_attempt(
+        self,
+        prompt: str,
+        temperature: float,
+        candidates: int,
+        layout_mode: bool,
+        debug_attempts: List[Dict],
+    ) -> Tuple[str, ValidationReport]:
+        """Generate ``candidates`` diagrams concurrently at spread temperatures.
+
+        The first candidate that validates wins and the others are cancelled;
+        otherwise the one with the fewest errors is returned for repair.
+        Upstream errors only propagate when every candidate failed with one.
+        """
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        records = [
+            {"attempt": 1, "candidate": index, "temperature": value}
+            for index, value in enumerate(_candidate_temperatures(temperature, candidates, self.temperature_step))
+        ]
+
+        async def run(record: Dict) -> Tuple[str, ValidationReport]:
+            async with semaphore:
+                return await self._attempt(prompt, record["temperature"], False, layout_mode, record)
+
+        tasks = {asyncio.ensure_future(run(record)): record for record in records}
+        best: Optional[Tuple[str, ValidationReport]] = None
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        tasks[task]["error"] = str(task.exception())
+                        continue
+                    xml, report = task.result()
+                    if best is None or len(report.errors) < len(best[1].errors):
+                        best = xml, report
+                if best is not None and not best[1].errors:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                tasks[task]["cancelled"] = True
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            debug_attempts.extend(records)
+
+        if best is None:
+            assert error is not None
+            raise error
+        return best
+
+    async def _generate_from_ir(
+        self, request: GenerateRequest, max_attempts: int, examples: List[Tuple[float, Example]]
+    ) -> Dict:
+        """Generation loop for the compact JSON IR: the model writes (and
+        repairs) a small graph which is serialized to BPMN XML locally."""
+
+        started = time.monotonic()
+        process_name = _safe_process_name(request)
+        debug_attempts: List[Dict] = []
+
+        prompt = _build_ir_prompt(
+            request.text, process_name, request.language, format_examples(examples, _IR_EXAMPLES_NOTE),
+        )
+        prompt_build = time.monotonic() - started
+        completion = ""
+        current_ir = ""
+        for attempt in range(1, max_attempts + 1):
+            record: Dict = {"attempt": attempt}
+            ATTEMPTS.inc("repair" if attempt > 1 else "generate")
+            with tracing.activate(Trace(record)) as trace:
+                if attempt == 1:
+                    trace.add_time("prompt_build", prompt_build)
+                    _annotate_examples(record, examples)
+                else:
+                    with trace.span("prompt_build"):
+                        prompt = _build_ir_repair_prompt(
+                            request.text,
+                            request.language,
+                            current_ir or completion,
+                            report.errors,
+                            process_name,
+                        )
+                record["prompt_chars"] = len(prompt)
+                record["prompt_tokens"] = estimate_tokens(prompt)
+                completion = await self._call_llm(prompt, request.temperature, repair=attempt > 1, stream=False)
+                record["completion_chars"] = len(completion)
+
+                with trace.span("ir_parse"):
+                    ir, issues = parse_ir(completion)
+                current_ir = ir.compact_json() if ir is not None else ""
+                if issues:
+                    record["validated_by"] = "local"
+                    report = ValidationReport(errors=issues)
+                else:
+                    with trace.span("ir_serialize"):
+                        xml, id_map = ir_to_xml(ir, process_name)
+                    xml, report = await self._check_and_fix(xml, record)
+                    # Point findings at the ids the model used in its graph.
+                    for issue in report.errors:
+                        if issue.id in id_map:
+                            issue.id = id_map[issue.id]
+
+            _count_errors(report)
+            record["validation_report"] = report.dict()
+            debug_attempts.append(record)
 
             if not report.errors:
                 response = {
@@ -99,7 +524,7 @@ class GenerationService:
                     "bpmn_xml": xml,
                 }
                 if request.return_debug:
-                    response["debug"] = {"attempts": debug_attempts}
+                    response["debug"] = _debug(debug_attempts, started)
                 return response
 
         response = {
@@ -108,23 +533,69 @@ class GenerationService:
             "last_validation_report": report.dict(),
         }
         if request.return_debug:
-            response["debug"] = {"attempts": debug_attempts}
+            response["debug"] = _debug(debug_attempts, started)
         return response
 
-    async def _call_llm(self, prompt: str, temperature: float, repair: bool) -> str:
+    async def _call_llm(self, prompt: str, temperature: float, repair: bool, stream: Optional[bool] = None) -> str:
+        if stream is None:
+            stream = self.stream
+        started = time.monotonic()
         try:
-            if repair:
+            if stream:
+                completion = await self.gigachat.stream_bpmn(prompt, temperature)
+                tracing.annotate("stream", completion.debug())
+                xml = completion.content
+            elif repair:
                 xml = await self.gigachat.repair_bpmn(prompt, temperature)
             else:
                 xml = await self.gigachat.generate_bpmn(prompt, temperature)
         except GigaChatError as exc:
             logger.error("gigachat_error", extra={"error": str(exc)})
             raise
+        finally:
+            elapsed = time.monotonic() - started
+            LLM_CALL_SECONDS.observe(elapsed, "repair" if repair else "generate")
+            tracing.add_time("llm", elapsed)
         return xml
 
+    async def _check_and_fix(self, xml: str, record: Dict) -> Tuple[str, ValidationReport]:
+        """Validate ``xml``, repairing mechanical issues locally before giving
+        up on it, so that an LLM repair is only spent on real problems."""
+
+        report = await self._check(xml, record)
+        for _ in range(_MAX_AUTO_FIX_ROUNDS):
+            if not report.errors or not self.auto_fix:
+                break
+            # Warnings only get fixed alongside errors: a document that is
+            # otherwise valid is not rewritten for them.
+            with tracing.span("auto_fix"):
+                fixed, applied = auto_fix(xml, report.errors + report.warnings)
+            if not applied:
+                break
+            record.setdefault("auto_fixes", []).extend(applied)
+            xml = fixed
+            report = await self._check(xml, record)
+        return xml, report
+
+    async def _check(self, xml: str, record: Dict) -> ValidationReport:
+        """Local structural checks first; only clean documents reach the validator."""
+
+        if not _looks_like_xml(xml):
+            record["validated_by"] = "local"
+            return ValidationReport(errors=[ValidationIssue(message="Invalid XML format", rule="xml-format")])
+        if self.prevalidator is not None:
+            with tracing.span("local_checks"):
+                report = await self.prevalidator.validate(xml)
+            if report.errors:
+                record["validated_by"] = "local"
+                return report
+        record["validated_by"] = "remote"
+        return await self._validate(xml)
+
     async def _validate(self, xml: str) -> ValidationReport:
         try:
-            return await self.validator.validate(xml)
+            with tracing.span("validation"):
+                return await self.validator.validate(xml)
         except ValidatorError as exc:
             logger.error("validator_error", extra={"error": str(exc)})
             raise
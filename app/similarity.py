@@ -0,0 +1,231 @@
+"""Near-duplicate index of validated diagrams keyed by request text.
+
+Descriptions are normalised (case, punctuation, whitespace), split into
+sentences and turned into word shingles, so rewording punctuation or
+reordering sentences leaves most shingles intact. Each text gets a MinHash
+signature; LSH banding finds candidates in O(bands) dict lookups, and the
+signature agreement estimates Jaccard similarity for the final check.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .cache import SQLiteStore
+from .metrics import NEAR_DUPLICATE_LOOKUP_SECONDS
+from .xml_utils import bpmn_tag, parse_document, serialize_document
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+SHINGLE_WORDS = 2
+
+_SENTENCE_END = re.compile(r"[.!?;:\n]+")
+_NON_WORD = re.compile(r"[^\w]+")
+
+# XOR with a random mask permutes the 64-bit hash space; it is several
+# times cheaper in pure Python than ``(a * h + b) % p`` and good enough for
+# similarity estimates.
+_MASKS = [random.Random(0x5EED + index).getrandbits(64) for index in range(NUM_PERMUTATIONS)]
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+
+
+def words(text: str) -> Set[str]:
+    """Distinct normalised words of ``text``."""
+
+    return set(_NON_WORD.sub(" ", _normalize(text)).split())
+
+
+def shingles(text: str) -> Set[str]:
+    """Word ``SHINGLE_WORDS``-grams of every sentence of ``text``."""
+
+    result: Set[str] = set()
+    for sentence in _SENTENCE_END.split(_normalize(text)):
+        words = _NON_WORD.sub(" ", sentence).split()
+        if len(words) < SHINGLE_WORDS:
+            result.update(words)
+            continue
+        for start in range(len(words) - SHINGLE_WORDS + 1):
+            result.add(" ".join(words[start:start + SHINGLE_WORDS]))
+    return result
+
+
+def _hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(features: Set[str]) -> Tuple[int, ...]:
+    hashes = [_hash(feature) for feature in features] or [0]
+    return tuple(min([value ^ mask for value in hashes]) for mask in _MASKS)
+
+
+def similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+
+    return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def _band_keys(language: str, signature: Tuple[int, ...]) -> List[Tuple[str, int, Tuple[int, ...]]]:
+    rows = len(signature) // BANDS
+    return [(language, band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+
+def rename_process(xml: str, name: str) -> str:
+    """``xml`` with the ``name`` of its processes set to ``name``."""
+
+    root = parse_document(xml)
+    for process in root.iter(bpmn_tag("process")):
+        process.set("name", name)
+    return serialize_document(root)
+
+
+class _Entry:
+    __slots__ = ("language", "signature", "bpmn_xml", "expires_at")
+
+    def __init__(self, language: str, signature: Tuple[int, ...], bpmn_xml: str, expires_at: float):
+        self.language = language
+        self.signature = signature
+        self.bpmn_xml = bpmn_xml
+        self.expires_at = expires_at
+
+
+class NearDuplicateIndex:
+    """Validated diagrams found by MinHash/LSH similarity of their text.
+
+    Entries are partitioned by language, bounded to ``max_entries`` (least
+    recently used first out) and expire after ``ttl`` seconds. With
+    ``sqlite_path`` they are persisted and reloaded on startup.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries: int = 2048,
+        ttl: float = 86400.0,
+        sqlite_path: str = "",
+        clock: Callable[[], float] = time.time,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lookup_seconds = 0.0
+        self._lookup_seconds_max = 0.0
+        self._disk = SQLiteStore(sqlite_path, "near_duplicates") if sqlite_path else None
+        if self._disk is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        now = self._clock()
+        self._disk.purge_expired(now)
+        for key, raw, expires_at in self._disk.items(now, self.max_entries):
+            value = json.loads(raw)
+            self._insert(key, _Entry(value["language"], tuple(value["signature"]), value["bpmn_xml"], expires_at))
+
+    def _insert(self, key: str, entry: _Entry) -> List[str]:
+        """Add ``entry`` and return the keys evicted to stay within bounds."""
+
+        self._remove(key)
+        self._entries[key] = entry
+        for band_key in _band_keys(entry.language, entry.signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            evicted.append(oldest)
+        return evicted
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in _band_keys(entry.language, entry.signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _find(self, language: str, signature: Tuple[int, ...]) -> Tuple[Optional[str], float]:
+        now = self._clock()
+        candidates: Set[str] = set()
+        for band_key in _band_keys(language, signature):
+            candidates.update(self._buckets.get(band_key, ()))
+        best, best_score = None, 0.0
+        for key in candidates:
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                self._remove(key)
+                continue
+            score = similarity(signature, entry.signature)
+            if score > best_score:
+                best, best_score = key, score
+        return best, best_score
+
+    def lookup(self, text: str, language: str) -> Optional[Tuple[str, float]]:
+        """The stored diagram most similar to ``text`` and its similarity,
+        or ``None`` below the threshold."""
+
+        started = time.monotonic()
+        try:
+            key, score = self._find(language, minhash(shingles(text)))
+        finally:
+            elapsed = time.monotonic() - started
+            self._lookup_seconds += elapsed
+            self._lookup_seconds_max = max(self._lookup_seconds_max, elapsed)
+            NEAR_DUPLICATE_LOOKUP_SECONDS.observe(elapsed)
+        if key is None or score < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key].bpmn_xml, score
+
+    async def add(self, text: str, language: str, bpmn_xml: str) -> None:
+        signature = minhash(shingles(text))
+        key = hashlib.sha256(f"{language}|{','.join(map(str, signature))}".encode("ascii")).hexdigest()
+        expires_at = self._clock() + self.ttl
+        evicted = self._insert(key, _Entry(language, signature, bpmn_xml, expires_at))
+        if self._disk is not None:
+            raw = json.dumps(
+                {"language": language, "signature": list(signature), "bpmn_xml": bpmn_xml},
+                ensure_ascii=False,
+            )
+            await asyncio.to_thread(self._persist, key, raw, expires_at, evicted)
+
+    def _persist(self, key: str, raw: str, expires_at: float, evicted: List[str]) -> None:
+        self._disk.set(key, raw, expires_at)
+        for old in evicted:
+            self._disk.delete(old)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "persistent": self._disk is not None,
+            "lookup_ms_avg": round(self._lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "lookup_ms_max": round(self._lookup_seconds_max * 1000, 3),
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
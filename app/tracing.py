@@ -0,0 +1,129 @@
+"""Lightweight tracing of generation attempts.
+
+A :class:`Trace` collects monotonic timings, counters and annotations of
+one unit of work into a plain dict - the attempt's debug record. It is made
+current with :func:`activate`; code further down the call stack (GigaChat
+client, validator, retry loop) reports into it through the module-level
+helpers, which do nothing when no trace is active.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Mapping, Optional
+
+_USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens")
+# Per-attempt sizes that are added up in the request summary.
+_SIZE_FIELDS = ("prompt_chars", "prompt_tokens", "completion_chars", "retries")
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    def __init__(self, record: Optional[Dict[str, Any]] = None):
+        self.record: Dict[str, Any] = record if record is not None else {}
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add ``seconds`` to ``timings[<name>_ms]``; repeated spans accumulate."""
+
+        timings = self.record.setdefault("timings", {})
+        key = f"{name}_ms"
+        timings[key] = round(timings.get(key, 0.0) + seconds * 1000, 3)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.monotonic() - started)
+
+    def add(self, name: str, amount: float = 1) -> None:
+        self.record[name] = self.record.get(name, 0) + amount
+
+    def annotate(self, name: str, value: Any) -> None:
+        self.record[name] = value
+
+    def add_usage(self, usage: Mapping[str, Any]) -> None:
+        totals = self.record.setdefault("usage", {})
+        for field in _USAGE_FIELDS:
+            value = usage.get(field)
+            if isinstance(value, (int, float)):
+                totals[field] = totals.get(field, 0) + value
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def activate(trace: Trace) -> Iterator[Trace]:
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the block into the current trace, if any."""
+
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+def add_time(name: str, seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_time(name, seconds)
+
+
+def add(name: str, amount: float = 1) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, amount)
+
+
+def annotate(name: str, value: Any) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.annotate(name, value)
+
+
+def add_usage(usage: Mapping[str, Any]) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_usage(usage)
+
+
+def summarize(records: Iterable[Mapping[str, Any]], total_seconds: float) -> Dict[str, Any]:
+    """Per-request totals over attempt records.
+
+    Timings are summed over attempts, so concurrent (hedged) candidates can
+    add up to more than ``total_ms``.
+    """
+
+    timings: Dict[str, float] = {}
+    usage: Dict[str, float] = {}
+    sizes: Dict[str, float] = {field: 0 for field in _SIZE_FIELDS}
+    attempts = 0
+    for record in records:
+        attempts += 1
+        for key, value in record.get("timings", {}).items():
+            timings[key] = round(timings.get(key, 0.0) + value, 3)
+        for key, value in record.get("usage", {}).items():
+            usage[key] = usage.get(key, 0) + value
+        for field in _SIZE_FIELDS:
+            sizes[field] += record.get(field, 0)
+    return {
+        "total_ms": round(total_seconds * 1000, 3),
+        "attempts": attempts,
+        "timings": timings,
+        "usage": usage,
+        **sizes,
+    }
@@ -1,32 +1,160 @@
+import asyncio
+import logging
+import time
 import httpx
-from typing import List, Tuple
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
 
+from .cache import ValidationCache
+from .compression import compress_chunks
+from .metrics import UPSTREAM_ERRORS, VALIDATOR_SECONDS
 from .models import ValidationIssue, ValidationReport
+from .resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy, call_with_retry
+from .xml_utils import canonical_hash
+
+logger = logging.getLogger(__name__)
+
+RULESET_VERSION_HEADER = "X-Ruleset-Version"
 
 
 class ValidatorError(Exception):
     pass
 
 
+def _is_upstream_failure(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
 class ValidatorClient:
-    def __init__(self, url: str, timeout: float = 10.0):
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 10.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        cache: Optional[ValidationCache] = None,
+        ruleset_version: str = "",
+        max_concurrency: int = 0,
+        compression: str = "",
+        compression_min_bytes: int = 1024,
+    ):
         self.url = url
         self.timeout = timeout
+        self._http_client = http_client
+        self.retry_policy = retry_policy or RetryPolicy(attempts=1)
+        self.retry_budget = retry_budget
+        self.breaker = breaker
+        self.cache = cache
+        self.ruleset_version = ruleset_version
+        self._limiter = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        # Content-Encoding for uploads; cleared when the validator turns out
+        # not to support it.
+        self.compression = compression
+        self.compression_min_bytes = compression_min_bytes
+        if cache is not None:
+            cache.set_fingerprint(self.fingerprint)
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.url}|{self.ruleset_version}"
+
+    @asynccontextmanager
+    async def _client(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self._http_client is not None:
+            yield self._http_client
+            return
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            yield client
+
+    def _body(self, xml: str) -> Tuple[Union[bytes, AsyncIterator[bytes]], Dict[str, str]]:
+        headers = {"Content-Type": "text/xml"}
+        # Compare characters, not bytes, to avoid encoding just to measure.
+        if not self.compression or len(xml) < self.compression_min_bytes:
+            return xml.encode("utf-8"), headers
+        headers["Content-Encoding"] = self.compression
+        # Streamed, so the compressed upload is never buffered whole.
+        return compress_chunks(xml, self.compression), headers
+
+    def _rejects_compression(self, response) -> bool:
+        """Whether the validator could not decode the compressed upload:
+        ``415 Unsupported Media Type``, or an error carrying an
+        ``Accept-Encoding`` header without our coding (RFC 7694)."""
+
+        if response.status_code == 415:
+            return True
+        accepted = response.headers.get("accept-encoding")
+        if response.status_code < 400 or accepted is None:
+            return False
+        return self.compression not in {coding.split(";")[0].strip().lower() for coding in accepted.split(",")}
+
+    async def _send(self, client, xml: str):
+        content, headers = self._body(xml)
+        response = await client.post(self.url, content=content, headers=headers)
+        if "Content-Encoding" in headers and self._rejects_compression(response):
+            # Fall back to plain uploads for the lifetime of the client.
+            logger.warning(
+                "validator_compression_unsupported",
+                extra={"encoding": self.compression, "status": response.status_code},
+            )
+            self.compression = ""
+            response = await client.post(self.url, content=xml.encode("utf-8"), headers={"Content-Type": "text/xml"})
+        return response
+
+    async def _post(self, xml: str):
+        async with self._limiter or nullcontext(), self._client() as client:
+            started = time.monotonic()
+            try:
+                response = await self._send(client, xml)
+            except httpx.TransportError:
+                UPSTREAM_ERRORS.inc("validator", "transport")
+                raise
+            finally:
+                VALIDATOR_SECONDS.observe(time.monotonic() - started)
+        if response.status_code >= 400:
+            UPSTREAM_ERRORS.inc("validator", str(response.status_code))
+        response.raise_for_status()
+        self._observe_ruleset_version(response.headers.get(RULESET_VERSION_HEADER))
+        return response.json()
+
+    def _observe_ruleset_version(self, version: Optional[str]) -> None:
+        if not version or version == self.ruleset_version:
+            return
+        self.ruleset_version = version
+        if self.cache is not None:
+            self.cache.set_fingerprint(self.fingerprint)
 
     async def validate(self, xml: str) -> ValidationReport:
+        cache_key = None
+        if self.cache is not None:
+            cache_key = canonical_hash(xml)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    self.url, content=xml.encode("utf-8"), headers={"Content-Type": "text/xml"}
-                )
-            response.raise_for_status()
-            data = response.json()
+            data = await call_with_retry(
+                lambda: self._post(xml),
+                policy=self.retry_policy,
+                budget=self.retry_budget,
+                breaker=self.breaker,
+                is_retryable=_is_upstream_failure,
+                is_failure=_is_upstream_failure,
+            )
+        except CircuitOpenError as exc:
+            raise ValidatorError(str(exc)) from exc
         except httpx.HTTPError as exc:
             raise ValidatorError(str(exc)) from exc
         try:
-            return _parse_validation_response(data)
+            report = _parse_validation_response(data)
         except ValueError as exc:
             raise ValidatorError(str(exc)) from exc
+        if cache_key is not None:
+            self.cache.set(cache_key, report)
+        return report
 
 
 def _parse_validation_response(data) -> ValidationReport:
@@ -0,0 +1,159 @@
+"""Startup warm-up run from the lifespan before the instance reports ready.
+
+Without it the first requests after a deploy pay for lazy imports, the
+GigaChat OAuth call and TCP/TLS handshakes to both upstreams. Every step
+is best-effort: a failure is recorded and logged, and the instance still
+becomes ready so that an upstream outage cannot keep it out of rotation.
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+import httpx
+
+from .gigachat import GigaChatError
+from .layout import apply_layout
+from .metrics import WARMUP_SECONDS
+from .prevalidator import prevalidate
+from .service import GenerationService
+from .validator_client import ValidatorError
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by httpx/httpcore on the first connection or by the
+# stdlib on first use.
+HOT_MODULES = (
+    "encodings.idna",
+    "ssl",
+    "h11",
+    "h2",
+    "anyio._backends._asyncio",
+    "httpcore._backends.anyio",
+)
+
+# Known-good diagram; laid out during warm-up so that the layout and
+# prevalidation code paths run once before real traffic.
+CANNED_DIAGRAM = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+    'id="Definitions_Warmup" targetNamespace="http://bpmn.io/schema/bpmn">'
+    '<bpmn:process id="Process_Warmup" name="Warm-up" isExecutable="false">'
+    '<bpmn:startEvent id="StartEvent_1" name="Start"><bpmn:outgoing>Flow_1</bpmn:outgoing></bpmn:startEvent>'
+    '<bpmn:task id="Task_1" name="Check request"><bpmn:incoming>Flow_1</bpmn:incoming>'
+    '<bpmn:outgoing>Flow_2</bpmn:outgoing></bpmn:task>'
+    '<bpmn:endEvent id="EndEvent_1" name="Done"><bpmn:incoming>Flow_2</bpmn:incoming></bpmn:endEvent>'
+    '<bpmn:sequenceFlow id="Flow_1" sourceRef="StartEvent_1" targetRef="Task_1"/>'
+    '<bpmn:sequenceFlow id="Flow_2" sourceRef="Task_1" targetRef="EndEvent_1"/>'
+    "</bpmn:process></bpmn:definitions>"
+)
+
+
+def _import_hot_modules(modules: Sequence[str]) -> None:
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+
+
+async def _open_connections(client: httpx.AsyncClient, url: str, count: int) -> None:
+    """Leave ``count`` keep-alive connections to ``url``'s host in the pool.
+
+    Any HTTP answer will do (405 included); only transport errors fail.
+    """
+
+    await asyncio.gather(*(client.request("HEAD", url) for _ in range(count)))
+
+
+class WarmUp:
+    """State of the warm-up; ``ready`` flips once :meth:`run` finishes."""
+
+    def __init__(
+        self,
+        service: GenerationService,
+        gigachat_http: Optional[httpx.AsyncClient] = None,
+        validator_http: Optional[httpx.AsyncClient] = None,
+        connections: int = 1,
+        validate: bool = False,
+        timeout: float = 30.0,
+        modules: Sequence[str] = HOT_MODULES,
+    ):
+        self.service = service
+        self.gigachat_http = gigachat_http
+        self.validator_http = validator_http
+        self.connections = connections
+        self.validate = validate
+        self.timeout = timeout
+        self.modules = modules
+        self.ready = False
+        self.duration_ms: Optional[float] = None
+        self.steps: Dict[str, Dict[str, object]] = {}
+
+    async def _step(self, name: str, operation: Callable[[], Awaitable[object]]) -> None:
+        started = time.monotonic()
+        result: Dict[str, object] = {}
+        try:
+            await operation()
+            result["ok"] = True
+        except (httpx.HTTPError, GigaChatError, ValidatorError) as exc:
+            result["ok"] = False
+            result["error"] = str(exc) or type(exc).__name__
+            logger.warning("warmup_step_failed", extra={"step": name, "error": result["error"]})
+        except Exception as exc:  # noqa: BLE001 - a broken step must not keep the instance unready
+            result["ok"] = False
+            result["error"] = f"{type(exc).__name__}: {exc}"
+            logger.exception("warmup_step_failed", extra={"step": name, "error": result["error"]})
+        elapsed = time.monotonic() - started
+        result["ms"] = round(elapsed * 1000, 3)
+        WARMUP_SECONDS.observe(elapsed, name)
+        self.steps[name] = result
+
+    async def _local(self) -> None:
+        _import_hot_modules(self.modules)
+        prevalidate(apply_layout(CANNED_DIAGRAM))
+
+    async def _token(self) -> None:
+        await self.service.gigachat._get_access_token()
+
+    async def _connections(self) -> None:
+        opens = []
+        if self.gigachat_http is not None and self.service.gigachat.api_url:
+            opens.append(_open_connections(self.gigachat_http, self.service.gigachat.api_url, self.connections))
+        if self.validator_http is not None:
+            opens.append(_open_connections(self.validator_http, self.service.validator.url, self.connections))
+        await asyncio.gather(*opens)
+
+    async def _validation(self) -> None:
+        report = await self.service.validator.validate(apply_layout(CANNED_DIAGRAM))
+        if report.errors:
+            raise ValidatorError(f"canned diagram reported {len(report.errors)} errors")
+
+    async def _steps(self) -> None:
+        await self._step("local", self._local)
+        # The token and the connections are independent; the OAuth call
+        # also opens the connection to the auth host.
+        await asyncio.gather(
+            self._step("token", self._token),
+            self._step("connections", self._connections),
+        )
+        if self.validate:
+            await self._step("validation", self._validation)
+
+    async def run(self) -> None:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._steps(), self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning("warmup_timeout", extra={"timeout": self.timeout, "steps": self.steps})
+        finally:
+            elapsed = time.monotonic() - started
+            self.duration_ms = round(elapsed * 1000, 3)
+            WARMUP_SECONDS.observe(elapsed, "total")
+            self.ready = True
+        logger.info("warmup_finished", extra={"duration_ms": self.duration_ms, "steps": self.steps})
+
+    def stats(self) -> Dict[str, object]:
+        return {"ready": self.ready, "duration_ms": self.duration_ms, "steps": dict(self.steps)}
@@ -0,0 +1,68 @@
+from typing import Optional
+from xml.etree import ElementTree as ET
+
+from .xml_utils import DOCUMENT_START, bpmn_tag
+
+# A leading markdown fence or a sentence of prose is skipped; output with no
+# document start within this many characters is given up on.
+_MAX_PREAMBLE_CHARS = 400
+
+
+class BpmnStreamChecker:
+    """Incrementally parses a streamed completion and decides when to give up.
+
+    Chunks are fed as they arrive. :meth:`feed` returns an abort reason as
+    soon as the output cannot become a BPMN document: no markup appears
+    within the first ``_MAX_PREAMBLE_CHARS`` characters, the root element is
+    not ``bpmn:definitions``, or the nesting is malformed. A markdown fence
+    or prose before the document is skipped, as :func:`autofix.auto_fix`
+    strips it later; anything after the closing root tag is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._started = False
+        self._preamble = ""
+        self._depth = 0
+        self.root_seen = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.complete or not chunk:
+            return None
+        if not self._started:
+            self._preamble += chunk
+            text = self._preamble.lstrip()
+            if text.startswith("<"):
+                chunk = text
+            else:
+                match = DOCUMENT_START.search(text)
+                if match is None:
+                    if len(text) > _MAX_PREAMBLE_CHARS:
+                        return "completion does not contain XML markup"
+                    return None
+                chunk = text[match.start():]
+            self._started = True
+            self._preamble = ""
+        try:
+            self._parser.feed(chunk)
+            return self._drain_events()
+        except ET.ParseError as exc:
+            if self.complete:
+                return None
+            return f"malformed XML: {exc}"
+
+    def _drain_events(self) -> Optional[str]:
+        for event, element in self._parser.read_events():
+            if event == "start":
+                if not self.root_seen:
+                    self.root_seen = True
+                    if element.tag != bpmn_tag("definitions"):
+                        return f"root element is {element.tag}, expected bpmn:definitions"
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.complete = True
+                    return None
+        return None
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import re
+import weakref
+from typing import Dict
+from xml.etree import ElementTree as ET
+
+BPMN_MODEL_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+BPMNDI_NS = "http://www.omg.org/spec/BPMN/20100524/DI"
+DC_NS = "http://www.omg.org/spec/DD/20100524/DC"
+DI_NS = "http://www.omg.org/spec/DD/20100524/DI"
+XSI_NS = "http://www.w3.org/2001/XMLSchema-instance"
+
+STANDARD_PREFIXES: Dict[str, str] = {
+    "bpmn": BPMN_MODEL_NS,
+    "bpmndi": BPMNDI_NS,
+    "dc": DC_NS,
+    "di": DI_NS,
+    "xsi": XSI_NS,
+}
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+_AUTO_PREFIX = re.compile(r"ns\d+$")
+_AUTO_DECLARATION = re.compile(r'xmlns:(ns\d+)="([^"]*)"')
+_TAG = re.compile(r"<[^>]+>")
+_QUOTED = re.compile(r'("[^"]*")')
+_AUTO_NAME = re.compile(r"(</?|\s)(ns\d+):|(xmlns:)(ns\d+)=")
+
+# Prefixes a parsed document declared for non-BPMN namespaces, by URI, kept
+# per root element for serialize_document.
+_DOCUMENT_PREFIXES: "weakref.WeakKeyDictionary[ET.Element, Dict[str, str]]" = weakref.WeakKeyDictionary()
+
+# Where a BPMN document starts inside LLM output that may carry markdown
+# fences or prose around it.
+DOCUMENT_START = re.compile(r"<\?xml|<(?:\w+:)?definitions\b")
+
+for _prefix, _uri in STANDARD_PREFIXES.items():
+    ET.register_namespace(_prefix, _uri)
+
+
+def bpmn_tag(name: str) -> str:
+    return f"{{{BPMN_MODEL_NS}}}{name}"
+
+
+def bpmndi_tag(name: str) -> str:
+    return f"{{{BPMNDI_NS}}}{name}"
+
+
+def dc_tag(name: str) -> str:
+    return f"{{{DC_NS}}}{name}"
+
+
+def di_tag(name: str) -> str:
+    return f"{{{DI_NS}}}{name}"
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def format_number(value: float) -> str:
+    """DI coordinate as written to the document: no ``.0`` on whole numbers."""
+
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}"
+
+
+def parse_document(xml: str) -> ET.Element:
+    """Parse ``xml`` and remember its namespace prefixes for serialization.
+
+    ElementTree writes namespaces it has no registered prefix for as
+    ``ns0``, ``ns1``...; the prefixes the document declared are kept for
+    this root only and put back by :func:`serialize_document`, leaving the
+    process-wide registry alone. The standard BPMN prefixes always win.
+    """
+
+    text = xml.strip()
+    prefixes: Dict[str, str] = {}
+    for _, (prefix, uri) in ET.iterparse(io.StringIO(text), events=("start-ns",)):
+        if prefix and prefix not in STANDARD_PREFIXES and uri not in STANDARD_PREFIXES.values():
+            if not _AUTO_PREFIX.match(prefix):
+                prefixes.setdefault(uri, prefix)
+    root = ET.fromstring(text)
+    if prefixes:
+        _DOCUMENT_PREFIXES[root] = prefixes
+    return root
+
+
+def serialize_document(root: ET.Element) -> str:
+    xml = ET.tostring(root, encoding="unicode")
+    prefixes = _DOCUMENT_PREFIXES.get(root)
+    if prefixes:
+        xml = _restore_prefixes(xml, prefixes)
+    return XML_DECLARATION + xml
+
+
+def _restore_prefixes(xml: str, prefixes: Dict[str, str]) -> str:
+    """Rename the generated ``nsN`` prefixes of ``xml`` back to ``prefixes``."""
+
+    used = set(re.findall(r"xmlns:([\w.-]+)=", xml))
+    renames: Dict[str, str] = {}
+    for auto, uri in _AUTO_DECLARATION.findall(xml):
+        prefix = prefixes.get(uri)
+        if prefix and prefix not in used:
+            renames[auto] = prefix
+            used.add(prefix)
+    if not renames:
+        return xml
+
+    def rename(match: "re.Match[str]") -> str:
+        if match.group(2):
+            return match.group(1) + renames.get(match.group(2), match.group(2)) + ":"
+        return match.group(3) + renames.get(match.group(4), match.group(4)) + "="
+
+    def rename_tag(match: "re.Match[str]") -> str:
+        # Attribute values are left as they are; only names are renamed.
+        parts = _QUOTED.split(match.group(0))
+        for index in range(0, len(parts), 2):
+            parts[index] = _AUTO_NAME.sub(rename, parts[index])
+        return "".join(parts)
+
+    return _TAG.sub(rename_tag, xml)
+
+
+def canonicalize(xml: str) -> str:
+    """C14N 2.0 form with insignificant whitespace removed.
+
+    Documents that are not well-formed are only whitespace-normalised, so
+    that they still get a stable representation.
+    """
+
+    try:
+        return ET.canonicalize(xml_data=xml.strip(), strip_text=True)
+    except ET.ParseError:
+        return " ".join(xml.split())
+
+
+def canonical_hash(xml: str) -> str:
+    return hashlib.sha256(canonicalize(xml).encode("utf-8")).hexdigest()
@@ -0,0 +1,92 @@
+"""Time the auto-layout engine on synthetic processes.
+
+Usage: python benchmarks/bench_layout.py [--sizes 100 300 1000] [--repeat 3]
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.layout import apply_layout, compute_layout
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+
+def random_process(size: int, seed: int) -> Tuple[Dict[str, str], List[Tuple[str, str, str]]]:
+    """Chains of tasks with XOR split/joins and occasional loops back."""
+
+    rng = random.Random(seed)
+    nodes: Dict[str, str] = {"n0": "startEvent"}
+    flows: List[Tuple[str, str, str]] = []
+
+    def add(kind: str) -> str:
+        node_id = f"n{len(nodes)}"
+        nodes[node_id] = kind
+        return node_id
+
+    def connect(source: str, target: str) -> None:
+        flows.append((f"f{len(flows)}", source, target))
+
+    current = "n0"
+    while len(nodes) < size - 1:
+        if rng.random() < 0.2:
+            split = add("exclusiveGateway")
+            join = add("exclusiveGateway")
+            connect(current, split)
+            for _ in range(rng.randint(2, 4)):
+                previous = split
+                for _ in range(rng.randint(1, 3)):
+                    task = add("task")
+                    connect(previous, task)
+                    previous = task
+                connect(previous, join)
+            if rng.random() < 0.3:
+                connect(join, split)
+            current = join
+        else:
+            task = add("task")
+            connect(current, task)
+            current = task
+    connect(current, add("endEvent"))
+    return nodes, flows
+
+
+def to_xml(nodes: Dict[str, str], flows: List[Tuple[str, str, str]]) -> str:
+    body = "".join(f'<bpmn:{kind} id="{node_id}"/>' for node_id, kind in nodes.items())
+    body += "".join(f'<bpmn:sequenceFlow id="{f}" sourceRef="{s}" targetRef="{t}"/>' for f, s, t in flows)
+    return (
+        f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}" id="D">'
+        f'<bpmn:process id="P" isExecutable="false">{body}</bpmn:process></bpmn:definitions>'
+    )
+
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>6} {'flows':>6} {'compute_layout ms':>18} {'apply_layout ms':>16}")
+    for size in args.sizes:
+        nodes, flows = random_process(size, seed=size)
+        xml = to_xml(nodes, flows)
+        compute_ms = best_of(args.repeat, lambda: compute_layout(nodes, flows))
+        apply_ms = best_of(args.repeat, lambda: apply_layout(xml))
+        print(f"{len(nodes):>6} {len(flows):>6} {compute_ms:>18.1f} {apply_ms:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
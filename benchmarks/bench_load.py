@@ -0,0 +1,204 @@
+"""Load test of ``/generate-bpmn`` against local GigaChat and validator fakes.
+
+The fakes (see ``fake_upstreams.py``) run in a child process; the service
+runs in this process with its real lifespan and is driven in-process over
+ASGI at the requested concurrency. Service settings can be changed through
+the usual environment variables.
+
+Usage: python benchmarks/bench_load.py [--requests 200] [--concurrency 16]
+       [--streaming] [--output results.json] [--llm-latency-ms 800 ...]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+sys.path.append(str(ROOT / "benchmarks"))
+import fake_upstreams  # noqa: E402
+
+_LAG_INTERVAL_SEC = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"fake upstream did not start on port {port}")
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Nearest-rank p50/p95/p99 plus mean and max, rounded to 0.1."""
+
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": round(rank(0.50), 1),
+        "p95": round(rank(0.95), 1),
+        "p99": round(rank(0.99), 1),
+        "mean": round(sum(ordered) / len(ordered), 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+async def _monitor_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Measure how late the loop wakes a sleeper: a direct read of event-loop blocking."""
+
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + _LAG_INTERVAL_SEC
+        await asyncio.sleep(_LAG_INTERVAL_SEC)
+        samples.append(max(0.0, (loop.time() - expected) * 1000))
+
+
+async def drive(app, args: argparse.Namespace) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    attempts: Counter = Counter()
+    lag: List[float] = []
+    counter = iter(range(args.requests))
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=None
+    ) as client:
+
+        async def worker() -> None:
+            for index in counter:
+                payload = {
+                    # Unique texts so that the result cache does not answer.
+                    "text": f"Заявка {index}: сотрудник подает заявку, руководитель согласует, бухгалтерия оплачивает",
+                    "process_name": f"Bench {index}",
+                    "mode": args.mode,
+                }
+                started = time.perf_counter()
+                response = await client.post("/generate-bpmn", json=payload)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] += 1
+                if response.status_code in (200, 422):
+                    attempts[response.json().get("attempts_used")] += 1
+
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(_monitor_lag(lag, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        stats = (await client.get("/stats")).json()
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "validated_ratio": round(statuses[200] / args.requests, 3),
+        "attempts_used": {str(count): number for count, number in sorted(attempts.items())},
+        "event_loop_lag_ms": percentiles(lag),
+        "service_stats": stats,
+    }
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configure_service(args: argparse.Namespace, gigachat_port: int, validator_port: int, workdir: str) -> None:
+    base = f"http://127.0.0.1:{gigachat_port}"
+    env = {
+        "GIGACHAT_API_URL": f"{base}/api/v1",
+        "GIGACHAT_AUTH_URL": f"{base}/oauth",
+        "GIGACHAT_CREDENTIALS": "bench",
+        "VALIDATOR_URL": f"http://127.0.0.1:{validator_port}/validate",
+        "GIGACHAT_STREAMING": "true" if args.streaming else "false",
+        "JOBS_SQLITE_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "LOG_LEVEL": "WARNING",
+        "ADMISSION_MAX_IN_FLIGHT": str(max(args.concurrency, 32)),
+    }
+    # Upstream locations always point at the fakes; everything else only
+    # when not set by the caller.
+    for name, value in env.items():
+        if name.startswith(("GIGACHAT_API", "GIGACHAT_AUTH", "VALIDATOR_URL")):
+            os.environ[name] = value
+        else:
+            os.environ.setdefault(name, value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mode", default="full")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args()
+
+    fake_config = fake_upstreams.config_from_args(args)
+    gigachat_port, validator_port = _free_port(), _free_port()
+    fakes = multiprocessing.Process(
+        target=fake_upstreams.run, args=(fake_config, gigachat_port, validator_port), daemon=True
+    )
+    fakes.start()
+    try:
+        _wait_for_port(gigachat_port)
+        _wait_for_port(validator_port)
+        with tempfile.TemporaryDirectory() as workdir:
+            _configure_service(args, gigachat_port, validator_port, workdir)
+            from app.main import app
+
+            results = asyncio.run(drive(app, args))
+    finally:
+        fakes.terminate()
+        fakes.join()
+
+    report = {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "mode": args.mode,
+        "streaming": args.streaming,
+        "fakes": fake_config.dict(),
+        **results,
+    }
+    print(json.dumps({key: value for key, value in report.items() if key != "service_stats"}, indent=2))
+    if args.output:
+        pathlib.Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
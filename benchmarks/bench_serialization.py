@@ -0,0 +1,58 @@
+"""Compare response encodings of large generated diagrams.
+
+For each size the success body is encoded as the stdlib ``JSONResponse``
+would, with the fast JSON encoder and as raw XML; the client-side decode
+time and the payload size are reported too.
+
+Usage: python benchmarks/bench_serialization.py [--sizes 100 1000 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+sys.path.append(str(pathlib.Path(__file__).resolve().parent))
+from bench_layout import best_of, random_process, to_xml  # noqa: E402
+
+from app.layout import apply_layout  # noqa: E402
+from app.json_encoding import encode_json, orjson  # noqa: E402
+
+
+def stdlib_json(content: dict) -> bytes:
+    # What starlette's JSONResponse.render does.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"fast JSON encoder: {'orjson' if orjson is not None else 'stdlib (orjson not installed)'}")
+    header = (
+        f"{'nodes':>6} {'xml KB':>8} {'json KB':>8} {'stdlib ms':>10} {'fast ms':>8} "
+        f"{'raw xml ms':>10} {'json decode ms':>15}"
+    )
+    print(header)
+    for size in args.sizes:
+        nodes, flows = random_process(size, seed=size)
+        # Russian labels and DI make the document look like real output.
+        xml = apply_layout(to_xml(nodes, flows)).replace('"/>', '" name="Согласование заявки"/>', size)
+        body = {"validated": True, "attempts_used": 1, "bpmn_xml": xml}
+
+        encoded = stdlib_json(body)
+        stdlib_ms = best_of(args.repeat, lambda: stdlib_json(body))
+        fast_ms = best_of(args.repeat, lambda: encode_json(body))
+        raw_ms = best_of(args.repeat, lambda: xml.encode("utf-8"))
+        decode_ms = best_of(args.repeat, lambda: json.loads(encoded))
+        print(
+            f"{len(nodes):>6} {len(xml.encode('utf-8')) / 1024:>8.1f} {len(encoded) / 1024:>8.1f} "
+            f"{stdlib_ms:>10.2f} {fast_ms:>8.2f} {raw_ms:>10.2f} {decode_ms:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Local stand-ins for GigaChat (OAuth + ``/chat/completions``, JSON and SSE)
+and the validator, with configurable latency and failure behaviour.
+
+Usage: python benchmarks/fake_upstreams.py [--gigachat-port 8801] [--validator-port 8802]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import AsyncIterator, Dict
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+DOCUMENT = """<?xml version="1.0" encoding="UTF-8"?>
+<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" xmlns:dc="http://www.omg.org/spec/DD/20100524/DC" xmlns:di="http://www.omg.org/spec/DD/20100524/DI" id="Definitions_{nonce}">
+  <bpmn:process id="Process_1" name="Bench" isExecutable="false">
+    <bpmn:startEvent id="StartEvent_1" name="Start" />
+    <bpmn:task id="Task_1" name="Do" />
+    <bpmn:endEvent id="EndEvent_1" name="End" />
+    <bpmn:sequenceFlow id="Flow_1" sourceRef="StartEvent_1" targetRef="Task_1" />
+    <bpmn:sequenceFlow id="Flow_2" sourceRef="Task_1" targetRef="EndEvent_1" />
+  </bpmn:process>
+  <bpmndi:BPMNDiagram id="BPMNDiagram_1">
+    <bpmndi:BPMNPlane id="BPMNPlane_1" bpmnElement="Process_1">
+      <bpmndi:BPMNShape id="Shape_Start" bpmnElement="StartEvent_1"><dc:Bounds x="100" y="100" width="36" height="36" /></bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="Shape_Task" bpmnElement="Task_1"><dc:Bounds x="170" y="90" width="100" height="60" /></bpmndi:BPMNShape>
+      <bpmndi:BPMNShape id="Shape_End" bpmnElement="EndEvent_1"><dc:Bounds x="310" y="100" width="36" height="36" /></bpmndi:BPMNShape>
+      <bpmndi:BPMNEdge id="Edge_1" bpmnElement="Flow_1"><di:waypoint x="136" y="118" /><di:waypoint x="170" y="120" /></bpmndi:BPMNEdge>
+      <bpmndi:BPMNEdge id="Edge_2" bpmnElement="Flow_2"><di:waypoint x="270" y="120" /><di:waypoint x="310" y="118" /></bpmndi:BPMNEdge>
+    </bpmndi:BPMNPlane>
+  </bpmndi:BPMNDiagram>
+</bpmn:definitions>
+"""
+
+
+DEFAULTS: Dict[str, float] = {
+    # Median latency in milliseconds and the sigma of its log-normal spread.
+    "llm_latency_ms": 800.0,
+    "llm_latency_sigma": 0.5,
+    "llm_error_rate": 0.0,
+    "llm_429_rate": 0.0,
+    "llm_retry_after_sec": 0.5,
+    # Share of completions that are not well-formed XML.
+    "invalid_xml_ratio": 0.1,
+    "sse_chunks": 20,
+    "token_latency_ms": 50.0,
+    "validator_latency_ms": 60.0,
+    "validator_latency_sigma": 0.3,
+    "validator_error_rate": 0.0,
+    # Share of well-formed documents the validator reports an error for.
+    "validator_reject_ratio": 0.1,
+    "seed": 0,
+}
+
+
+class FakeConfig:
+    """Behaviour of the fakes; any key of :data:`DEFAULTS` can be overridden."""
+
+    def __init__(self, **overrides: float):
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"unknown fake settings: {sorted(unknown)}")
+        for name, default in DEFAULTS.items():
+            setattr(self, name, type(default)(overrides.get(name, default)))
+
+    def dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in DEFAULTS}
+
+
+def _latency(rng: random.Random, median_ms: float, sigma: float) -> float:
+    return median_ms / 1000.0 * math.exp(rng.gauss(0.0, sigma))
+
+
+def _completion(rng: random.Random, config: FakeConfig) -> str:
+    document = DOCUMENT.format(nonce=uuid.uuid4().hex[:12])
+    if rng.random() < config.invalid_xml_ratio:
+        # Cut off mid-document, as a model running out of tokens would.
+        return document[: len(document) // 2]
+    return document
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = len(prompt) // 3 + 1
+    completion_tokens = len(completion) // 3 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def gigachat_app(config: FakeConfig) -> Starlette:
+    rng = random.Random(config.seed)
+
+    async def oauth(request: Request) -> Response:
+        await asyncio.sleep(config.token_latency_ms / 1000.0)
+        expires_at = int((time.time() + 1800) * 1000)
+        return JSONResponse({"access_token": uuid.uuid4().hex, "expires_at": expires_at})
+
+    async def completions(request: Request) -> Response:
+        payload = await request.json()
+        latency = _latency(rng, config.llm_latency_ms, config.llm_latency_sigma)
+        draw = rng.random()
+        if draw < config.llm_429_rate:
+            return JSONResponse(
+                {"message": "too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(config.llm_retry_after_sec)},
+            )
+        if draw < config.llm_429_rate + config.llm_error_rate:
+            await asyncio.sleep(latency / 10)
+            return JSONResponse({"message": "internal error"}, status_code=500)
+
+        prompt = "".join(message.get("content") or "" for message in payload.get("messages", []))
+        content = _completion(rng, config)
+        usage = _usage(prompt, content)
+        if not payload.get("stream"):
+            await asyncio.sleep(latency)
+            return JSONResponse({"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage})
+
+        async def events() -> AsyncIterator[bytes]:
+            size = max(1, len(content) // config.sse_chunks)
+            for start in range(0, len(content), size):
+                await asyncio.sleep(latency / config.sse_chunks)
+                chunk = {"choices": [{"delta": {"content": content[start:start + size]}}]}
+                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+            yield f"data: {json.dumps({'choices': [{'delta': {}}], 'usage': usage})}\n\n".encode("utf-8")
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/oauth", oauth, methods=["POST"]),
+        Route("/api/v1/chat/completions", completions, methods=["POST"]),
+    ])
+
+
+def validator_app(config: FakeConfig) -> Starlette:
+    rng = random.Random(config.seed + 1)
+
+    async def validate(request: Request) -> Response:
+        await request.body()
+        await asyncio.sleep(_latency(rng, config.validator_latency_ms, config.validator_latency_sigma))
+        draw = rng.random()
+        if draw < config.validator_error_rate:
+            return JSONResponse({"message": "internal error"}, status_code=500)
+        if draw < config.validator_error_rate + config.validator_reject_ratio:
+            return JSONResponse({"errors": [{"id": "Task_1", "message": "Task has no label", "rule": "label-required"}]})
+        return JSONResponse({"errors": [], "warnings": []})
+
+    return Starlette(routes=[Route("/validate", validate, methods=["POST"])])
+
+
+async def serve(config: FakeConfig, gigachat_port: int, validator_port: int) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(gigachat_app(config), port=gigachat_port, log_level="warning", lifespan="off")),
+        uvicorn.Server(uvicorn.Config(validator_app(config), port=validator_port, log_level="warning", lifespan="off")),
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def run(config: FakeConfig, gigachat_port: int, validator_port: int) -> None:
+    """Process entry point used by the load test."""
+
+    asyncio.run(serve(config, gigachat_port, validator_port))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    for name, value in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(**{name: getattr(args, name) for name in DEFAULTS})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--gigachat-port", type=int, default=8801)
+    parser.add_argument("--validator-port", type=int, default=8802)
+    add_arguments(parser)
+    args = parser.parse_args()
+    run(config_from_args(args), args.gigachat_port, args.validator_port)
+
+
+if __name__ == "__main__":
+    main()
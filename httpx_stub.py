@@ -6,6 +6,10 @@ class HTTPError(Exception):
     pass
 
 
+class TransportError(HTTPError):
+    pass
+
+
 class HTTPStatusError(HTTPError):
     def __init__(self, message: str, request=None, response=None):
         super().__init__(message)
@@ -14,10 +18,17 @@ class HTTPStatusError(HTTPError):
 
 
 class Response:
-    def __init__(self, status_code: int = 200, json: Dict[str, Any] | None = None, content: bytes | None = None):
+    def __init__(
+        self,
+        status_code: int = 200,
+        json: Dict[str, Any] | None = None,
+        content: bytes | None = None,
+        headers: Dict[str, str] | None = None,
+    ):
         self.status_code = status_code
         self._json = json
         self.content = content
+        self.headers = headers or {}
 
     def json(self) -> Dict[str, Any]:
         if self._json is None:
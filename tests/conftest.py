@@ -0,0 +1,61 @@
+import asyncio
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.models import ValidationReport
+
+
+class FakeValidator:
+    """Stand-in for the remote validator.
+
+    A document containing ``broken`` has no end event, one containing
+    ``errors=N`` reports ``N`` issues; anything else is valid.
+    """
+
+    async def validate(self, xml):
+        if "broken" in xml:
+            return ValidationReport(errors=[{"message": "no end", "rule": "end-event-required"}])
+        if "errors=" in xml:
+            count = int(xml.split("errors=")[1].split(" ")[0])
+            return ValidationReport(errors=[{"message": f"issue {i}"} for i in range(count)])
+        return ValidationReport()
+
+
+@pytest.fixture
+def validator():
+    return FakeValidator()
+
+
+class FakeClock:
+    """Manual clock; ``sleep`` advances it instead of waiting."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        await asyncio.sleep(0)
+        self.now += seconds
+
+
+class FakeGigaChat:
+    """Just enough of :class:`GigaChatClient` for the cache keys."""
+
+    model = "GigaChat"
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def gigachat():
+    return FakeGigaChat()
@@ -0,0 +1,106 @@
+import asyncio
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from fastapi import HTTPException
+
+from app.admission import AdmissionController, AdmissionRejected
+from app.config import get_settings
+from app.main import app, generate_bpmn
+from app.models import GenerateRequest
+
+
+def test_requests_queue_then_get_shed_when_the_queue_is_full():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, max_queue_time=1.0)
+        release = asyncio.Event()
+        order = []
+
+        async def job(name):
+            async with controller.admit():
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(job("first"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(job("second"))
+        await asyncio.sleep(0)
+        assert controller.stats()["in_flight"] == 1 and controller.queued == 1
+
+        with pytest.raises(AdmissionRejected) as exc:
+            await job("third")
+        assert exc.value.reason == "queue_full"
+
+        release.set()
+        await asyncio.gather(first, second)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["first", "second"]
+    assert stats["in_flight"] == 0 and stats["queued"] == 0
+    assert stats["shed"] == {"queue_full": 1, "queue_timeout": 0}
+
+
+def test_waiting_longer_than_max_queue_time_is_shed():
+    async def run():
+        controller = AdmissionController(max_in_flight=1, max_queue=5, max_queue_time=0.01)
+        async with controller.admit():
+            with pytest.raises(AdmissionRejected) as exc:
+                async with controller.admit():
+                    pass
+        return exc.value, controller
+
+    rejection, controller = asyncio.run(run())
+    assert rejection.reason == "queue_timeout"
+    assert rejection.retry_after >= 1
+    assert controller.queued == 0 and controller.in_flight == 0
+
+
+def test_adaptive_limit_backs_off_on_slow_or_failing_generations():
+    now = [0.0]
+    controller = AdmissionController(
+        max_in_flight=10, max_queue=0, max_queue_time=1.0,
+        adaptive=True, min_in_flight=2, target_latency=5.0, clock=lambda: now[0],
+    )
+
+    async def generation(duration, fail=False):
+        async with controller.admit():
+            now[0] += duration
+            if fail:
+                raise RuntimeError("upstream down")
+
+    async def run():
+        for _ in range(5):
+            await generation(10.0)
+        slow_limit = controller.limit
+        with pytest.raises(RuntimeError):
+            await generation(1.0, fail=True)
+        for _ in range(60):
+            await generation(1.0)
+        return slow_limit
+
+    slow_limit = asyncio.run(run())
+    assert slow_limit == 5
+    assert controller.limit == 10
+
+
+def test_handler_answers_503_with_retry_after(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("GIGACHAT_TOKEN", "token")
+
+    async def run():
+        app.state.admission = AdmissionController(max_in_flight=1, max_queue=0, max_queue_time=1.0)
+        try:
+            async with app.state.admission.admit():
+                await generate_bpmn(request=GenerateRequest(text="x"), settings=get_settings())
+        finally:
+            app.state.admission = None
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(run())
+    assert exc.value.status_code == 503
+    assert exc.value.headers == {"Retry-After": "1"}
+    get_settings.cache_clear()
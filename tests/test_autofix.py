@@ -0,0 +1,144 @@
+import asyncio
+import pathlib
+import sys
+from xml.etree import ElementTree as ET
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.autofix import auto_fix
+from app.models import GenerateRequest, ValidationIssue, ValidationReport
+from app.prevalidator import PreValidator, prevalidate
+from app.service import GenerationService
+from app.xml_utils import serialize_document
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+SEMANTIC_ONLY = f"""```xml
+<bpmn:definitions xmlns:bpmn="{BPMN_NS}" id="Defs">
+  <bpmn:process id="Process_1">
+    <bpmn:startEvent id="Start"/>
+    <bpmn:task id="Task"/>
+    <bpmn:task id="Extra"/>
+    <bpmn:task id="Extra"/>
+    <bpmn:endEvent id="End"/>
+    <bpmn:sequenceFlow id="Flow_1" sourceRef="Start" targetRef="Task"/>
+    <bpmn:sequenceFlow id="Flow_2" sourceRef="Task" targetRef="End"/>
+    <bpmn:sequenceFlow id="Flow_3" sourceRef="Task" targetRef="Nowhere"/>
+  </bpmn:process>
+</bpmn:definitions>
+```"""
+
+
+def test_mechanical_issues_are_fixed_without_llm():
+    xml = SEMANTIC_ONLY.strip("`xml\n")
+    fixed = xml
+    for _ in range(3):
+        report = prevalidate(fixed)
+        fixed, applied = auto_fix(fixed, report.errors + report.warnings)
+
+    assert prevalidate(fixed).errors == []
+    assert prevalidate(fixed).warnings == []
+    assert 'isExecutable="false"' in fixed
+    assert 'id="Extra_2"' in fixed
+    assert "Flow_3" not in fixed
+
+
+def test_unprefixed_document_in_fences_is_qualified():
+    xml = (
+        "Here is the diagram:\n```xml\n<definitions><process id=\"P\" isExecutable=\"false\">"
+        "<startEvent id=\"S\"/></process></definitions>\n```"
+    )
+
+    fixed, applied = auto_fix(xml, [ValidationIssue(message="Invalid XML format", rule="xml-format")])
+
+    assert applied == ["namespaces"]
+    assert fixed.startswith('<?xml version="1.0" encoding="UTF-8"?>\n<bpmn:definitions')
+    assert "<bpmn:startEvent" in fixed
+
+
+def test_undeclared_prefix_is_declared():
+    xml = '<bpmn:definitions id="D"><bpmn:process id="P"/></bpmn:definitions>'
+
+    fixed, applied = auto_fix(xml, prevalidate(xml).errors)
+
+    assert applied == ["namespaces"]
+    assert f'xmlns:bpmn="{BPMN_NS}"' in fixed
+
+
+def test_missing_executable_flag_is_only_a_warning():
+    xml = (
+        f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}"><bpmn:process id="P">'
+        '<bpmn:startEvent id="S"/><bpmn:endEvent id="E"/></bpmn:process></bpmn:definitions>'
+    )
+
+    report = prevalidate(xml)
+
+    assert [issue.rule for issue in report.warnings] == ["process-executable-missing"]
+    assert all(issue.rule != "process-executable-missing" for issue in report.errors)
+
+
+def test_remote_rule_ids_are_fixed():
+    xml = SEMANTIC_ONLY.strip("`xml\n")
+    issue = ValidationIssue(message="Element is missing bpmndi", rule="bpmnlint:no-bpmndi")
+
+    fixed, applied = auto_fix(xml, [issue, ValidationIssue(message="duplicate", rule="bpmnlint:unique-ids")])
+
+    assert applied == ["unique-ids", "di-shape-missing", "di-edge-missing"]
+    assert 'bpmnElement="Extra_2"' in fixed
+    assert '<dc:Bounds x="150" y="102" width="36" height="36"' in fixed
+
+
+def test_document_prefixes_are_kept_without_touching_the_global_registry():
+    registry = dict(ET._namespace_map)
+    xml = (
+        f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}" xmlns:camunda="http://camunda.org/schema/1.0/bpmn">'
+        '<bpmn:process id="P" isExecutable="false" camunda:versionTag="v ns0:1"><bpmn:startEvent id="S"/>'
+        '<bpmn:startEvent id="S"/></bpmn:process></bpmn:definitions>'
+    )
+
+    fixed, applied = auto_fix(xml, [ValidationIssue(message="Duplicate id", rule="unique-ids")])
+
+    assert applied == ["unique-ids"]
+    assert 'xmlns:camunda="http://camunda.org/schema/1.0/bpmn"' in fixed
+    assert 'camunda:versionTag="v ns0:1"' in fixed
+    assert ET._namespace_map == registry
+    other = '<a xmlns:x="http://camunda.org/schema/1.0/bpmn"><x:b/></a>'
+    assert "<camunda:b" not in serialize_document(ET.fromstring(other))
+
+
+def test_referenced_duplicate_ids_are_left_to_the_llm():
+    xml = (
+        f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}"><bpmn:process id="P" isExecutable="false">'
+        '<bpmn:startEvent id="Start"/><bpmn:task id="Task"/><bpmn:task id="Task"/><bpmn:endEvent id="End"/>'
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="Start" targetRef="Task"/>'
+        '<bpmn:sequenceFlow id="Flow_2" sourceRef="Task" targetRef="End"/>'
+        "</bpmn:process></bpmn:definitions>"
+    )
+
+    assert auto_fix(xml, [ValidationIssue(message="Duplicate id", rule="unique-ids")]) == (xml, [])
+
+
+def test_unknown_rules_are_left_to_the_llm():
+    xml = "<bpmn/>"
+    assert auto_fix(xml, [ValidationIssue(message="label required", rule="label-required")]) == (xml, [])
+
+
+def test_service_fixes_locally_before_spending_an_attempt():
+    calls = {"llm": 0, "validator": 0}
+
+    class Validator:
+        async def validate(self, xml):
+            calls["validator"] += 1
+            return ValidationReport()
+
+    async def llm(prompt, temperature, repair):
+        calls["llm"] += 1
+        return SEMANTIC_ONLY.strip("`xml\n")
+
+    service = GenerationService(None, Validator(), prevalidator=PreValidator(), auto_fix=True)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 3))
+
+    assert result["validated"] is True
+    assert result["attempts_used"] == 1
+    assert calls == {"llm": 1, "validator": 1}
+    assert "di-shape-missing" in result["debug"]["attempts"][0]["auto_fixes"]
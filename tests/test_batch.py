@@ -0,0 +1,84 @@
+import asyncio
+import json
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.gigachat import GigaChatClient
+from app.main import generate_bpmn_batch
+from app.models import GenerateRequest, ValidationReport
+from app.service import GenerationService
+from app.validator_client import ValidatorClient
+
+
+@pytest.fixture(autouse=True)
+def reset_settings(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("GIGACHAT_API_URL", "http://gigachat")
+    monkeypatch.setenv("GIGACHAT_TOKEN", "token")
+    monkeypatch.setenv("VALIDATOR_URL", "http://validator/validate")
+    monkeypatch.setenv("PREVALIDATION_ENABLED", "false")
+    monkeypatch.setenv("RESULT_CACHE_ENABLED", "false")
+    yield
+    get_settings.cache_clear()
+
+
+async def collect(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+def test_batch_streams_items_in_completion_order(monkeypatch):
+    async def llm(self, prompt, temperature, repair):
+        delay = 0.05 if "slow" in prompt else 0.0
+        await asyncio.sleep(delay)
+        return '<bpmn:definitions id="D"/>'
+
+    async def validate(self, xml):
+        return ValidationReport()
+
+    monkeypatch.setattr(GenerationService, "_call_llm", llm)
+    monkeypatch.setattr(ValidatorClient, "validate", validate)
+    monkeypatch.setenv("MAX_TEXT_LEN", "10")
+    requests = [
+        GenerateRequest(text="slow"),
+        GenerateRequest(text="fast"),
+        GenerateRequest(text="far too long text"),
+    ]
+
+    lines = asyncio.run(collect(asyncio.run(generate_bpmn_batch(requests, settings=get_settings()))))
+
+    assert [line["index"] for line in lines] == [2, 1, 0]
+    assert [line["status"] for line in lines] == [400, 200, 200]
+    assert lines[1]["validated"] is True
+
+
+def test_batch_size_is_bounded(monkeypatch):
+    monkeypatch.setenv("BATCH_MAX_ITEMS", "1")
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(generate_bpmn_batch([GenerateRequest(text="a"), GenerateRequest(text="b")], settings=get_settings()))
+    assert exc.value.status_code == 400
+
+
+def test_gigachat_calls_respect_the_concurrency_limit():
+    client = GigaChatClient("http://gigachat", "", "", "", "model", token="t", max_concurrency=2)
+    in_flight = {"now": 0, "max": 0}
+
+    async def post(payload):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return "<xml/>"
+
+    client._post_completion = post
+
+    async def run():
+        await asyncio.gather(*(client.generate_bpmn("p", 0.2) for _ in range(6)))
+
+    asyncio.run(run())
+    assert in_flight["max"] == 2
@@ -0,0 +1,87 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.cache import ResultCache, TTLCache, result_cache_key
+from app.models import GenerateRequest, ValidationReport
+from app.service import GenerationService
+
+
+def test_ttl_cache_evicts_lru_and_expired_entries(clock):
+    cache = TTLCache(max_entries=2, ttl=10.0, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    clock.now += 11
+    assert cache.get("a") is None
+
+
+def test_cache_key_ignores_whitespace_but_not_parameters():
+    base = result_cache_key(GenerateRequest(text="Оформить  заявку\n"), "GigaChat")
+
+    assert base == result_cache_key(GenerateRequest(text=" Оформить заявку"), "GigaChat")
+    assert base != result_cache_key(GenerateRequest(text="Оформить заявку", language="en"), "GigaChat")
+    assert base != result_cache_key(GenerateRequest(text="Оформить заявку"), "GigaChat-Pro")
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        first = ResultCache(sqlite_path=path)
+        await first.set("key", {"bpmn_xml": "<xml/>"})
+        first.close()
+        second = ResultCache(sqlite_path=path)
+        try:
+            return await second.get("key"), second.stats()
+        finally:
+            second.close()
+
+    value, stats = asyncio.run(run())
+
+    assert value == {"bpmn_xml": "<xml/>"}
+    assert stats["hits"] == 1
+
+
+def test_service_serves_repeated_request_from_cache(monkeypatch, gigachat):
+    calls = {"llm": 0}
+
+    async def fake_generate(self, request, max_attempts):
+        calls["llm"] += 1
+        return {"validated": True, "attempts_used": 2, "bpmn_xml": "<bpmn/>"}
+
+    monkeypatch.setattr(GenerationService, "_generate", fake_generate)
+    service = GenerationService(gigachat, validator=None, result_cache=ResultCache())
+    request = GenerateRequest(text="Процесс", process_name="P")
+
+    async def run():
+        first = await service.generate(request, 3)
+        second = await service.generate(request, 3)
+        bypassed = await service.generate(GenerateRequest(text="Процесс", process_name="P", bypass_cache=True), 3)
+        return first, second, bypassed
+
+    first, second, bypassed = asyncio.run(run())
+
+    assert first["attempts_used"] == 2
+    assert second == {"validated": True, "attempts_used": 0, "bpmn_xml": "<bpmn/>"}
+    assert bypassed["attempts_used"] == 2
+    assert calls["llm"] == 2
+    assert service.stats()["result_cache"]["hits"] == 1
+
+
+def test_failed_results_are_not_cached(monkeypatch, gigachat):
+    async def fake_generate(self, request, max_attempts):
+        return {"validated": False, "attempts_used": 1, "last_validation_report": ValidationReport().dict()}
+
+    monkeypatch.setattr(GenerationService, "_generate", fake_generate)
+    cache = ResultCache()
+    service = GenerationService(gigachat, validator=None, result_cache=cache)
+
+    asyncio.run(service.generate(GenerateRequest(text="Процесс"), 1))
+
+    assert cache.stats()["size"] == 0
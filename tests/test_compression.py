@@ -0,0 +1,123 @@
+import asyncio
+import gzip
+import pathlib
+import sys
+import zlib
+
+import httpx
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+import app.validator_client as validator_client
+import httpx_stub
+from app.compression import CompressionMiddleware, compress_chunks, negotiate
+
+
+def run_app(app, accept_encoding="gzip", minimum_size=16):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size, encodings=["gzip"])(scope, None, send))
+    return dict(sent[0]["headers"]), [message["body"] for message in sent[1:]]
+
+
+def body_app(*chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+
+    return app
+
+
+def test_negotiate_honours_q_values():
+    assert negotiate("gzip, zstd", ["zstd", "gzip"]) == "zstd"
+    assert negotiate("gzip;q=1, zstd;q=0.5", ["zstd", "gzip"]) == "gzip"
+    assert negotiate("gzip;q=0, *;q=0.1", ["gzip"]) is None
+    assert negotiate("*", ["gzip"]) == "gzip"
+    assert negotiate("br", ["gzip"]) is None
+    assert negotiate(None, ["gzip"]) is None
+
+
+def test_middleware_compresses_large_bodies_only():
+    payload = b'{"bpmn_xml":"' + b"<task/>" * 100 + b'"}'
+    headers, bodies = run_app(body_app(payload))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(bodies[0])
+    assert gzip.decompress(bodies[0]) == payload
+
+    headers, bodies = run_app(body_app(b"{}"))
+    assert b"content-encoding" not in headers
+    assert bodies == [b"{}"]
+
+    headers, bodies = run_app(body_app(payload), accept_encoding="identity")
+    assert b"content-encoding" not in headers
+
+    headers, bodies = run_app(body_app(b"data: x\n\n" * 10, content_type=b"text/event-stream"))
+    assert b"content-encoding" not in headers
+
+
+def test_middleware_flushes_every_streamed_chunk():
+    lines = [b'{"index":%d,"validated":true}\n' % index for index in range(3)]
+    headers, bodies = run_app(body_app(*lines, b""))
+
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    decoder = zlib.decompressobj(31)
+    # Each chunk decodes to its line as soon as it arrives.
+    assert [decoder.decompress(body) for body in bodies[:3]] == lines
+    decoder.decompress(bodies[3])
+    assert decoder.eof
+
+
+def test_validator_upload_falls_back_when_compression_is_rejected(monkeypatch):
+    monkeypatch.setattr(validator_client, "httpx", httpx_stub)
+    uploads = []
+
+    class DummyAsyncClient(httpx_stub.AsyncClient):
+        async def post(self, url, headers=None, content=None, **kwargs):
+            if not isinstance(content, bytes):
+                content = b"".join([chunk async for chunk in content])
+            uploads.append((headers.get("Content-Encoding"), content))
+            if "Content-Encoding" in headers:
+                return httpx_stub.Response(status_code=415, json={"detail": "unsupported"})
+            return httpx_stub.Response(status_code=200, json={"issues": []})
+
+    monkeypatch.setattr(httpx_stub, "AsyncClient", DummyAsyncClient)
+    xml = "<definitions>" + "<task name='Проверка'/>" * 100 + "</definitions>"
+    client = validator_client.ValidatorClient("http://validator", compression="gzip", compression_min_bytes=64)
+
+    report = asyncio.run(client.validate(xml))
+
+    assert report.errors == []
+    assert [encoding for encoding, _ in uploads] == ["gzip", None]
+    assert gzip.decompress(uploads[0][1]).decode("utf-8") == xml
+    assert uploads[1][1] == xml.encode("utf-8")
+    assert client.compression == ""
+
+
+def test_validator_upload_is_streamed_in_compressed_chunks():
+    xml = "<definitions>" + "<task name='Проверка'/>" * 20000 + "</definitions>"
+    received = {}
+
+    def handler(request):
+        received["headers"] = request.headers
+        received["xml"] = gzip.decompress(request.read()).decode("utf-8")
+        return httpx.Response(200, json={"issues": []})
+
+    async def run():
+        chunks = [chunk async for chunk in compress_chunks(xml, "gzip")]
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = validator_client.ValidatorClient("http://validator", http_client=http, compression="gzip")
+        return chunks, await client.validate(xml)
+
+    chunks, report = asyncio.run(run())
+
+    assert len(chunks) > 1
+    assert report.errors == []
+    assert received["headers"]["content-encoding"] == "gzip"
+    assert received["headers"]["transfer-encoding"] == "chunked"
+    assert received["xml"] == xml
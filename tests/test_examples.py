@@ -0,0 +1,125 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.examples import ExampleStore, compact_diagram
+from app.models import GenerateRequest
+from app.service import GenerationService
+
+DIAGRAM = """<?xml version="1.0" encoding="UTF-8"?>
+<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL"
+    xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI">
+  <bpmn:process id="Process_1" name="Отпуск">
+    <bpmn:startEvent id="Start" />
+  </bpmn:process>
+  <bpmndi:BPMNDiagram id="Diagram_1" />
+</bpmn:definitions>
+"""
+
+
+def test_compact_diagram_drops_di_and_whitespace():
+    compact = compact_diagram(DIAGRAM)
+
+    assert compact.startswith("<bpmn:definitions")
+    assert "BPMNDiagram" not in compact
+    assert "> <" not in compact and "\n" not in compact
+
+
+def test_select_ranks_by_similarity_within_k_and_budget():
+    store = ExampleStore(k=2, token_budget=200, min_similarity=0.1)
+
+    async def run():
+        await store.add("Сотрудник подает заявку на отпуск, руководитель согласует", "ru", DIAGRAM)
+        await store.add("Сотрудник подает заявку на командировку", "ru", DIAGRAM)
+        await store.add("Клиент оформляет заказ на складе", "ru", DIAGRAM)
+        await store.add("Employee requests a vacation", "en", DIAGRAM)
+        await store.add("Сотрудник подает заявку " + "очень длинная " * 300, "ru", DIAGRAM)
+
+        return await store.select("Сотрудник подает заявку на отпуск", "ru"), await store.select("Совсем другой текст", "ru")
+
+    selected, unrelated = asyncio.run(run())
+    assert [example.text for _, example in selected] == [
+        "Сотрудник подает заявку на отпуск, руководитель согласует",
+        "Сотрудник подает заявку на командировку",
+    ]
+    assert selected[0][0] > selected[1][0]
+    assert unrelated == []
+    assert len(store) == 4
+
+    # Both examples fit the budget on their own but not together.
+    tight = ExampleStore(k=3, token_budget=selected[0][1].tokens)
+    for _, example in selected:
+        asyncio.run(tight.add(example.text, "ru", DIAGRAM))
+    assert len(tight) == 2
+    assert len(asyncio.run(tight.select("Сотрудник подает заявку на отпуск", "ru"))) == 1
+
+
+def test_store_survives_restart(tmp_path):
+    path = str(tmp_path / "examples.sqlite3")
+
+    async def run():
+        first = ExampleStore(sqlite_path=path)
+        await first.add("Сотрудник подает заявку на отпуск", "ru", DIAGRAM)
+        first.close()
+
+    asyncio.run(run())
+    second = ExampleStore(sqlite_path=path)
+    try:
+        assert len(asyncio.run(second.select("Заявка на отпуск", "ru"))) == 1
+    finally:
+        second.close()
+
+
+def test_initial_prompt_includes_examples_and_usage_is_tracked(validator):
+    prompts = []
+
+    async def llm(prompt, temperature, repair):
+        prompts.append(prompt)
+        return DIAGRAM
+
+    store = ExampleStore()
+    service = GenerationService(None, validator, examples=store)
+    service._call_llm = llm
+
+    async def run():
+        await service.generate(GenerateRequest(text="Сотрудник подает заявку на отпуск", mode="layout"), 3)
+        return await service.generate(
+            GenerateRequest(text="Сотрудник подает заявку на отпуск, бухгалтерия платит", mode="layout", return_debug=True),
+            3,
+        )
+
+    response = asyncio.run(run())
+
+    assert "Примеры" not in prompts[0]
+    assert "Пример 1. Описание: Сотрудник подает заявку на отпуск\n" in prompts[1]
+    assert response["debug"]["attempts"][0]["few_shot_similarity"] == [0.7143]
+    stats = service.stats()["few_shot"]
+    assert stats["with_examples"] == {"generations": 1, "validated": 1, "attempts": 1, "attempts_per_validated": 1.0}
+    assert stats["without_examples"]["generations"] == 1
+    assert stats["size"] == 2
+
+
+def test_full_and_ir_prompts_get_examples_with_a_note(validator):
+    prompts = []
+
+    async def llm(prompt, temperature, repair, stream=None):
+        prompts.append(prompt)
+        return DIAGRAM if "JSON" not in prompt else '{"nodes": [], "flows": []}'
+
+    store = ExampleStore()
+    service = GenerationService(None, validator, examples=store)
+    service._call_llm = llm
+
+    async def run():
+        await store.add("Сотрудник подает заявку на отпуск", "ru", DIAGRAM)
+        await service.generate(GenerateRequest(text="Сотрудник подает заявку на отпуск, бухгалтерия платит"), 3)
+        await service.generate(GenerateRequest(text="Сотрудник подает заявку на отпуск, отдел кадров", mode="ir"), 1)
+
+    asyncio.run(run())
+
+    full, ir = prompts
+    assert "Пример 1. Описание: Сотрудник подает заявку на отпуск\n" in full
+    assert "DI (diagram, plane, shapes, edges) обязателен" in full
+    assert "Пример 1." in ir and "ответ верни в JSON" in ir
+    assert service.stats()["few_shot"]["with_examples"]["generations"] == 2
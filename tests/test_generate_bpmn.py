@@ -161,3 +161,33 @@ def test_reject_large_text(monkeypatch):
     monkeypatch.setenv("MAX_TEXT_LEN", "5")
     response = call_endpoint({"text": "123456"})
     assert response.status_code == 400
+
+
+def test_generate_returns_raw_xml_when_accepted(monkeypatch):
+    from starlette.requests import Request
+
+    from app.responses import prefers_xml
+
+    apply_env(monkeypatch)
+
+    async def llm_ok(self, prompt, temperature, repair):
+        return sample_bpmn("Raw")
+
+    async def validate_ok(self, xml):
+        return ValidationReport(errors=[], warnings=[])
+
+    monkeypatch.setattr(GenerationService, "_call_llm", llm_ok)
+    monkeypatch.setattr(ValidatorClient, "validate", validate_ok)
+
+    http_request = Request({"type": "http", "headers": [(b"accept", b"application/xml, application/json;q=0.5")]})
+    response = asyncio.run(generate_bpmn(
+        request=GenerateRequest(text="Raw process"), settings=get_settings(), http_request=http_request,
+    ))
+
+    assert response.media_type == "application/xml"
+    assert response.headers["x-attempts-used"] == "1"
+    assert response.headers["x-validated"] == "true"
+    assert response.body.decode("utf-8") == sample_bpmn("Raw")
+    assert not prefers_xml("application/json, application/xml")
+    assert not prefers_xml("*/*")
+    assert prefers_xml("text/xml")
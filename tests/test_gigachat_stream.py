@@ -0,0 +1,119 @@
+import asyncio
+import json
+import pathlib
+import sys
+
+import httpx
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.gigachat import GigaChatClient
+from app.models import GenerateRequest, ValidationReport
+from app.service import GenerationService
+from app.xml_stream import BpmnStreamChecker
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+
+def sse_body(chunks):
+    lines = []
+    for chunk in chunks:
+        event = {"choices": [{"delta": {"content": chunk}}]}
+        lines.append(f"data: {json.dumps(event)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+def make_client(chunks):
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=sse_body(chunks), headers={"content-type": "text/event-stream"})
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return GigaChatClient(
+        api_url="http://gigachat",
+        auth_url="",
+        credentials="",
+        scope="",
+        model="GigaChat",
+        token="token",
+        http_client=http_client,
+    )
+
+
+def test_checker_accepts_bpmn_in_small_chunks():
+    document = f'\n<?xml version="1.0"?><bpmn:definitions xmlns:bpmn="{BPMN_NS}"><bpmn:process id="P"/></bpmn:definitions>'
+    checker = BpmnStreamChecker()
+
+    reasons = [checker.feed(document[i:i + 7]) for i in range(0, len(document), 7)]
+
+    assert reasons == [None] * len(reasons)
+    assert checker.complete
+
+
+def test_checker_skips_fence_and_prose_before_the_document():
+    document = f'Конечно! Вот диаграмма:\n```xml\n<bpmn:definitions xmlns:bpmn="{BPMN_NS}"></bpmn:definitions>\n```'
+    checker = BpmnStreamChecker()
+
+    reasons = [checker.feed(document[i:i + 5]) for i in range(0, len(document), 5)]
+
+    assert reasons == [None] * len(reasons)
+    assert checker.complete
+
+
+def test_checker_aborts_on_prose_wrong_root_and_bad_nesting():
+    checker = BpmnStreamChecker()
+    assert checker.feed("Конечно! Вот ваш BPMN") is None
+    assert checker.feed(" и еще немного текста" * 30) is not None
+    assert BpmnStreamChecker().feed("<html><body>") is not None
+    checker = BpmnStreamChecker()
+    assert checker.feed(f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}"><bpmn:process>') is None
+    assert checker.feed("</bpmn:task>") is not None
+
+
+def test_stream_completion_keeps_a_fenced_document():
+    client = make_client(["Sure, here is", " the diagram:\n```xml\n<bpmn:defin", f'itions xmlns:bpmn="{BPMN_NS}"/>', "\n```"])
+
+    completion = asyncio.run(client.stream_bpmn("prompt", 0.2))
+
+    assert not completion.aborted
+    assert completion.xml_complete
+    assert completion.content.endswith("```")
+
+
+def test_stream_completion_aborts_early_on_prose():
+    prose = "I cannot draw diagrams, but here is a description of the process. " * 10
+    client = make_client([prose, prose, "<bpmn:definitions/>"])
+
+    completion = asyncio.run(client.stream_bpmn("prompt", 0.2))
+
+    assert completion.aborted
+    assert completion.content == prose
+    assert completion.ttfb_ms is not None
+    assert completion.abort_ms is not None
+
+
+def test_service_repairs_after_aborted_stream(monkeypatch):
+    outputs = [
+        ["I cannot draw diagrams. " * 30],
+        [f'<bpmn:definitions xmlns:bpmn="{BPMN_NS}">', "</bpmn:definitions>"],
+    ]
+
+    original_stream = GigaChatClient.stream_bpmn
+
+    async def fake_stream(self, prompt, temperature):
+        return await original_stream(make_client(outputs.pop(0)), prompt, temperature)
+
+    async def validate_ok(xml):
+        return ValidationReport()
+
+    monkeypatch.setattr(GigaChatClient, "stream_bpmn", fake_stream)
+    service = GenerationService(make_client([]), validator=None, stream=True)
+    monkeypatch.setattr(service, "_validate", validate_ok)
+
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 2))
+
+    assert result["validated"] is True
+    first, second = result["debug"]["attempts"]
+    assert first["validation_report"]["errors"][0]["rule"] == "stream-aborted"
+    assert first["stream"]["aborted"] is True
+    assert second["stream"]["ttfb_ms"] is not None
@@ -0,0 +1,101 @@
+import asyncio
+import pathlib
+import sys
+import time
+
+import httpx
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app import gigachat
+from app.gigachat import GigaChatClient
+
+
+class SlowAuthClient:
+    def __init__(self, expires_in=1800):
+        self.auth_calls = 0
+        self.expires_in = expires_in
+
+    async def post(self, url, **kwargs):
+        self.auth_calls += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(
+            200,
+            json={"access_token": f"token-{self.auth_calls}", "expires_in": self.expires_in},
+            request=httpx.Request("POST", url),
+        )
+
+
+def make_client(http_client, margin=60.0):
+    return GigaChatClient(
+        api_url="http://gigachat",
+        auth_url="http://auth",
+        credentials="secret",
+        scope="scope",
+        model="GigaChat",
+        http_client=http_client,
+        token_refresh_margin=margin,
+    )
+
+
+def test_concurrent_token_requests_share_one_oauth_call():
+    http_client = SlowAuthClient()
+    client = make_client(http_client)
+
+    async def run():
+        return await asyncio.gather(*(client._get_access_token() for _ in range(20)))
+
+    tokens = asyncio.run(run())
+
+    assert http_client.auth_calls == 1
+    assert set(tokens) == {"token-1"}
+
+
+def test_background_refresher_renews_before_expiry():
+    http_client = SlowAuthClient()
+    client = make_client(http_client, margin=60.0)
+    client._access_token = "old"
+    client._token_expires_at = time.time() + 30
+
+    async def run():
+        client.start_token_refresher()
+        await asyncio.sleep(0.05)
+        await client.stop_token_refresher()
+
+    asyncio.run(run())
+
+    assert http_client.auth_calls == 1
+    assert client._access_token == "token-1"
+    assert client._token_expires_at > time.time() + 60
+
+
+def test_refresher_survives_a_malformed_oauth_response(monkeypatch):
+    class BrokenAuthClient(SlowAuthClient):
+        async def post(self, url, **kwargs):
+            if self.auth_calls == 0:
+                self.auth_calls += 1
+                return httpx.Response(200, text="<html>maintenance</html>", request=httpx.Request("POST", url))
+            return await super().post(url, **kwargs)
+
+    monkeypatch.setattr(gigachat, "_TOKEN_REFRESH_RETRY_SEC", 0.01)
+    http_client = BrokenAuthClient()
+    client = make_client(http_client)
+
+    async def run():
+        client.start_token_refresher()
+        await asyncio.sleep(0.1)
+        alive = not client._token_refresher.done()
+        await client.stop_token_refresher()
+        return alive
+
+    assert asyncio.run(run())
+    assert http_client.auth_calls == 2
+    assert client._access_token == "token-2"
+
+
+def test_millisecond_expiry_is_normalized():
+    client = make_client(SlowAuthClient())
+    expires_at_ms = (time.time() + 1800) * 1000
+
+    parsed = client._parse_expiry(expires_at_ms, None)
+
+    assert abs(parsed - expires_at_ms / 1000) < 1e-6
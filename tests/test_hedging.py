@@ -0,0 +1,131 @@
+import asyncio
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.gigachat import GigaChatError
+from app.models import GenerateRequest
+from app.resilience import CircuitBreaker, RetryPolicy, call_with_retry
+from app.service import GenerationService, _candidate_temperatures
+
+
+def completion(errors):
+    return f'<bpmn:definitions errors={errors} />'
+
+
+def test_temperatures_spread_around_the_request():
+    assert _candidate_temperatures(0.2, 4, 0.2) == [0.2, 0.4, 0.0, 0.6]
+    assert _candidate_temperatures(0.9, 2, 0.3) == [0.9, 1.0]
+
+
+def test_first_valid_candidate_wins_and_the_rest_are_cancelled(validator):
+    started = []
+    cancelled = []
+    delays = {0.2: 0.2, 0.4: 0.01, 0.0: 0.2}
+
+    async def llm(prompt, temperature, repair):
+        started.append(temperature)
+        try:
+            await asyncio.sleep(delays[temperature])
+        except asyncio.CancelledError:
+            cancelled.append(temperature)
+            raise
+        return completion(0 if temperature == 0.4 else 1)
+
+    service = GenerationService(None, validator, candidates=3)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 3))
+
+    assert result["validated"] is True
+    assert result["attempts_used"] == 1
+    assert sorted(cancelled) == [0.0, 0.2]
+    records = result["debug"]["attempts"]
+    assert [r.get("cancelled", False) for r in records] == [True, False, True]
+
+
+def test_repair_runs_on_the_candidate_with_fewest_errors(validator):
+    repaired = []
+
+    async def llm(prompt, temperature, repair):
+        if repair:
+            repaired.append(prompt)
+            return completion(0)
+        if temperature == 0.0:
+            raise GigaChatError("boom")
+        return completion(3 if temperature == 0.2 else 1)
+
+    service = GenerationService(None, validator, candidates=3, max_concurrency=1)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 2))
+
+    assert result["validated"] is True
+    assert result["attempts_used"] == 2
+    assert "errors=1" in repaired[0]
+    assert result["debug"]["attempts"][2]["error"] == "boom"
+
+
+def test_upstream_error_is_raised_when_every_candidate_fails(validator):
+    async def llm(prompt, temperature, repair):
+        raise GigaChatError("down")
+
+    service = GenerationService(None, validator, candidates=2)
+    service._call_llm = llm
+    with pytest.raises(GigaChatError):
+        asyncio.run(service.generate(GenerateRequest(text="x"), 2))
+
+
+def guarded_llm(breaker, delays):
+    """LLM fake behind a circuit breaker, like GigaChatClient."""
+
+    async def llm(prompt, temperature, repair):
+        async def call():
+            await asyncio.sleep(delays[temperature])
+            return completion(0 if temperature == 0.4 else 1)
+
+        return await call_with_retry(call, policy=RetryPolicy(attempts=1), breaker=breaker)
+
+    return llm
+
+
+def test_cancelled_candidates_leave_the_breaker_usable(validator):
+    breaker = CircuitBreaker("gigachat", failure_threshold=1)
+    service = GenerationService(None, validator, candidates=3)
+    service._call_llm = guarded_llm(breaker, {0.2: 0.2, 0.4: 0.01, 0.0: 0.2})
+
+    result = asyncio.run(service.generate(GenerateRequest(text="x"), 3))
+
+    assert result["validated"] is True
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_cancelled_hedged_request_releases_the_half_open_probe(validator):
+    breaker = CircuitBreaker("gigachat", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    service = GenerationService(None, validator, candidates=2, max_concurrency=1)
+    service._call_llm = guarded_llm(breaker, {0.2: 10.0, 0.4: 10.0})
+
+    async def run():
+        # The client goes away while the probe candidate is in flight.
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(service.generate(GenerateRequest(text="x"), 3), 0.05)
+
+    asyncio.run(run())
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def test_candidates_are_rejected_in_ir_mode():
+    with pytest.raises(ValueError):
+        GenerateRequest(text="x", mode="ir", candidates=2)
+    assert GenerateRequest(text="x", mode="ir", candidates=1).candidates == 1
+
+
+def test_non_positive_values_name_the_field():
+    with pytest.raises(ValueError, match="candidates must be positive"):
+        GenerateRequest(text="x", candidates=0)
+    with pytest.raises(ValueError, match="max_attempts must be positive"):
+        GenerateRequest(text="x", max_attempts=0)
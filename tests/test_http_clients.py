@@ -0,0 +1,116 @@
+import asyncio
+import pathlib
+import sys
+
+import httpx
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+import app.gigachat as gigachat
+from app.config import get_settings
+from app.gigachat import GigaChatClient
+from app.http_clients import build_gigachat_http_client
+import app.main as main
+from app.main import app as fastapi_app, lifespan
+
+
+@pytest.fixture(autouse=True)
+def reset_settings():
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    async def post(self, url, **kwargs):
+        self.calls.append(url)
+        return httpx.Response(
+            200,
+            json={"choices": [{"message": {"content": "<xml/>"}}]},
+            request=httpx.Request("POST", url),
+        )
+
+
+def test_gigachat_reuses_injected_http_client(monkeypatch):
+    def no_new_clients(*args, **kwargs):
+        raise AssertionError("a new AsyncClient must not be created")
+
+    monkeypatch.setattr(gigachat.httpx, "AsyncClient", no_new_clients)
+    shared = RecordingClient()
+    client = GigaChatClient(
+        api_url="http://gigachat/",
+        auth_url="",
+        credentials="",
+        scope="",
+        model="GigaChat",
+        token="token",
+        http_client=shared,
+    )
+
+    async def run():
+        await client.generate_bpmn("prompt", 0.2)
+        await client.repair_bpmn("prompt", 0.2)
+
+    asyncio.run(run())
+
+    assert shared.calls == ["http://gigachat/chat/completions"] * 2
+
+
+def test_pool_limits_come_from_settings(monkeypatch):
+    monkeypatch.setenv("GIGACHAT_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("GIGACHAT_MAX_KEEPALIVE_CONNECTIONS", "3")
+    captured = {}
+
+    class CapturingClient:
+        def __init__(self, **kwargs):
+            captured.update(kwargs)
+
+    monkeypatch.setattr(httpx, "AsyncClient", CapturingClient)
+    build_gigachat_http_client(get_settings())
+
+    assert captured["limits"].max_connections == 7
+    assert captured["limits"].max_keepalive_connections == 3
+    assert captured["verify"] is False
+
+
+def test_lifespan_owns_pooled_clients(monkeypatch):
+    monkeypatch.setenv("GIGACHAT_TOKEN", "token")
+
+    async def run():
+        async with lifespan(fastapi_app):
+            service = fastapi_app.state.service
+            gigachat_http = service.gigachat._http_client
+            validator_http = service.validator._http_client
+            assert not gigachat_http.is_closed
+            assert not validator_http.is_closed
+        return gigachat_http, validator_http
+
+    gigachat_http, validator_http = asyncio.run(run())
+
+    assert gigachat_http.is_closed
+    assert validator_http.is_closed
+    assert fastapi_app.state.service is None
+
+
+def test_lifespan_waits_for_the_cancelled_warmup(monkeypatch):
+    monkeypatch.setenv("GIGACHAT_TOKEN", "token")
+    events = []
+
+    async def slow_run(self):
+        try:
+            await asyncio.sleep(60)
+        finally:
+            events.append("warmup stopped")
+
+    monkeypatch.setattr(main.WarmUp, "run", slow_run)
+
+    async def run():
+        async with lifespan(fastapi_app):
+            await asyncio.sleep(0)
+        # Shutdown only returns once the warm-up task has finished.
+        return list(events)
+
+    assert asyncio.run(run()) == ["warmup stopped"]
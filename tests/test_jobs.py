@@ -0,0 +1,116 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobQueue, JobStore
+from app.metrics import JOB_QUEUE_DEPTH, JOB_QUEUE_OLDEST_AGE, JOB_QUEUE_RUNNING, REGISTRY
+from app.models import GenerateRequest
+
+
+async def wait_for(queue, job_id, status):
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}")
+
+
+def test_jobs_run_on_workers_and_report_results(tmp_path):
+    async def handler(request):
+        if request.text == "boom":
+            raise RuntimeError("boom")
+        return 200, {"validated": True, "bpmn_xml": f"<{request.text}/>"}
+
+    async def run():
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), handler, workers=2, poll_interval=0.05)
+        await queue.start()
+        ok = await queue.submit(GenerateRequest(text="a"))
+        failing = await queue.submit(GenerateRequest(text="boom"))
+        done = await wait_for(queue, ok, JOB_DONE)
+        failed = await wait_for(queue, failing, JOB_FAILED)
+        stats = queue.stats()
+        await queue.stop()
+        return done, failed, stats
+
+    done, failed, stats = asyncio.run(run())
+
+    assert done["result_status"] == 200
+    assert done["result"]["bpmn_xml"] == "<a/>"
+    assert failed["result_status"] == 500
+    assert stats["depth"] == 0 and stats["done"] == 1 and stats["failed"] == 1
+
+
+def test_stats_refresh_the_queue_gauges(tmp_path):
+    now = [100.0]
+
+    async def handler(request):
+        return 200, {}
+
+    async def run():
+        queue = JobQueue(JobStore(str(tmp_path / "jobs.sqlite3")), handler, clock=lambda: now[0])
+        await queue.submit(GenerateRequest(text="a"))
+        now[0] = 102.5
+        await queue.submit(GenerateRequest(text="b"))
+        queue.store.claim(now=now[0], owner="worker", lease=10.0)
+        now[0] = 110.0
+        return queue.stats()
+
+    stats = asyncio.run(run())
+
+    assert (JOB_QUEUE_DEPTH.value(), JOB_QUEUE_RUNNING.value()) == (stats["depth"], stats["running"]) == (1, 1)
+    # The first job was claimed, so the oldest queued one is "b".
+    assert JOB_QUEUE_OLDEST_AGE.value() == stats["oldest_queued_age_sec"] == 7.5
+    assert "# TYPE bpmn_job_queue_depth gauge\nbpmn_job_queue_depth 1" in REGISTRY.render()
+
+
+def test_running_jobs_are_recovered_after_their_lease_expires(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    store.enqueue("job", GenerateRequest(text="a").json(), now=1.0)
+    for now in (2.0, 20.0):
+        assert store.claim(now=now, owner="crashed", lease=10.0)[0] == "job"
+        # A live lease is left alone.
+        assert store.recover(now=now + 5, ttl=60) == (0, 0)
+        assert store.counts()[JOB_RUNNING] == 1
+        assert store.recover(now=now + 10, ttl=60) == (1, 0)
+        assert store.counts()[JOB_QUEUED] == 1
+    store.claim(now=40.0, owner="crashed", lease=10.0)
+    store.close()
+
+    # A job that keeps taking the process down is given up on.
+    reopened = JobStore(path)
+    assert reopened.recover(now=50.0, ttl=60) == (0, 1)
+    assert reopened.get("job")["status"] == JOB_FAILED
+
+
+def test_jobs_are_claimed_once_and_heartbeats_keep_the_lease(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = JobStore(path), JobStore(path)
+    first.enqueue("job", "{}", now=1.0)
+
+    assert first.claim(now=2.0, owner="a", lease=10.0) == ("job", "{}")
+    assert second.claim(now=2.0, owner="b", lease=10.0) is None
+    assert second.heartbeat("job", "b", now=5.0, lease=10.0) is False
+    assert first.heartbeat("job", "a", now=10.0, lease=10.0) is True
+    assert second.recover(now=15.0, ttl=60) == (0, 0)
+
+    # Once the lease ran out and the job moved on, the old owner's result is dropped.
+    assert second.recover(now=21.0, ttl=60) == (1, 0)
+    assert second.claim(now=22.0, owner="b", lease=10.0) == ("job", "{}")
+    assert first.finish("job", "a", JOB_DONE, 200, "{}", now=23.0, ttl=10) is False
+    assert second.finish("job", "b", JOB_DONE, 200, "{}", now=23.0, ttl=10) is True
+    first.close()
+    second.close()
+
+
+def test_finished_jobs_expire(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    store.enqueue("job", "{}", now=1.0)
+    store.claim(now=1.0, owner="worker", lease=10.0)
+    store.finish("job", "worker", JOB_DONE, 200, "{}", now=2.0, ttl=10)
+
+    assert store.purge_expired(now=5.0) == 0
+    assert store.purge_expired(now=12.0) == 1
+    assert store.get("job") is None
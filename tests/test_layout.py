@@ -0,0 +1,108 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.layout import apply_layout, compute_layout, semantic_only
+from app.models import GenerateRequest, ValidationReport
+from app.prevalidator import prevalidate
+from app.service import GenerationService
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+SEMANTIC = f"""<bpmn:definitions xmlns:bpmn="{BPMN_NS}" id="Defs">
+  <bpmn:process id="Process_1" isExecutable="false">
+    <bpmn:startEvent id="Start"/>
+    <bpmn:exclusiveGateway id="Split"/>
+    <bpmn:task id="Approve"/>
+    <bpmn:task id="Reject"/>
+    <bpmn:boundaryEvent id="Timeout" attachedToRef="Approve"/>
+    <bpmn:exclusiveGateway id="Join"/>
+    <bpmn:endEvent id="End"/>
+    <bpmn:sequenceFlow id="F1" sourceRef="Start" targetRef="Split"/>
+    <bpmn:sequenceFlow id="F2" sourceRef="Split" targetRef="Approve"/>
+    <bpmn:sequenceFlow id="F3" sourceRef="Split" targetRef="Reject"/>
+    <bpmn:sequenceFlow id="F4" sourceRef="Approve" targetRef="Join"/>
+    <bpmn:sequenceFlow id="F5" sourceRef="Reject" targetRef="Join"/>
+    <bpmn:sequenceFlow id="F6" sourceRef="Join" targetRef="End"/>
+    <bpmn:sequenceFlow id="F7" sourceRef="Reject" targetRef="Split"/>
+    <bpmn:sequenceFlow id="F8" sourceRef="Timeout" targetRef="End"/>
+  </bpmn:process>
+</bpmn:definitions>"""
+
+
+def test_chain_is_laid_out_left_to_right():
+    layout = compute_layout(
+        {"S": "startEvent", "T": "task", "E": "endEvent"},
+        [("F1", "S", "T"), ("F2", "T", "E")],
+    )
+
+    xs = [layout.bounds[n][0] for n in ("S", "T", "E")]
+    centers = {layout.bounds[n][1] + layout.bounds[n][3] / 2 for n in ("S", "T", "E")}
+    assert xs == sorted(xs)
+    assert len(centers) == 1
+    assert all(len(points) == 2 for points in layout.waypoints.values())
+
+
+def test_branches_loops_and_boundary_events():
+    root_layout = compute_layout(
+        {"S": "startEvent", "G": "exclusiveGateway", "A": "task", "B": "task", "X": "boundaryEvent"},
+        [("F1", "S", "G"), ("F2", "G", "A"), ("F3", "G", "B"), ("F4", "B", "G")],
+        {"X": "A"},
+    )
+    bounds = root_layout.bounds
+
+    assert bounds["A"][0] == bounds["B"][0]
+    assert bounds["A"][1] != bounds["B"][1]
+    # The loop back to the gateway runs below every shape.
+    lowest = max(y + h for _, y, _, h in bounds.values())
+    assert all(y > lowest for _, y in root_layout.waypoints["F4"][1:3])
+    # The boundary event straddles the bottom edge of its host.
+    ax, ay, aw, ah = bounds["A"]
+    assert bounds["X"][1] + bounds["X"][3] / 2 == ay + ah
+    assert ax <= bounds["X"][0] <= ax + aw
+
+
+def test_event_attached_to_a_boundary_event_is_placed_as_a_node():
+    layout = compute_layout(
+        {"S": "startEvent", "A": "task", "X": "boundaryEvent", "Y": "boundaryEvent", "Z": "boundaryEvent"},
+        [("F1", "S", "A")],
+        {"X": "A", "Y": "X", "Z": "Z"},
+    )
+
+    assert set(layout.bounds) == {"S", "A", "X", "Y", "Z"}
+    ax, ay, aw, ah = layout.bounds["A"]
+    assert layout.bounds["X"][1] + layout.bounds["X"][3] / 2 == ay + ah
+
+
+def test_layout_output_passes_structural_checks():
+    xml = apply_layout(SEMANTIC)
+
+    assert prevalidate(xml).errors == []
+    assert 'isMarkerVisible="true"' in xml
+    assert "BPMNDiagram" not in semantic_only(xml)
+
+
+def test_service_layout_mode_adds_di_and_strips_it_for_repair():
+    prompts = []
+    reports = [ValidationReport(errors=[{"message": "label missing"}]), ValidationReport()]
+
+    class Validator:
+        async def validate(self, xml):
+            assert prevalidate(xml).errors == []
+            return reports.pop(0)
+
+    async def llm(prompt, temperature, repair):
+        prompts.append(prompt)
+        return SEMANTIC
+
+    service = GenerationService(None, Validator())
+    service._call_llm = llm
+    request = GenerateRequest(text="x", mode="layout", return_debug=True)
+    result = asyncio.run(service.generate(request, 3))
+
+    assert result["validated"] is True
+    assert "bpmndi" in result["bpmn_xml"]
+    assert "BPMNShape" not in prompts[1]
+    assert "без DI" in prompts[1]
+    assert "layout_ms" in result["debug"]["attempts"][0]["timings"]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import logging
+import pathlib
+import queue
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.logs import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    RequestIdFilter,
+    RequestIdMiddleware,
+    SamplingFilter,
+    parse_sample_rates,
+    request_id_var,
+)
+
+
+def make_record(msg, level=logging.INFO, **extra):
+    record = logging.LogRecord("app", level, __file__, 1, msg, (), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_formatter_keeps_only_extra_attributes():
+    line = JsonFormatter().format(make_record("gigachat_completion_response", status=200, usage={"total_tokens": 3}))
+
+    assert json.loads(line) == {
+        "level": "info",
+        "message": "gigachat_completion_response",
+        "status": 200,
+        "usage": {"total_tokens": 3},
+    }
+
+
+def test_sampling_keeps_every_nth_info_record_but_all_warnings():
+    sampling = SamplingFilter(parse_sample_rates("noisy=0.25, muted=0"))
+
+    kept = [sampling.filter(make_record("noisy")) for _ in range(8)]
+    assert kept.count(True) == 2
+    assert not sampling.filter(make_record("muted"))
+    assert sampling.filter(make_record("muted", level=logging.WARNING))
+    assert sampling.filter(make_record("other"))
+    with pytest.raises(ValueError):
+        parse_sample_rates("noisy=2")
+
+
+def test_queue_handler_stamps_request_id_and_drops_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    handler.addFilter(RequestIdFilter())
+    token = request_id_var.set("req-1")
+    try:
+        handler.handle(make_record("first %s", status=1))
+        handler.handle(make_record("second"))
+    finally:
+        request_id_var.reset(token)
+
+    record = handler.queue.get_nowait()
+    assert record.request_id == "req-1"
+    assert handler.dropped == 1
+
+
+def test_middleware_binds_and_echoes_request_id():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(request_id_var.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"x-request-id", b"abc")]}
+    asyncio.run(RequestIdMiddleware(app)(scope, None, send))
+
+    assert seen == ["abc"]
+    assert (b"x-request-id", b"abc") in sent[0]["headers"]
+    assert request_id_var.get() is None
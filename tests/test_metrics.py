@@ -0,0 +1,57 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.metrics import ATTEMPTS, GENERATIONS, VALIDATION_ISSUES, Histogram, Registry
+from app.models import GenerateRequest
+from app.service import GenerationService
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("call_seconds", "Call time.", ("kind",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "generate")
+    histogram.observe(0.5, "generate")
+    histogram.observe(5, "generate")
+    counter = registry.counter("calls_total", "Calls.", ("status",))
+    counter.inc('5"03')
+
+    text = registry.render()
+    assert '# TYPE call_seconds histogram' in text
+    assert 'call_seconds_bucket{kind="generate",le="0.1"} 1' in text
+    assert 'call_seconds_bucket{kind="generate",le="1"} 2' in text
+    assert 'call_seconds_bucket{kind="generate",le="+Inf"} 3' in text
+    assert 'call_seconds_sum{kind="generate"} 5.55' in text
+    assert 'call_seconds_count{kind="generate"} 3' in text
+    assert 'calls_total{status="5\\"03"} 1' in text
+
+
+def test_histogram_counts_bucket_boundaries_inclusively():
+    histogram = Histogram("h", "h", buckets=(1.0,))
+    histogram.observe(1.0)
+    assert 'h_bucket{le="1"} 1' in "\n".join(histogram.render())
+
+
+def test_generation_records_attempts_outcomes_and_rules(validator):
+    async def llm(prompt, temperature, repair):
+        return "<bpmn:definitions />" if repair else "<bpmn:definitions broken />"
+
+    before = (
+        ATTEMPTS.value("generate"),
+        ATTEMPTS.value("repair"),
+        GENERATIONS.value("validated"),
+        VALIDATION_ISSUES.value("end-event-required"),
+    )
+    service = GenerationService(None, validator)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x"), 3))
+
+    assert result["validated"] is True
+    after = (
+        ATTEMPTS.value("generate"),
+        ATTEMPTS.value("repair"),
+        GENERATIONS.value("validated"),
+        VALIDATION_ISSUES.value("end-event-required"),
+    )
+    assert [b - a for a, b in zip(before, after)] == [1, 1, 1, 1]
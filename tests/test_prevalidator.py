@@ -0,0 +1,86 @@
+import asyncio
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.models import GenerateRequest
+from app.prevalidator import PreValidator, prevalidate
+from app.service import GenerationService
+
+HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL" '
+    'xmlns:bpmndi="http://www.omg.org/spec/BPMN/20100524/DI" '
+    'xmlns:dc="http://www.omg.org/spec/DD/20100524/DC" id="Definitions_1">'
+)
+
+
+def diagram(process_body: str, di_body: str) -> str:
+    return (
+        f'\n{HEADER}<bpmn:process id="Process_1" isExecutable="false">{process_body}</bpmn:process>'
+        f'<bpmndi:BPMNDiagram id="Diagram_1"><bpmndi:BPMNPlane id="Plane_1" bpmnElement="Process_1">'
+        f"{di_body}</bpmndi:BPMNPlane></bpmndi:BPMNDiagram></bpmn:definitions>"
+    )
+
+
+VALID = diagram(
+    '<bpmn:startEvent id="Start"/><bpmn:endEvent id="End"/>'
+    '<bpmn:sequenceFlow id="Flow_1" sourceRef="Start" targetRef="End"/>',
+    '<bpmndi:BPMNShape id="S1" bpmnElement="Start"><dc:Bounds x="0" y="0" width="36" height="36"/></bpmndi:BPMNShape>'
+    '<bpmndi:BPMNShape id="S2" bpmnElement="End"><dc:Bounds x="100" y="0" width="36" height="36"/></bpmndi:BPMNShape>'
+    '<bpmndi:BPMNEdge id="E1" bpmnElement="Flow_1"/>',
+)
+
+
+def rules(report):
+    return sorted((issue.rule, issue.id) for issue in report.errors)
+
+
+def test_valid_diagram_has_no_errors():
+    assert prevalidate(VALID).errors == []
+
+
+def test_malformed_and_foreign_documents():
+    assert rules(prevalidate("<bpmn:definitions>")) == [("xml-well-formed", None)]
+    assert rules(prevalidate("<definitions/>")) == [("definitions-root", None)]
+
+
+def test_structural_errors_are_reported_with_element_ids():
+    xml = diagram(
+        '<bpmn:startEvent id="Start"/><bpmn:task id="Start"/>'
+        '<bpmn:sequenceFlow id="Flow_1" sourceRef="Start" targetRef="Missing"/>',
+        '<bpmndi:BPMNShape id="S1" bpmnElement="Start"/>',
+    )
+
+    assert rules(prevalidate(xml)) == [
+        ("di-edge-missing", "Flow_1"),
+        ("end-event-required", "Process_1"),
+        ("sequence-flow-ref", "Flow_1"),
+        ("unique-ids", "Start"),
+    ]
+
+
+def test_large_documents_run_in_process_pool():
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        validator = PreValidator(pool=pool, pool_min_bytes=0)
+        report = asyncio.run(validator.validate(diagram("", "")))
+
+    assert [issue.rule for issue in report.errors] == ["start-event-required", "end-event-required"]
+
+
+def test_local_failure_skips_remote_validation():
+    class UnreachableValidator:
+        async def validate(self, xml):
+            raise AssertionError("remote validator must not be called")
+
+    service = GenerationService(None, UnreachableValidator(), prevalidator=PreValidator())
+
+    async def broken_llm(prompt, temperature, repair):
+        return diagram('<bpmn:startEvent id="Start"/>', "")
+
+    service._call_llm = broken_llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 1))
+
+    assert result["validated"] is False
+    assert result["debug"]["attempts"][0]["validated_by"] == "local"
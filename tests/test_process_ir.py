@@ -0,0 +1,70 @@
+import asyncio
+import json
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.models import GenerateRequest
+from app.prevalidator import prevalidate
+from app.process_ir import ir_to_xml, parse_ir
+from app.service import GenerationService
+
+GRAPH = {
+    "nodes": [
+        {"id": "start", "type": "startEvent", "name": "Заявка"},
+        {"id": "check", "type": "exclusiveGateway"},
+        {"id": "approve task", "type": "userTask", "name": "Согласовать"},
+        {"id": "end", "type": "endEvent"},
+    ],
+    "flows": [
+        {"source": "start", "target": "check"},
+        {"source": "check", "target": "approve task", "name": "да", "condition": "${ok}"},
+        {"source": "check", "target": "end", "name": "нет"},
+        {"source": "approve task", "target": "end"},
+    ],
+}
+
+
+def test_graph_is_serialized_to_valid_bpmn():
+    ir, issues = parse_ir("```json\n" + json.dumps(GRAPH, ensure_ascii=False) + "\n```")
+    assert issues == []
+
+    xml, id_map = ir_to_xml(ir, "Согласование")
+
+    assert prevalidate(xml).errors == []
+    assert 'name="Согласование"' in xml
+    assert id_map == {"Node_approve_task": "approve task"}
+    assert "<bpmn:conditionExpression>${ok}</bpmn:conditionExpression>" in xml
+    assert "<bpmn:incoming>Flow_1</bpmn:incoming>" in xml
+
+
+def test_schema_and_reference_problems_are_reported():
+    assert parse_ir("not json")[1][0].rule == "ir-json"
+    assert parse_ir('{"nodes": [{"id": "a", "type": "bogus"}]}')[1][0].rule == "ir-schema"
+
+    graph = dict(GRAPH, flows=GRAPH["flows"] + [{"id": "F9", "source": "check", "target": "missing"}])
+    ir, issues = parse_ir(json.dumps(graph))
+
+    assert ir is not None
+    assert [(issue.rule, issue.id) for issue in issues] == [("ir-node-ref", "F9")]
+
+
+def test_service_repairs_on_the_ir(validator):
+    prompts = []
+    completions = ['{"nodes": [{"id": "start", "type": "startEvent"}], "flows": []}', json.dumps(GRAPH)]
+
+    async def llm(prompt, temperature, repair, stream=None):
+        assert stream is False
+        prompts.append(prompt)
+        return completions.pop(0)
+
+    service = GenerationService(None, validator)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", mode="ir", return_debug=True), 3))
+
+    assert result["validated"] is True
+    assert result["attempts_used"] == 2
+    assert '{"nodes":[{"id":"start","type":"startEvent"}],"flows":[]}' in prompts[1]
+    assert "end-event-required" in prompts[1]
+    assert "<bpmn:" not in prompts[1]
+    assert result["debug"]["attempts"][0]["validated_by"] == "local"
@@ -0,0 +1,63 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from app.rate_limit import RateLimiter, TokenBucket, parse_delay
+
+
+def test_parse_delay_formats():
+    assert parse_delay("2") == 2.0
+    assert parse_delay("1.5") == 1.5
+    assert parse_delay("6m0s") == 360.0
+    assert parse_delay("250ms") == 0.25
+    assert parse_delay("1700000030", now=1700000000.0) == 30.0
+    assert parse_delay("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470.0) == 10.0
+    assert parse_delay("soon") is None
+    assert parse_delay(None) is None
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+    bucket.take(2)
+    assert bucket.wait_time(1) == 0.5
+    clock.now = 0.5
+    assert bucket.wait_time(1) == 0.0
+    # Larger than the bucket: allowed once it is full.
+    clock.now = 10.0
+    assert bucket.wait_time(5) == 0.0
+
+
+def test_requests_are_paced_in_arrival_order(clock):
+    limiter = RateLimiter(requests_per_sec=1.0, request_burst=1.0, clock=clock, sleep=clock.sleep)
+    order = []
+
+    async def call(index):
+        await limiter.acquire()
+        order.append((index, clock.now))
+
+    async def run():
+        await asyncio.gather(*(call(i) for i in range(3)))
+
+    asyncio.run(run())
+    assert order == [(0, 0.0), (1, 1.0), (2, 2.0)]
+    assert limiter.stats()["waited_sec"] == 3.0
+
+
+def test_429_pauses_limiter_and_usage_debt_delays_callers(clock):
+    limiter = RateLimiter(tokens_per_min=600.0, clock=clock, sleep=clock.sleep)
+
+    limiter.observe(429, {"retry-after": "3"})
+    asyncio.run(limiter.acquire(10))
+    assert clock.now == 3.0
+    assert limiter.stats()["throttled"] == 1
+
+    # The call used 700 tokens instead of the estimated 10: 100 in debt.
+    limiter.record_usage(700, 10)
+    clock.sleeps.clear()
+    asyncio.run(limiter.acquire(10))
+    assert clock.sleeps and abs(sum(clock.sleeps) - 11.0) < 1e-6
+
+    limiter.observe(200, {"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1s"})
+    assert limiter.stats()["paused_for_sec"] == 1.0
@@ -0,0 +1,99 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.layout import apply_layout
+from app.models import GenerateRequest, ValidationIssue, ValidationReport
+from app.prevalidator import prevalidate
+from app.repair import build_repair_prompt, estimate_tokens, merge_patch
+from app.service import GenerationService
+
+BPMN_NS = "http://www.omg.org/spec/BPMN/20100524/MODEL"
+
+DOCUMENT = apply_layout(f"""<bpmn:definitions xmlns:bpmn="{BPMN_NS}" id="Defs">
+  <bpmn:process id="Process_1" isExecutable="false">
+    <bpmn:startEvent id="Start"/>
+    <bpmn:task id="A" name="First"/>
+    <bpmn:task id="B" name="Second"/>
+    <bpmn:task id="C" name="Third"/>
+    <bpmn:endEvent id="End"/>
+    <bpmn:sequenceFlow id="F1" sourceRef="Start" targetRef="A"/>
+    <bpmn:sequenceFlow id="F2" sourceRef="A" targetRef="B"/>
+    <bpmn:sequenceFlow id="F3" sourceRef="B" targetRef="C"/>
+    <bpmn:sequenceFlow id="F4" sourceRef="C" targetRef="End"/>
+  </bpmn:process>
+</bpmn:definitions>""")
+
+LABEL_ISSUE = ValidationIssue(id="F4", message="Flow must be labelled", rule="label-required")
+
+
+def test_prompt_carries_only_the_referenced_fragments():
+    repair = build_repair_prompt("текст", "ru", DOCUMENT, [LABEL_ISSUE], "P", token_budget=3000)
+
+    assert repair.scope == "fragments"
+    assert 'id="F4"' in repair.prompt and 'id="F4_di"' in repair.prompt
+    assert 'id="C"' in repair.prompt and 'id="End"' in repair.prompt
+    assert 'id="A"' not in repair.prompt
+    assert "xmlns:" not in repair.prompt
+
+
+def test_context_is_dropped_to_fit_the_budget():
+    full = build_repair_prompt("текст", "ru", DOCUMENT, [LABEL_ISSUE], "P", token_budget=3000)
+    small = build_repair_prompt("текст", "ru", DOCUMENT, [LABEL_ISSUE], "P", token_budget=estimate_tokens(full.prompt) - 1)
+
+    assert estimate_tokens(small.prompt) < estimate_tokens(full.prompt)
+    assert small.elements < full.elements
+    assert small.over_budget is False
+
+
+def test_document_level_issues_use_the_minified_document():
+    issue = ValidationIssue(id="Process_1", message="Too few tasks")
+    repair = build_repair_prompt("текст", "ru", DOCUMENT, [issue], "P", token_budget=3000)
+
+    assert repair.scope == "document"
+    assert "\n  <bpmn:" not in repair.prompt
+    assert 'id="A"' in repair.prompt
+
+
+def test_patch_replaces_adds_and_deletes_elements():
+    patch = """```xml
+<bpmn:sequenceFlow id="F4" name="done" sourceRef="C" targetRef="End"/>
+<bpmn:task id="D"/>
+<delete id="B"/>
+```"""
+
+    merged, applied = merge_patch(DOCUMENT, patch)
+
+    assert applied == 3
+    assert 'name="done"' in merged
+    assert '<bpmn:task id="D"' in merged
+    assert 'id="B"' not in merged and 'bpmnElement="B"' not in merged
+
+
+def test_service_merges_patch_and_reports_prompt_size():
+    prompts = []
+    reports = [ValidationReport(errors=[LABEL_ISSUE]), ValidationReport()]
+
+    class Validator:
+        async def validate(self, xml):
+            assert prevalidate(xml).errors == []
+            return reports.pop(0)
+
+    async def llm(prompt, temperature, repair):
+        prompts.append(prompt)
+        if repair:
+            return '<bpmn:sequenceFlow id="F4" name="done" sourceRef="C" targetRef="End"/>'
+        return DOCUMENT
+
+    service = GenerationService(None, Validator(), minimal_repair=True)
+    service._call_llm = llm
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 2))
+
+    assert result["validated"] is True
+    assert 'name="done"' in result["bpmn_xml"]
+    repair_record = result["debug"]["attempts"][1]
+    assert repair_record["repair_prompt"]["scope"] == "fragments"
+    assert repair_record["patch_elements"] == 1
+    assert repair_record["prompt_tokens"] == estimate_tokens(prompts[1])
+    assert len(prompts[1]) < len(DOCUMENT)
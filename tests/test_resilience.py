@@ -0,0 +1,131 @@
+import asyncio
+import pathlib
+import sys
+import time
+
+import httpx
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.gigachat import GigaChatClient, GigaChatError
+from app.resilience import CircuitBreaker, CircuitOpenError, RetryBudget, RetryPolicy, call_with_retry
+
+
+def test_backoff_is_awaited_and_jittered(monkeypatch):
+    def blocking_sleep(seconds):
+        raise AssertionError("time.sleep must not be used")
+
+    monkeypatch.setattr(time, "sleep", blocking_sleep)
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    calls = {"count": 0}
+
+    async def flaky():
+        calls["count"] += 1
+        if calls["count"] < 3:
+            raise RuntimeError("boom")
+        return "ok"
+
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=8.0)
+    result = asyncio.run(call_with_retry(flaky, policy=policy, sleep=fake_sleep))
+
+    assert result == "ok"
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 1.0
+    assert 0 <= delays[1] <= 2.0
+
+
+def test_retry_budget_limits_retries(clock):
+    budget = RetryBudget(ratio=0.5, min_retries=1, window=10.0, clock=clock)
+    for _ in range(2):
+        budget.record_request()
+
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    clock.now = 11.0
+    assert budget.try_spend()
+
+
+def test_circuit_breaker_fails_fast_and_recovers(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=2, reset_timeout=5.0, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.now = 5.0
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_cancelled_half_open_probe_is_released(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=5.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 5.0
+
+    async def hang():
+        await asyncio.Event().wait()
+
+    async def run():
+        probe = asyncio.ensure_future(call_with_retry(hang, policy=RetryPolicy(attempts=1), breaker=breaker))
+        await asyncio.sleep(0)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+
+    # The next call becomes the probe instead of failing fast forever.
+    assert breaker.before_call() is True
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_gigachat_open_circuit_maps_to_gigachat_error():
+    breaker = CircuitBreaker("gigachat", failure_threshold=1, reset_timeout=60.0)
+    breaker.record_failure()
+    client = GigaChatClient(
+        api_url="http://gigachat",
+        auth_url="",
+        credentials="",
+        scope="",
+        model="GigaChat",
+        token="token",
+        breaker=breaker,
+    )
+
+    with pytest.raises(GigaChatError):
+        asyncio.run(client.generate_bpmn("prompt", 0.2))
+
+
+def test_gigachat_client_errors_do_not_trip_breaker():
+    breaker = CircuitBreaker("gigachat", failure_threshold=1)
+
+    class BadRequestClient:
+        async def post(self, url, **kwargs):
+            return httpx.Response(400, request=httpx.Request("POST", url))
+
+    client = GigaChatClient(
+        api_url="http://gigachat",
+        auth_url="",
+        credentials="",
+        scope="",
+        model="GigaChat",
+        token="token",
+        http_client=BadRequestClient(),
+        retry_policy=RetryPolicy(attempts=1),
+        breaker=breaker,
+    )
+
+    with pytest.raises(GigaChatError):
+        asyncio.run(client.generate_bpmn("prompt", 0.2))
+    assert breaker.state == CircuitBreaker.CLOSED
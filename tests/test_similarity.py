@@ -0,0 +1,93 @@
+import asyncio
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.models import GenerateRequest
+from app.service import GenerationService
+from app.similarity import NearDuplicateIndex, minhash, rename_process, shingles, similarity
+
+TEXT = (
+    "Сотрудник подает заявку на отпуск. Руководитель рассматривает заявку и согласует ее. "
+    "Если заявка отклонена, сотрудник получает уведомление. Бухгалтерия начисляет отпускные."
+)
+REWORDED = (
+    "руководитель рассматривает заявку и согласует её!  Сотрудник подаёт заявку на отпуск; "
+    "если заявка отклонена — сотрудник получает уведомление. БУХГАЛТЕРИЯ начисляет отпускные"
+)
+OTHER = "Клиент оформляет заказ в интернет-магазине. Склад собирает заказ и передает его курьеру."
+
+DIAGRAM = (
+    '<bpmn:definitions xmlns:bpmn="http://www.omg.org/spec/BPMN/20100524/MODEL">'
+    '<bpmn:process id="Process_1" name="Отпуск"><bpmn:startEvent id="Start"/></bpmn:process>'
+    "</bpmn:definitions>"
+)
+
+
+def test_reworded_and_reordered_text_stays_similar():
+    base = minhash(shingles(TEXT))
+
+    assert similarity(base, minhash(shingles(REWORDED))) >= 0.9
+    assert similarity(base, minhash(shingles(OTHER))) < 0.2
+
+
+def test_index_matches_per_language_and_stays_bounded(clock):
+    index = NearDuplicateIndex(threshold=0.9, max_entries=2, ttl=60.0, clock=clock)
+
+    async def run():
+        await index.add(TEXT, "ru", DIAGRAM)
+        assert index.lookup(REWORDED, "ru")[0] == DIAGRAM
+        assert index.lookup(REWORDED, "en") is None
+        assert index.lookup(OTHER, "ru") is None
+        await index.add(OTHER, "ru", "<other/>")
+        await index.add("Третий процесс без совпадений.", "ru", "<third/>")
+
+    asyncio.run(run())
+
+    assert len(index) == 2
+    assert index.lookup(OTHER, "ru")[0] == "<other/>"
+    clock.now += 61
+    assert index.lookup(OTHER, "ru") is None
+    stats = index.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 3, 1)
+    assert stats["lookup_ms_max"] >= stats["lookup_ms_avg"] > 0
+
+
+def test_index_survives_restart(tmp_path):
+    path = str(tmp_path / "near.sqlite3")
+
+    async def run():
+        first = NearDuplicateIndex(sqlite_path=path)
+        await first.add(TEXT, "ru", DIAGRAM)
+        first.close()
+
+    asyncio.run(run())
+    second = NearDuplicateIndex(sqlite_path=path)
+    try:
+        assert second.lookup(REWORDED, "ru")[0] == DIAGRAM
+    finally:
+        second.close()
+
+
+def test_service_reuses_near_duplicate_with_requested_process_name(monkeypatch, gigachat):
+    calls = {"llm": 0}
+
+    async def fake_generate(self, request, max_attempts):
+        calls["llm"] += 1
+        return {"validated": True, "attempts_used": 2, "bpmn_xml": DIAGRAM}
+
+    monkeypatch.setattr(GenerationService, "_generate", fake_generate)
+    service = GenerationService(gigachat, validator=None, near_duplicates=NearDuplicateIndex())
+
+    async def run():
+        await service.generate(GenerateRequest(text=TEXT, process_name="Отпуск"), 3)
+        return await service.generate(GenerateRequest(text=REWORDED, process_name="Отпуск 2", return_debug=True), 3)
+
+    response = asyncio.run(run())
+
+    assert calls["llm"] == 1
+    assert response["attempts_used"] == 0
+    assert response["bpmn_xml"] == rename_process(DIAGRAM, "Отпуск 2")
+    assert 'name="Отпуск 2"' in response["bpmn_xml"]
+    assert response["debug"]["cache"] == "near_duplicate"
+    assert service.stats()["near_duplicates"]["hits"] == 1
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import pathlib
+import sys
+
+import httpx
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app import tracing
+from app.gigachat import GigaChatClient
+from app.models import GenerateRequest
+from app.resilience import RetryPolicy
+from app.service import GenerationService
+from app.tracing import Trace
+
+
+def make_client(contents):
+    calls = {"count": 0}
+
+    def handler(request):
+        calls["count"] += 1
+        # Every other call fails once, so that each completion is retried.
+        if calls["count"] % 2:
+            return httpx.Response(503)
+        body = {
+            "choices": [{"message": {"content": contents.pop(0)}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+        }
+        return httpx.Response(200, content=json.dumps(body))
+
+    return GigaChatClient(
+        api_url="http://gigachat",
+        auth_url="",
+        credentials="",
+        scope="",
+        model="GigaChat",
+        token="token",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        retry_policy=RetryPolicy(attempts=2, base_delay=0.001, max_delay=0.001),
+    )
+
+
+def test_helpers_are_noops_without_an_active_trace():
+    with tracing.span("llm"):
+        tracing.add("retries")
+        tracing.add_usage({"total_tokens": 5})
+    assert tracing.current() is None
+
+
+def test_spans_accumulate_into_the_record():
+    record = {}
+    with tracing.activate(Trace(record)):
+        with tracing.span("validation"):
+            pass
+        with tracing.span("validation"):
+            pass
+        tracing.add_usage({"prompt_tokens": 3, "total_tokens": 5})
+        tracing.add_usage({"prompt_tokens": 2, "total_tokens": 4})
+
+    assert set(record["timings"]) == {"validation_ms"}
+    assert record["usage"] == {"prompt_tokens": 5, "total_tokens": 9}
+
+
+def test_attempt_records_carry_timings_usage_and_retries(validator):
+    client = make_client(["<bpmn:definitions broken />", "<bpmn:definitions />"])
+    service = GenerationService(client, validator)
+
+    result = asyncio.run(service.generate(GenerateRequest(text="x", return_debug=True), 3))
+
+    assert result["validated"] is True
+    first, second = result["debug"]["attempts"]
+    for record in (first, second):
+        assert {"prompt_build_ms", "token_ms", "llm_ms", "retry_wait_ms", "validation_ms"} <= set(record["timings"])
+        assert record["usage"] == {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140}
+        assert record["retries"] == 1
+        assert record["completion_chars"] > 0
+
+    summary = result["debug"]["summary"]
+    assert summary["attempts"] == 2
+    assert summary["usage"]["total_tokens"] == 280
+    assert summary["retries"] == 2
+    assert summary["timings"]["llm_ms"] >= summary["timings"]["retry_wait_ms"]
+    assert summary["total_ms"] >= summary["timings"]["llm_ms"]
@@ -4,6 +4,7 @@ import pytest
 
 import app.validator_client as validator_client
 import httpx_stub
+from app.cache import ValidationCache
 
 
 def test_validator_accepts_bpmnlint_response(monkeypatch):
@@ -55,3 +56,50 @@ def test_validator_rejects_unknown_format(monkeypatch):
 
     with pytest.raises(validator_client.ValidatorError):
         asyncio.run(client.validate("<bpmn></bpmn>"))
+
+
+def test_validator_cache_skips_whitespace_only_changes(monkeypatch):
+    monkeypatch.setattr(validator_client, "httpx", httpx_stub)
+    calls = {"count": 0}
+
+    class CountingAsyncClient(httpx_stub.AsyncClient):
+        async def post(self, url, headers=None, content=None, **kwargs):
+            calls["count"] += 1
+            return httpx_stub.Response(status_code=200, json={"errors": [{"message": "bad"}]})
+
+    monkeypatch.setattr(httpx_stub, "AsyncClient", CountingAsyncClient)
+
+    client = validator_client.ValidatorClient("http://validator", cache=ValidationCache())
+    first = asyncio.run(client.validate('<bpmn id="a"><task/></bpmn>'))
+    first.errors.clear()
+    second = asyncio.run(client.validate('\n<bpmn  id="a">\n  <task />\n</bpmn>\n'))
+
+    assert calls["count"] == 1
+    assert second.errors[0].message == "bad"
+
+
+def test_validator_cache_invalidated_by_ruleset_version(monkeypatch):
+    monkeypatch.setattr(validator_client, "httpx", httpx_stub)
+    versions = ["1", "2"]
+
+    class VersionedAsyncClient(httpx_stub.AsyncClient):
+        async def post(self, url, headers=None, content=None, **kwargs):
+            return httpx_stub.Response(
+                status_code=200,
+                json={"errors": []},
+                headers={"X-Ruleset-Version": versions[0]},
+            )
+
+    monkeypatch.setattr(httpx_stub, "AsyncClient", VersionedAsyncClient)
+
+    cache = ValidationCache()
+    client = validator_client.ValidatorClient("http://validator", cache=cache, ruleset_version="1")
+    asyncio.run(client.validate("<bpmn/>"))
+    assert cache.stats()["size"] == 1
+
+    versions.pop(0)
+    asyncio.run(client.validate("<other/>"))
+
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["size"] == 1
+    assert client.ruleset_version == "2"
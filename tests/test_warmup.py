@@ -0,0 +1,106 @@
+import asyncio
+import pathlib
+import sys
+
+import httpx
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+from app.gigachat import GigaChatClient
+from app.service import GenerationService
+from app.validator_client import ValidatorClient
+from app.warmup import WarmUp
+
+
+def make_service(handler):
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    gigachat = GigaChatClient(
+        api_url="http://gigachat/api/v1",
+        auth_url="http://auth/oauth",
+        credentials="secret",
+        scope="scope",
+        model="GigaChat",
+        http_client=http,
+    )
+    validator = ValidatorClient("http://validator/validate", http_client=http)
+    return GenerationService(gigachat, validator), http
+
+
+def test_warmup_fetches_token_opens_connections_and_validates():
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.url.host))
+        if request.url.host == "auth":
+            return httpx.Response(200, json={"access_token": "token", "expires_in": 1800})
+        if request.method == "HEAD":
+            return httpx.Response(405)
+        return httpx.Response(200, json={"issues": []})
+
+    async def run():
+        service, http = make_service(handler)
+        warmup = WarmUp(service, http, http, connections=2, validate=True)
+        assert not warmup.ready
+        await warmup.run()
+        return service, warmup
+
+    service, warmup = asyncio.run(run())
+
+    assert warmup.ready
+    assert service.gigachat._access_token == "token"
+    assert sorted(requests) == [
+        ("HEAD", "gigachat"),
+        ("HEAD", "gigachat"),
+        ("HEAD", "validator"),
+        ("HEAD", "validator"),
+        ("POST", "auth"),
+        ("POST", "validator"),
+    ]
+    stats = warmup.stats()
+    assert set(stats["steps"]) == {"local", "token", "connections", "validation"}
+    assert all(step["ok"] for step in stats["steps"].values())
+    assert stats["duration_ms"] >= stats["steps"]["local"]["ms"]
+
+
+def test_failed_steps_are_reported_but_do_not_block_readiness():
+    def handler(request):
+        if request.url.host == "auth":
+            return httpx.Response(401, json={"message": "bad credentials"})
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async def run():
+        service, http = make_service(handler)
+        warmup = WarmUp(service, http, http)
+        await warmup.run()
+        return warmup
+
+    warmup = asyncio.run(run())
+
+    assert warmup.ready
+    steps = warmup.stats()["steps"]
+    assert steps["local"]["ok"]
+    assert not steps["token"]["ok"]
+    assert steps["connections"] == {"ok": False, "error": "connection refused", "ms": steps["connections"]["ms"]}
+    assert "validation" not in steps
+
+
+def test_unexpected_step_errors_are_recorded():
+    def handler(request):
+        return httpx.Response(200, json={"access_token": "token", "expires_in": 1800})
+
+    async def broken_local():
+        raise KeyError("layout")
+
+    async def run():
+        service, http = make_service(handler)
+        warmup = WarmUp(service, http, http)
+        warmup._local = broken_local
+        await warmup.run()
+        return warmup
+
+    warmup = asyncio.run(run())
+
+    assert warmup.ready
+    steps = warmup.stats()["steps"]
+    assert steps["local"]["ok"] is False
+    assert steps["local"]["error"] == "KeyError: 'layout'"
+    assert steps["token"]["ok"]